@@ -0,0 +1,174 @@
+"""File with cache of report data which is invalidated by changing of dataset version, each tenant has own
+version, so upload of one tenant doesn't invalidate reports of others"""
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from app.api.metrics import inc
+from app.api.rollups import get_timeseries
+from app.api.tenants import InvalidTenant, get_request_tenant
+from app.api.utils import aget_report_data, get_report_data
+from app.models import Dataset
+
+REPORT_VERSION_KEY = 'report:version:{tenant}'
+REPORT_DATA_KEY = 'report:data:{tenant}:{version}:{query}'
+REPORT_TIMESERIES_KEY = 'report:timeseries:{tenant}:{version}:{query}'
+
+
+def get_report_version(tenant=Dataset.DEFAULT):
+    """
+    function to get current version of dataset, version is a time of the last change in nanoseconds
+    so the same number is used as ETag and Last-Modified
+    :param tenant: str with key of tenant
+    :return: int with version
+    """
+    key = REPORT_VERSION_KEY.format(tenant=tenant)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_report_version(tenant=Dataset.DEFAULT):
+    """
+    function to mark all cached reports of tenant as outdated, it's called right now and one more time after commit
+    because concurrent request could cache old data with new version before commit
+    :param tenant: str with key of tenant
+    :return: None
+    """
+    key = REPORT_VERSION_KEY.format(tenant=tenant)
+    cache.set(key, time.time_ns(), None)
+    transaction.on_commit(lambda: cache.set(key, time.time_ns(), None))
+
+
+def get_query_hash(query):
+    """
+    function to build short key for query parameters, order of parameters doesn't matter
+    :param query: QueryDict or dict with parameters
+    :return: str with hash or empty str for empty query
+    """
+    if not query:
+        return ''
+    items = sorted((key, str(value)) for key, value in query.items())
+    return hashlib.md5(repr(items).encode(), usedforsecurity=False).hexdigest()
+
+
+async def aget_report_version(tenant=Dataset.DEFAULT):
+    """
+    coroutine to get current version of dataset by async interface of cache
+    :param tenant: str with key of tenant
+    :return: int with version
+    """
+    key = REPORT_VERSION_KEY.format(tenant=tenant)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def format_report_etag(version, query):
+    """
+    function to build ETag from version of dataset and query parameters
+    :param version: int with version
+    :param query: QueryDict or dict with parameters
+    :return: str with version and hash of query parameters
+    """
+    query = get_query_hash(query)
+    return f'{version}-{query}' if query else str(version)
+
+
+def format_report_last_modified(version):
+    """
+    function to convert version of dataset to datetime
+    :param version: int with version
+    :return: datetime of the last change of dataset
+    """
+    return datetime.fromtimestamp(version / 10 ** 9, tz=timezone.utc)
+
+
+def get_report_etag(request, *args, **kwargs):
+    """
+    function to build ETag for report
+    :param request: request object
+    :return: str with current version of dataset of tenant and hash of query parameters or None if tenant
+    is invalid, view returns error then
+    """
+    try:
+        return format_report_etag(get_report_version(get_request_tenant(request)), request.GET)
+    except InvalidTenant:
+        return None
+
+
+def get_report_last_modified(request, *args, **kwargs):
+    """
+    function to build Last-Modified for report
+    :param request: request object
+    :return: datetime of the last change of dataset of tenant or None if tenant is invalid
+    """
+    try:
+        return format_report_last_modified(get_report_version(get_request_tenant(request)))
+    except InvalidTenant:
+        return None
+
+
+def get_cached_report_data(filters=None, version=None, tenant=Dataset.DEFAULT):
+    """
+    function to get report from cache or from database if report wasn't cached for current version of dataset
+    :param filters: dict with lookups for Transaction queryset
+    :param version: version of dataset if it was already read
+    :param tenant: str with key of tenant
+    :return: dict with the same data as get_report_data returns
+    """
+    if version is None:
+        version = get_report_version(tenant)
+    key = REPORT_DATA_KEY.format(tenant=tenant, version=version, query=get_query_hash(filters))
+    data = cache.get(key)
+    inc('report_cache_total', result='miss' if data is None else 'hit')
+    if data is None:
+        data = get_report_data(filters, tenant)
+        cache.set(key, data, settings.REPORT_CACHE_TIMEOUT)
+    return data
+
+
+async def aget_cached_report_data(filters=None, version=None, tenant=Dataset.DEFAULT):
+    """
+    coroutine with the same result as get_cached_report_data which uses async interfaces of cache and ORM
+    :param filters: dict with lookups for Transaction queryset
+    :param version: version of dataset if it was already read
+    :param tenant: str with key of tenant
+    :return: dict with the same data as get_report_data returns
+    """
+    if version is None:
+        version = await aget_report_version(tenant)
+    key = REPORT_DATA_KEY.format(tenant=tenant, version=version, query=get_query_hash(filters))
+    data = await cache.aget(key)
+    inc('report_cache_total', result='miss' if data is None else 'hit')
+    if data is None:
+        data = await aget_report_data(filters, tenant)
+        await cache.aset(key, data, settings.REPORT_CACHE_TIMEOUT)
+    return data
+
+
+def get_cached_timeseries(granularity, date_from=None, date_to=None, tenant=Dataset.DEFAULT):
+    """
+    function to get report by periods from cache or from rollups if it wasn't cached for current version of dataset
+    :param granularity: day, week or month
+    :param date_from: the first day of range or None
+    :param date_to: the last day of range or None
+    :param tenant: str with key of tenant
+    :return: list with the same data as get_timeseries returns
+    """
+    query = get_query_hash({'granularity': granularity, 'from': date_from, 'to': date_to})
+    key = REPORT_TIMESERIES_KEY.format(tenant=tenant, version=get_report_version(tenant), query=query)
+    data = cache.get(key)
+    inc('report_cache_total', result='miss' if data is None else 'hit')
+    if data is None:
+        data = get_timeseries(granularity, date_from, date_to, tenant)
+        cache.set(key, data, settings.REPORT_CACHE_TIMEOUT)
+    return data
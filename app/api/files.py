@@ -0,0 +1,64 @@
+"""File with utilities to read uploaded files stored on disk"""
+import mmap
+import os
+
+
+def get_file_path(file):
+    """
+    function to find path of file on disk
+    :param file: uploaded file or django File object
+    :return: str with path or None if file is kept in memory
+    """
+    if hasattr(file, 'temporary_file_path'):
+        return file.temporary_file_path()
+    name = getattr(getattr(file, 'file', None), 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    return None
+
+
+def split_file(path, chunk_size):
+    """
+    function to split file to ranges of bytes, each range ends at the end of line
+    :param path: path to file
+    :param chunk_size: minimal size of range in bytes, only the last one could be smaller
+    :return: list of tuples (start, end)
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as file:
+        start = 0
+        while start < size:
+            end = start + chunk_size
+            if end < size:
+                file.seek(end)
+                file.readline()
+                end = file.tell()
+            end = min(end, size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def iter_file_blocks(path, block_size, start=0, end=None):
+    """
+    generator to read file mapped to memory by blocks which end at the end of line,
+    each block is copied once and split to rows, rows are the same as django File object returns
+    :param path: path to file
+    :param block_size: minimal size of block in bytes, only the last one could be smaller
+    :param start: position of the first byte to read
+    :param end: position after the last byte to read, end of file by default
+    :return: generator of lists of rows with line endings
+    """
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        end = size if end is None else min(end, size)
+        if start >= end:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            position = start
+            while position < end:
+                block_end = mapped.find(b'\n', min(position + block_size, end) - 1, end)
+                block_end = end if block_end == -1 else block_end + 1
+                yield mapped[position:block_end].splitlines(keepends=True)
+                position = block_end
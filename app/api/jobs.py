@@ -0,0 +1,169 @@
+"""File with background processing of uploaded files in local pool of threads"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app.api.serializers import TransactionFileSerializer
+from app.models import Dataset, UploadJob
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_KEY = 'upload-job:{job_id}'
+PROGRESS_FIELDS = ('rows_parsed', 'rows_skipped', 'rows_inserted')
+INTERRUPTED_ERROR = 'Job was interrupted by restart of server'
+MISSING_FILE_ERROR = 'File of job was lost before restart of server'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    function to get pool of workers, pool is created on the first call in each process
+    :return: ThreadPoolExecutor object
+    """
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_JOBS_WORKERS,
+                                           thread_name_prefix='upload-job')
+    return _executor
+
+
+def create_upload_job(uploaded_file, mode='replace', tenant=Dataset.DEFAULT):
+    """
+    function to save uploaded file to disk and put it to the queue after commit
+    :param uploaded_file: validated file from request
+    :param mode: replace, append or upsert
+    :param tenant: str with key of tenant
+    :return: created UploadJob object
+    """
+    directory = Path(settings.UPLOAD_JOBS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    job = UploadJob(mode=mode, tenant=tenant)
+    path = directory / f'{job.pk}.csv'
+    with open(path, 'wb') as file:
+        for chunk in uploaded_file.chunks():
+            file.write(chunk)
+    job.file_path = str(path)
+    job.save()
+    transaction.on_commit(lambda: submit_upload_job(job.pk))
+    return job
+
+
+def submit_upload_job(job_id):
+    """
+    function to run job in pool of workers
+    :param job_id: id of UploadJob
+    :return: None
+    """
+    get_executor().submit(run_upload_job_in_worker, job_id)
+
+
+def run_upload_job_in_worker(job_id):
+    """
+    function to run job in worker thread, database connection of thread is closed at the end
+    :param job_id: id of UploadJob
+    :return: None
+    """
+    try:
+        run_upload_job(job_id)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Upload job %s failed", job_id)
+    finally:
+        connection.close()
+
+
+def run_upload_job(job_id):
+    """
+    function to load transactions from saved file, progress is available in cache while job is running
+    because database transaction with new rows isn't committed yet
+    :param job_id: id of UploadJob
+    :return: UploadJob object with final status
+    """
+    # job is claimed by one query, so job submitted again by recovery isn't run by two workers
+    claimed = UploadJob.objects.filter(pk=job_id, status='pending').update(status='running',
+                                                                          started_at=timezone.now())
+    job = UploadJob.objects.get(pk=job_id)
+    if not claimed:
+        logger.warning("Upload job %s is already %s", job_id, job.status)
+        return job
+    key = PROGRESS_KEY.format(job_id=job_id)
+    progress = dict.fromkeys(PROGRESS_FIELDS, 0)
+
+    def on_batch(columns, inserted=None):
+        progress['rows_parsed'] += len(columns) + columns.skipped
+        progress['rows_skipped'] += columns.skipped
+        progress['rows_inserted'] += len(columns) if inserted is None else inserted
+        cache.set(key, progress, settings.UPLOAD_JOBS_PROGRESS_TIMEOUT)
+
+    try:
+        with open(job.file_path, 'rb') as file:
+            serializer = TransactionFileSerializer(data={'data': File(file, name=Path(job.file_path).name)})
+            if serializer.is_valid():
+                job.rejected = serializer.save_transactions(job.mode, progress=on_batch, tenant=job.tenant)['rejected']
+                job.status = 'done'
+            else:
+                job.status = 'failed'
+                job.error = json.dumps(serializer.errors)
+    except Exception as error:  # pylint: disable=broad-except
+        logger.exception("Upload job %s failed", job_id)
+        job.status = 'failed'
+        job.error = str(error)
+        progress['rows_inserted'] = 0
+    finally:
+        for field in PROGRESS_FIELDS:
+            setattr(job, field, progress[field])
+        job.finished_at = timezone.now()
+        job.save()
+        cache.delete(key)
+        Path(job.file_path).unlink(missing_ok=True)
+    return job
+
+
+def recover_upload_jobs(resume=True):
+    """
+    function to finish jobs left by stopped server, it must be run while no server process is running:
+    running jobs were interrupted and their rows were rolled back, so they are failed and their files are removed,
+    pending jobs are loaded again if their files exist
+    :param resume: False to fail pending jobs instead of loading them
+    :return: dict with count of failed and resumed jobs
+    """
+    result = {'failed': 0, 'resumed': 0}
+    for job in UploadJob.objects.filter(status__in=('pending', 'running')).order_by('created_at'):
+        if job.status == 'pending' and resume and Path(job.file_path).is_file():
+            run_upload_job(job.pk)
+            result['resumed'] += 1
+            continue
+        job.error = (INTERRUPTED_ERROR if job.status == 'running' or not resume else MISSING_FILE_ERROR)
+        job.status = 'failed'
+        job.rows_inserted = 0
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'rows_inserted', 'finished_at'])
+        cache.delete(PROGRESS_KEY.format(job_id=job.pk))
+        if job.file_path:
+            Path(job.file_path).unlink(missing_ok=True)
+        result['failed'] += 1
+    return result
+
+
+def get_upload_job(job_id, tenant=Dataset.DEFAULT):
+    """
+    function to get job with the latest progress, jobs of other tenants aren't found
+    :param job_id: id of UploadJob
+    :param tenant: str with key of tenant
+    :return: UploadJob object
+    """
+    job = UploadJob.objects.get(pk=job_id, tenant=tenant)
+    if job.status == 'running':
+        for field, value in (cache.get(PROGRESS_KEY.format(job_id=job_id)) or {}).items():
+            setattr(job, field, value)
+    return job
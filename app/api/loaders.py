@@ -0,0 +1,126 @@
+"""File with loaders which put parsed rows to database without creation of ORM objects"""
+import io
+from decimal import Decimal
+
+from django.db import connections, transaction
+
+from app.models import Generation, Transaction
+
+COLUMNS = ('generation', 'date', 'type', 'value', 'expense_category', 'job_address', 'fingerprint')
+
+
+def sum_cents_by_type(columns):
+    """
+    function to count sums of incomes and expenses
+    :param columns: TransactionColumns object
+    :return: tuple with sum of incomes and sum of expenses as Decimal
+    """
+    incomes = expenses = 0
+    for transaction_type, value in zip(columns.type, columns.value):
+        if transaction_type == 'i':
+            incomes += value
+        else:
+            expenses += value
+    return Decimal(incomes).scaleb(-2), Decimal(expenses).scaleb(-2)
+
+
+def iter_rows(generation_id, columns):
+    """
+    generator of rows prepared to be sent to database, values are integer count of cents like CentsField stores them
+    :param generation_id: id of generation
+    :param columns: TransactionColumns object
+    :return: generator of tuples in order of COLUMNS
+    """
+    for date, transaction_type, value, expense_category, job_address, fingerprint in zip(
+            columns.date, columns.type, columns.value, columns.expense_category, columns.job_address,
+            columns.fingerprint):
+        yield generation_id, date.isoformat(), transaction_type, value, expense_category, job_address, fingerprint
+
+
+def get_insert_sql(connection):
+    """
+    function to build INSERT statement with placeholders for all columns
+    :param connection: database connection
+    :return: str with sql
+    """
+    quote = connection.ops.quote_name
+    fields = [Transaction._meta.get_field(name) for name in COLUMNS]
+    return (f"INSERT INTO {quote(Transaction._meta.db_table)} ({', '.join(quote(field.column) for field in fields)}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))})")
+
+
+def load_with_bulk_create(connection, generation_id, columns):
+    """
+    function to load rows by ORM, it's used for databases without own fast path
+    :param connection: database connection
+    :param generation_id: id of generation
+    :param columns: TransactionColumns object
+    :return: None
+    """
+    Transaction.all_objects.using(connection.alias).bulk_create(columns.to_transactions(generation_id))
+
+
+def load_with_executemany(connection, generation_id, columns):
+    """
+    function to load rows by one prepared INSERT statement executed for all rows
+    :param connection: database connection
+    :param generation_id: id of generation
+    :param columns: TransactionColumns object
+    :return: None
+    """
+    with connection.cursor() as cursor:
+        cursor.executemany(get_insert_sql(connection), iter_rows(generation_id, columns))
+    Generation.apply(generation_id, *sum_cents_by_type(columns), using=connection.alias)
+
+
+def escape_copy_value(value):
+    """
+    function to format value for text format of COPY
+    :param value: str or None
+    :return: escaped str
+    """
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def load_with_copy(connection, generation_id, columns):
+    """
+    function to load rows by COPY FROM STDIN, it's the fastest way to load data to PostgreSQL
+    :param connection: database connection
+    :param generation_id: id of generation
+    :param columns: TransactionColumns object
+    :return: None
+    """
+    stream = io.StringIO()
+    for row in iter_rows(generation_id, columns):
+        stream.write('\t'.join(escape_copy_value(value) for value in row))
+        stream.write('\n')
+    stream.seek(0)
+    quote = connection.ops.quote_name
+    column_names = ', '.join(quote(Transaction._meta.get_field(name).column) for name in COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(f"COPY {quote(Transaction._meta.db_table)} ({column_names}) FROM STDIN", stream)
+    Generation.apply(generation_id, *sum_cents_by_type(columns), using=connection.alias)
+
+
+LOADERS = {
+    'sqlite': load_with_executemany,
+    'postgresql': load_with_copy,
+}
+
+
+def load_transactions(generation_id, columns, using='default'):
+    """
+    function to insert parsed rows by the fastest way which database supports
+    :param generation_id: id of generation
+    :param columns: TransactionColumns object
+    :param using: database alias
+    :return: count of inserted rows
+    """
+    if not columns:
+        return 0
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        LOADERS.get(connection.vendor, load_with_bulk_create)(connection, generation_id, columns)
+    return len(columns)
@@ -0,0 +1,406 @@
+"""File with in-process metrics: counters and latency histograms of stages of uploads and reports which are
+rendered in Prometheus text format by /metrics. Nothing is recorded while METRICS_ENABLED is off.
+Each process keeps its metrics in memory, with METRICS_DIR they are written to own file of process at most
+once per METRICS_FLUSH_INTERVAL seconds, and /metrics sums files of all processes, so it shows the same
+values whichever worker serves it"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from django.conf import settings
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+ROWS_PER_SECOND_BUCKETS = (1e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6)
+BYTES_PER_SECOND_BUCKETS = (1e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8)
+
+# name: (type, help, buckets of histogram)
+METRICS = {
+    'upload_seconds': ('histogram', "Seconds of upload of file from receiving to commit by mode", SECONDS_BUCKETS),
+    'upload_stage_seconds': (
+        'histogram',
+        "Seconds spent by one upload in stage: receive (reading of request body), read (reading of rows from file), "
+        "parse (validation and parsing), lookup (search of stored rows), insert, rollups, delete (removal of stale "
+        "rows), switch, collect (garbage collection of retired generations)",
+        SECONDS_BUCKETS),
+    'upload_rows_per_second': ('histogram', "Rows of file read per second of upload", ROWS_PER_SECOND_BUCKETS),
+    'upload_bytes_per_second': ('histogram', "Bytes of file read per second of upload", BYTES_PER_SECOND_BUCKETS),
+    'uploads_total': ('counter', "Uploads by mode and result: loaded or repeated (found by digest of file)", None),
+    'upload_rows_total': ('counter', "Rows of uploaded files by result: stored, duplicate or rejected", None),
+    'upload_bytes_total': ('counter', "Bytes of uploaded files", None),
+    'report_query_seconds': ('histogram', "Seconds to count report from database by kind", SECONDS_BUCKETS),
+    'report_cache_total': ('counter', "Reads of cached reports by result: hit or miss", None),
+}
+
+NULL_CONTEXT = nullcontext()
+
+logger = logging.getLogger(__name__)
+
+
+class Registry:
+    """Class to keep metrics of process, counters are dict of values and histograms are dict
+    of lists with count of values in each bucket (the last one is +Inf) and sum of values"""
+
+    def __init__(self):
+        """
+        initial method
+        """
+        self.create_locks()
+        self.reset()
+
+    def create_locks(self):
+        """
+        method to create lock of metrics and lock of writes of file, it's also called in child process after fork
+        because locks could be held by other threads of parent at the moment of fork
+        :return: None
+        """
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+    def after_fork(self):
+        """
+        method to start metrics of child process from scratch
+        :return: None
+        """
+        self.create_locks()
+        self.reset()
+
+    def reset(self):
+        """
+        method to forget metrics, it's also called in child process after fork because metrics of parent
+        are already counted by parent
+        :return: None
+        """
+        self.counters = {}
+        self.histograms = {}
+        self.flushed_at = time.monotonic()
+        self.file_name = f'metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+
+    def inc(self, name, value, labels):
+        """
+        method to increase counter
+        :param name: name of metric from METRICS
+        :param value: number to add
+        :param labels: tuple with sorted pairs of label and value
+        :return: None
+        """
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.flush_if_needed()
+
+    def observe(self, name, value, labels):
+        """
+        method to put value to histogram
+        :param name: name of metric from METRICS
+        :param value: observed number
+        :param labels: tuple with sorted pairs of label and value
+        :return: None
+        """
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+        self.flush_if_needed()
+
+    def snapshot(self):
+        """
+        method to copy metrics to structure which could be saved as JSON
+        :return: dict with lists of counters and histograms
+        """
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(counts), total]
+                               for (name, labels), (counts, total) in self.histograms.items()],
+            }
+
+    def flush_if_needed(self):
+        """
+        method to write metrics to file of process if METRICS_FLUSH_INTERVAL has passed since the last write.
+        Interval is checked and claimed under lock, so only one thread writes and others don't wait for it
+        :return: None
+        """
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if now - self.flushed_at < settings.METRICS_FLUSH_INTERVAL:
+                return
+            self.flushed_at = now
+        if self.flush_lock.acquire(blocking=False):
+            try:
+                self.write()
+            finally:
+                self.flush_lock.release()
+
+    def flush(self):
+        """
+        method to write metrics to file of process now, it waits for write started by other thread
+        :return: None
+        """
+        if not settings.METRICS_DIR:
+            return
+        with self.lock:
+            self.flushed_at = time.monotonic()
+        with self.flush_lock:
+            self.write()
+
+    def write(self):
+        """
+        method to write metrics to file of process in METRICS_DIR, it's called under flush_lock.
+        File is written to unique temporary file and replaced atomically, so readers never see partial file.
+        Errors are only logged because metrics must not fail requests
+        :return: None
+        """
+        directory = Path(settings.METRICS_DIR)
+        temporary = None
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(prefix='.metrics-', suffix='.tmp', dir=directory)
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+                json.dump(self.snapshot(), file)
+            os.replace(temporary, directory / self.file_name)
+        except OSError:
+            logger.exception("Metrics can't be written to %s", directory)
+            if temporary is not None:
+                Path(temporary).unlink(missing_ok=True)
+
+
+REGISTRY = Registry()
+os.register_at_fork(after_in_child=REGISTRY.after_fork)
+atexit.register(REGISTRY.flush)
+
+
+def inc(name, value=1, **labels):
+    """
+    function to increase counter if metrics are enabled
+    :param name: name of metric from METRICS
+    :param value: number to add
+    :param labels: values of labels
+    :return: None
+    """
+    if settings.METRICS_ENABLED:
+        REGISTRY.inc(name, value, tuple(sorted(labels.items())))
+
+
+def observe(name, value, **labels):
+    """
+    function to put value to histogram if metrics are enabled
+    :param name: name of metric from METRICS
+    :param value: observed number
+    :param labels: values of labels
+    :return: None
+    """
+    if settings.METRICS_ENABLED:
+        REGISTRY.observe(name, value, tuple(sorted(labels.items())))
+
+
+def timed(name, **labels):
+    """
+    function to build context manager which puts duration of its block to histogram
+    :param name: name of histogram from METRICS
+    :param labels: values of labels
+    :return: context manager, shared one which does nothing if metrics are disabled
+    """
+    if not settings.METRICS_ENABLED:
+        return NULL_CONTEXT
+    return measure(name, labels)
+
+
+@contextmanager
+def measure(name, labels):
+    """
+    context manager to put duration of its block to histogram
+    :param name: name of histogram from METRICS
+    :param labels: dict with values of labels
+    :return: None
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+class Stopwatch:
+    """Class to sum time of stages of one upload, stages are measured once per batch,
+    so it costs nothing noticeable even if metrics are disabled"""
+
+    __slots__ = ('started', 'stages')
+
+    def __init__(self):
+        """
+        initial method
+        """
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        """
+        method to add time to stage
+        :param stage: name of stage
+        :param seconds: duration
+        :return: None
+        """
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage):
+        """
+        context manager to add duration of its block to stage
+        :param stage: name of stage
+        :return: None
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def iterate(self, iterable, stage):
+        """
+        generator to add time spent to get each item of iterable to stage
+        :param iterable: any iterable
+        :param stage: name of stage
+        :return: generator of items of iterable
+        """
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - started)
+                return
+            self.add(stage, time.perf_counter() - started)
+            yield item
+
+    def elapsed(self):
+        """
+        method to get time since creation
+        :return: seconds
+        """
+        return time.perf_counter() - self.started
+
+
+def record_upload(stopwatch, mode, result, size):
+    """
+    function to record metrics of finished upload
+    :param stopwatch: Stopwatch object of upload
+    :param mode: replace, append or upsert
+    :param result: dict with result of upload
+    :param size: size of file in bytes
+    :return: None
+    """
+    if not settings.METRICS_ENABLED:
+        return
+    elapsed = stopwatch.elapsed()
+    rows = result['count'] + result.get('duplicates', 0) + result['rejected']['count']
+    inc('uploads_total', mode=mode, result='loaded')
+    observe('upload_seconds', elapsed, mode=mode)
+    for stage, seconds in stopwatch.stages.items():
+        observe('upload_stage_seconds', seconds, stage=stage)
+    inc('upload_rows_total', result['count'], result='stored')
+    inc('upload_rows_total', result.get('duplicates', 0), result='duplicate')
+    inc('upload_rows_total', result['rejected']['count'], result='rejected')
+    inc('upload_bytes_total', size)
+    if elapsed > 0:
+        observe('upload_rows_per_second', rows / elapsed)
+        observe('upload_bytes_per_second', size / elapsed)
+
+
+def collect_snapshots():
+    """
+    function to get metrics of all processes, metrics of current process are taken from memory
+    and files of other processes are read from METRICS_DIR
+    :return: list of snapshots, only snapshot of current process without METRICS_DIR
+    """
+    snapshots = [REGISTRY.snapshot()]
+    if not settings.METRICS_DIR:
+        return snapshots
+    REGISTRY.flush_if_needed()
+    for path in Path(settings.METRICS_DIR).glob('metrics-*.json'):
+        if path.name == REGISTRY.file_name:
+            continue
+        try:
+            snapshots.append(json.loads(path.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            # file of process which has just stopped or is being replaced
+            continue
+    return snapshots
+
+
+def format_labels(labels, extra=()):
+    """
+    function to format labels of sample
+    :param labels: list of pairs of label and value
+    :param extra: additional pairs, f.e. bucket bound
+    :return: str like {stage="parse",le="0.1"} or empty str
+    """
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + '}'
+
+
+def format_number(value):
+    """
+    function to format number of sample, integers are written without fraction
+    :param value: int or float
+    :return: str
+    """
+    if value == int(value) and abs(value) < 2 ** 53:
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_metrics():
+    """
+    function to render sum of metrics of all processes in Prometheus text format
+    :return: str
+    """
+    counters, histograms = {}, {}
+    for snapshot in collect_snapshots():
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            if key in histograms:
+                merged = histograms[key]
+                histograms[key] = [[a + b for a, b in zip(merged[0], counts)], merged[1] + total]
+            else:
+                histograms[key] = [counts, total]
+    lines = []
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        if metric_type == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {format_number(value)}')
+            continue
+        for (metric, labels), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else format_number(bound)
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_number(total)}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,42 @@
+"""File with parallel parsing of big uploaded files by pool of processes"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+from app.api.files import iter_file_blocks, split_file
+from app.api.utils import parse_transaction_rows
+
+# size of block read from memory mapped file by worker at once
+RANGE_BLOCK_SIZE = 1024 * 1024
+
+
+def parse_file_range(path, start, end):
+    """
+    function to parse part of file, it runs in worker process
+    :param path: path to file
+    :param start: position of the first byte of range
+    :param end: position after the last byte of range
+    :return: TransactionColumns object
+    """
+    return parse_transaction_rows(row for rows in iter_file_blocks(path, RANGE_BLOCK_SIZE, start, end)
+                                  for row in rows)
+
+
+def iter_parallel_transaction_columns(path, workers, chunk_size):
+    """
+    generator to parse file by pool of processes, results are returned in order of rows in file.
+    Only workers + 1 ranges are parsed in advance to keep memory usage constant
+    :param path: path to file
+    :param workers: count of processes
+    :param chunk_size: size of one range in bytes
+    :return: generator of TransactionColumns objects, one per range
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        pending = deque()
+        for start, end in split_file(path, chunk_size):
+            pending.append(executor.submit(parse_file_range, path, start, end))
+            if len(pending) > workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,99 @@
+"""File with fast JSON renderer which returns the same bytes as DRF JSONRenderer for compact output"""
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# DRF escapes these characters because they are line terminators in javascript
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+DRF_ENCODER = encoders.JSONEncoder()
+
+
+def default(obj):
+    """
+    function to convert objects which aren't supported by encoder natively, Decimal is checked first
+    because reports contain mostly them, other types are converted like DRF encoder does
+    :param obj: object
+    :return: serializable object
+    """
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return DRF_ENCODER.default(obj)
+
+
+ENCODER = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(',', ':'), default=default)
+
+
+def dumps(data):
+    """
+    function to encode data to compact JSON by orjson if it's installed or by precomputed encoder of json module
+    :param data: data to encode
+    :return: bytes
+    """
+    if orjson is not None:
+        # orjson formats dates like DRF does, except time zones with offset in seconds which don't exist
+        content = orjson.dumps(data, default=default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    else:
+        content = ENCODER.encode(data).encode()
+    for character, escaped in LINE_SEPARATORS:
+        if character in content:
+            content = content.replace(character, escaped)
+    return content
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Class renderer with the same output as JSONRenderer without indent, but encoder isn't created
+    for each response and orjson is used if it's installed. Indented, not compact or ASCII only output
+    is rendered by JSONRenderer"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        method to render data
+        :param data: data to render
+        :param accepted_media_type: accepted media type with parameters
+        :param renderer_context: dict with view, request and response
+        :return: bytes
+        """
+        if data is None:
+            return b''
+        if (not self.compact or self.ensure_ascii or not self.strict
+                or self.get_indent(accepted_media_type or '', renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+    def iter_render(self, items, chunk_size=1000):
+        """
+        generator to render list by chunks, so big response isn't kept in memory as one string.
+        Concatenated chunks are the same as render returns for list
+        :param items: iterable with items of list
+        :param chunk_size: count of items rendered at once
+        :return: generator of bytes
+        """
+        yield b'['
+        separator = b''
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                # chunk is encoded by one call, brackets of list are removed
+                yield separator + dumps(chunk)[1:-1]
+                chunk, separator = [], b','
+        if chunk:
+            yield separator + dumps(chunk)[1:-1]
+        yield b']'
+
+
+def get_json_renderer():
+    """
+    function to get renderer for views without DRF, class is set by setting API_JSON_RENDERER
+    :return: renderer object
+    """
+    return import_string(settings.API_JSON_RENDERER)()
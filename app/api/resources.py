@@ -1,35 +1,465 @@
 """File to develop 'Views' which is controller in Django terms."""
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from app.api.serializers import TransactionFileSerializer
-from app.api.utils import get_report_data
+from app.api.cache import (aget_cached_report_data, aget_report_version, format_report_etag,
+                           format_report_last_modified, get_cached_report_data, get_cached_timeseries,
+                           get_report_etag, get_report_last_modified, get_report_version)
+from app.api.jobs import create_upload_job, get_upload_job
+from app.api.metrics import render_metrics, timed
+from app.api.renderers import get_json_renderer
+from app.api.serializers import (ReportFilterSerializer, ReportTimeseriesSerializer, TransactionFileSerializer,
+                                 TransactionPageSerializer, UploadJobSerializer, UploadModeSerializer)
+from app.api.tenants import InvalidTenant, get_request_tenant
+from app.api.transactions import (InvalidCursor, get_transactions_page, iter_transactions_csv,
+                                  spool_transactions_csv)
+from app.api.uploads import get_upload_digest
+from app.models import UploadJob
+
+ASYNC_VALUES = ('1', 'true')
 
 
 class TransactionView(APIView):
     """Class controller for /transactions endpoint."""
 
+    def get(self, request):
+        """
+        method to process get request, transactions are ordered by date and id and split to pages by cursor.
+        Query parameter limit is count of transactions on page, cursor is taken from link to the next page
+        :param request: request object
+        :return: Response with list of transactions and link to the next page and 200 status code or
+        Response with errors list and 400 status code
+        """
+        data, errors = get_transactions_page_data(request.query_params, get_tenant(request))
+        if errors is not None:
+            return Response(data=errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data=data)
+
     def post(self, request):
         """
-        method to process post request
+        method to process post request, with query parameter async=1 file is saved and processed in background.
+        Query parameter mode is replace (default), append or upsert. The same file sent again in the same mode
+        to unchanged dataset gets result of the previous upload without loading
         :param request: request object
         :return: Response with count of new objects and 200 status code or
+        Response with upload job and 202 status code or
         Response with errors list and 400+ status code
         """
-        serializer = TransactionFileSerializer(data=request.data)
+        tenant = get_tenant(request)
+        query = UploadModeSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        mode = query.validated_data['mode']
+        with timed('upload_stage_seconds', stage='receive'):
+            data = request.data
+        serializer = TransactionFileSerializer(data=data)
         serializer.is_valid(raise_exception=True)
-        count = serializer.create_transactions()
-        return Response(data={"count": count})
+        if request.query_params.get('async') in ASYNC_VALUES:
+            job = create_upload_job(serializer.validated_data['data'], mode, tenant)
+            return Response(data=UploadJobSerializer(job).data, status=status.HTTP_202_ACCEPTED,
+                            headers={'Location': f'/transactions/jobs/{job.pk}'})
+        return Response(data=serializer.save_transactions(mode, digest=get_upload_digest(request), tenant=tenant))
 
 
 class ReportView(APIView):
     """Class controller for /report endpoint."""
 
+    @method_decorator(vary_on_headers(settings.API_TENANT_HEADER))
+    @method_decorator(condition(etag_func=get_report_etag, last_modified_func=get_report_last_modified))
     def get(self, request):
         """
-        method to process get request
+        method to process get request, report is cached until the next change of transactions.
+        Report could be filtered by query parameters from, to, type, expense_category and job_address
         :param request: request object
-        :return: Response with json which contain gross, net and expenses and 200 status code
+        :return: Response with json which contain gross, net and expenses and 200 status code or
+        empty response with 304 status code if client already has report for current version or
+        Response with errors list and 400 status code
         """
-        data = get_report_data()
+        tenant = get_tenant(request)
+        serializer = ReportFilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = get_cached_report_data(serializer.get_filters(), tenant=tenant)
         return Response(data=data)
+
+
+class ReportTimeseriesView(APIView):
+    """Class controller for /report/timeseries endpoint."""
+
+    @method_decorator(vary_on_headers(settings.API_TENANT_HEADER))
+    @method_decorator(condition(etag_func=get_report_etag, last_modified_func=get_report_last_modified))
+    def get(self, request):
+        """
+        method to process get request, report is read from rollups and cached until the next change of transactions.
+        Query parameter granularity is day, week or month (default), range is set by optional from and to
+        :param request: request object
+        :return: streaming response with list of periods with gross, net and expenses and 200 status code or
+        empty response with 304 status code if client already has report for current version or
+        Response with errors list and 400 status code
+        """
+        tenant = get_tenant(request)
+        serializer = ReportTimeseriesSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        periods = get_cached_timeseries(data['granularity'], data.get('from'), data.get('to'), tenant)
+        return StreamingHttpResponse(get_json_renderer().iter_render(periods), content_type='application/json')
+
+
+class TransactionExportView(View):
+    """Class controller for /transactions/export.csv endpoint, it's plain django view because CSV
+    is streamed as is and doesn't need content negotiation."""
+
+    # size of blocks of spooled export which are sent under ASGI
+    block_size = 64 * 1024
+
+    def get(self, request):
+        """
+        method to process get request, all transactions of current dataset are streamed as CSV file.
+        Under ASGI django 4.1 iterates streamed content in event loop where database can't be queried,
+        so export is written to temporary file by thread of view and the file is streamed
+        :param request: request object
+        :return: streaming response with CSV file and 200 status code or
+        response with errors list and 400 status code
+        """
+        tenant, errors = validate_tenant(request)
+        if errors is not None:
+            return render_json(errors, status.HTTP_400_BAD_REQUEST)
+        if isinstance(request, ASGIRequest):
+            response = FileResponse(spool_transactions_csv(settings.TRANSACTIONS_EXPORT_CHUNK_SIZE, tenant),
+                                    as_attachment=True, filename='transactions.csv',
+                                    content_type='text/csv; charset=utf-8')
+            response.block_size = self.block_size
+            return response
+        content = iter_transactions_csv(settings.TRANSACTIONS_EXPORT_CHUNK_SIZE, tenant)
+        return StreamingHttpResponse(content, content_type='text/csv; charset=utf-8',
+                                     headers={'Content-Disposition': 'attachment; filename="transactions.csv"'})
+
+
+class UploadJobView(APIView):
+    """Class controller for /transactions/jobs/<id> endpoint."""
+
+    def get(self, request, job_id):
+        """
+        method to process get request
+        :param request: request object
+        :param job_id: id of upload job
+        :return: Response with status and progress of job and 200 status code or
+        Response with error and 404 status code
+        """
+        try:
+            job = get_upload_job(job_id, get_tenant(request))
+        except UploadJob.DoesNotExist as error:
+            raise NotFound from error
+        return Response(data=UploadJobSerializer(job).data)
+
+
+class MetricsView(View):
+    """Class controller for /metrics endpoint, it's plain django view because metrics are rendered
+    in Prometheus text format."""
+
+    def get(self, request):  # pylint: disable=unused-argument
+        """
+        method to process get request, metrics are summed over all processes which write to METRICS_DIR
+        :param request: request object
+        :return: response with metrics and 200 status code or response with 404 status code
+        if METRICS_ENABLED is off
+        """
+        if not settings.METRICS_ENABLED:
+            raise Http404
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def render_json(data, status_code=status.HTTP_200_OK, headers=None):
+    """
+    function to build response for views without DRF, content is rendered by renderer from setting
+    API_JSON_RENDERER which returns the same bytes as DRF views
+    :param data: data to render
+    :param status_code: HTTP status code
+    :param headers: dict with additional headers
+    :return: HttpResponse object
+    """
+    return HttpResponse(get_json_renderer().render(data), status=status_code, content_type='application/json',
+                        headers=headers)
+
+
+def validate_tenant(request):
+    """
+    function to get tenant of request
+    :param request: django or DRF request object
+    :return: tuple with key of tenant and errors, one of them is None
+    """
+    try:
+        return get_request_tenant(request), None
+    except InvalidTenant as error:
+        return None, {'tenant': [str(error)]}
+
+
+def get_tenant(request):
+    """
+    function to get tenant of request in DRF views
+    :param request: DRF request object
+    :return: str with key of tenant
+    :raise ValidationError: if header with tenant is invalid
+    """
+    tenant, errors = validate_tenant(request)
+    if errors is not None:
+        raise ValidationError(errors)
+    return tenant
+
+
+def get_transactions_page_data(query, tenant):
+    """
+    function to validate query parameters of transactions list and read the page
+    :param query: QueryDict with query parameters
+    :param tenant: str with key of tenant
+    :return: tuple with dict with transactions and link to the next page and errors, one of them is None
+    """
+    serializer = TransactionPageSerializer(data=query)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    limit = serializer.validated_data['limit']
+    try:
+        results, cursor = get_transactions_page(limit, serializer.validated_data.get('cursor'), tenant)
+    except InvalidCursor as error:
+        return None, {'cursor': [str(error)]}
+    next_url = f"/transactions?{urlencode({'cursor': cursor, 'limit': limit})}" if cursor is not None else None
+    return {'next': next_url, 'results': results}, None
+
+
+def get_file_serializer(request):
+    """
+    function to build serializer from multipart request without DRF parsers
+    :param request: django request object
+    :return: TransactionFileSerializer object
+    """
+    with timed('upload_stage_seconds', stage='receive'):
+        data = request.POST.copy()
+        data.update(request.FILES)
+    return TransactionFileSerializer(data=data)
+
+
+def save_upload(request, mode, tenant):
+    """
+    function to parse multipart body, validate file and load it or create background job for it
+    :param request: django request object
+    :param mode: replace, append or upsert
+    :param tenant: str with key of tenant
+    :return: HttpResponse object
+    """
+    serializer = get_file_serializer(request)
+    if not serializer.is_valid():
+        return render_json(serializer.errors, status.HTTP_400_BAD_REQUEST)
+    if request.GET.get('async') in ASYNC_VALUES:
+        return get_created_response(job=create_upload_job(serializer.validated_data['data'], mode, tenant))
+    return get_created_response(data=serializer.save_transactions(mode, digest=get_upload_digest(request),
+                                                                  tenant=tenant))
+
+
+def save_upload_in_worker(request, mode, tenant):
+    """
+    function to run save_upload by async view in thread of default executor instead of the single thread shared
+    by thread sensitive calls, so cache and ORM calls of async reports don't wait for upload. Database connection
+    of the thread is closed at the end
+    :param request: django request object
+    :param mode: replace, append or upsert
+    :param tenant: str with key of tenant
+    :return: HttpResponse object
+    """
+    try:
+        return save_upload(request, mode, tenant)
+    finally:
+        connection.close()
+
+
+def validate_upload_query(request):
+    """
+    function to validate query parameter mode of upload
+    :param request: django request object
+    :return: tuple with mode and errors, one of them is None
+    """
+    serializer = UploadModeSerializer(data=request.GET)
+    if serializer.is_valid():
+        return serializer.validated_data['mode'], None
+    return None, serializer.errors
+
+
+def get_created_response(job=None, data=None):
+    """
+    function to build response for valid upload
+    :param job: UploadJob object if file is processed in background
+    :param data: dict with counts of created transactions otherwise
+    :return: HttpResponse object
+    """
+    if job is not None:
+        return render_json(UploadJobSerializer(job).data, status.HTTP_202_ACCEPTED,
+                           headers={'Location': f'/transactions/jobs/{job.pk}'})
+    return render_json(data)
+
+
+def validate_report_query(request):
+    """
+    function to validate query parameters of report, serializer isn't built for request without parameters
+    :param request: django request object
+    :return: tuple with dict of lookups for Transaction queryset and errors, one of them is None
+    """
+    if not request.GET:
+        return {}, None
+    serializer = ReportFilterSerializer(data=request.GET)
+    if serializer.is_valid():
+        return serializer.get_filters(), None
+    return None, serializer.errors
+
+
+def get_conditional_report_response(request, version):
+    """
+    function to check conditional headers of request like decorator condition does
+    :param request: django request object
+    :param version: version of dataset
+    :return: tuple with ETag, Last-Modified timestamp and response with 304 status code or None
+    """
+    etag = quote_etag(format_report_etag(version, request.GET))
+    last_modified = int(format_report_last_modified(version).timestamp())
+    return etag, last_modified, get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_report_headers(response, etag, last_modified):
+    """
+    function to add ETag and Last-Modified to response if it doesn't have them, response depends on tenant header
+    :param response: HttpResponse object
+    :param etag: quoted ETag
+    :param last_modified: timestamp
+    :return: the same response
+    """
+    response.headers.setdefault('Last-Modified', http_date(last_modified))
+    response.headers.setdefault('ETag', etag)
+    patch_vary_headers(response, (settings.API_TENANT_HEADER,))
+    return response
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class LeanTransactionView(View):
+    """Class controller for /transactions endpoint without DRF request, negotiation and renderers,
+    it's used instead of TransactionView if setting API_LEAN_VIEWS is enabled."""
+
+    def get(self, request):
+        """
+        method to process get request in the same way as TransactionView does
+        :param request: request object
+        :return: the same responses as TransactionView returns
+        """
+        tenant, errors = validate_tenant(request)
+        if errors is None:
+            data, errors = get_transactions_page_data(request.GET, tenant)
+        if errors is not None:
+            return render_json(errors, status.HTTP_400_BAD_REQUEST)
+        return render_json(data)
+
+    def post(self, request):
+        """
+        method to process post request in the same way as TransactionView does
+        :param request: request object
+        :return: the same responses as TransactionView returns
+        """
+        tenant, errors = validate_tenant(request)
+        if errors is None:
+            mode, errors = validate_upload_query(request)
+        if errors is not None:
+            return render_json(errors, status.HTTP_400_BAD_REQUEST)
+        return save_upload(request, mode, tenant)
+
+
+class LeanReportView(View):
+    """Class controller for /report endpoint without DRF request, negotiation and renderers,
+    it's used instead of ReportView if setting API_LEAN_VIEWS is enabled."""
+
+    def get(self, request):
+        """
+        method to process get request in the same way as ReportView does, version of dataset is read once
+        :param request: request object
+        :return: the same responses as ReportView returns
+        """
+        tenant, errors = validate_tenant(request)
+        if errors is not None:
+            return render_json(errors, status.HTTP_400_BAD_REQUEST)
+        version = get_report_version(tenant)
+        etag, last_modified, response = get_conditional_report_response(request, version)
+        if response is None:
+            filters, errors = validate_report_query(request)
+            if errors is None:
+                response = render_json(get_cached_report_data(filters, version, tenant))
+            else:
+                response = render_json(errors, status.HTTP_400_BAD_REQUEST)
+        return set_report_headers(response, etag, last_modified)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncTransactionView(View):
+    """Class async controller for /transactions endpoint, it's used instead of TransactionView
+    if setting API_ASYNC_VIEWS is enabled."""
+
+    async def get(self, request):
+        """
+        method to process get request in the same way as TransactionView does, page is read in thread
+        :param request: request object
+        :return: the same responses as TransactionView returns
+        """
+        tenant, errors = validate_tenant(request)
+        if errors is None:
+            data, errors = await sync_to_async(get_transactions_page_data)(request.GET, tenant)
+        if errors is not None:
+            return render_json(errors, status.HTTP_400_BAD_REQUEST)
+        return render_json(data)
+
+    async def post(self, request):
+        """
+        method to process post request in the same way as TransactionView does. ASGI handler has already read body
+        of request to temporary file by chunks, parsing of multipart body (copy of file and its hashing) and loading
+        of file are run in thread which isn't shared with other async requests, so they aren't blocked by upload
+        :param request: request object
+        :return: the same responses as TransactionView returns
+        """
+        tenant, errors = validate_tenant(request)
+        if errors is None:
+            mode, errors = validate_upload_query(request)
+        if errors is not None:
+            return render_json(errors, status.HTTP_400_BAD_REQUEST)
+        return await sync_to_async(save_upload_in_worker, thread_sensitive=False)(request, mode, tenant)
+
+
+class AsyncReportView(View):
+    """Class async controller for /report endpoint, it's used instead of ReportView
+    if setting API_ASYNC_VIEWS is enabled."""
+
+    async def get(self, request):
+        """
+        method to process get request in the same way as ReportView does, cache and database are read
+        by their async interfaces
+        :param request: request object
+        :return: the same responses as ReportView returns
+        """
+        tenant, errors = validate_tenant(request)
+        if errors is not None:
+            return render_json(errors, status.HTTP_400_BAD_REQUEST)
+        version = await aget_report_version(tenant)
+        etag, last_modified, response = get_conditional_report_response(request, version)
+        if response is None:
+            filters, errors = validate_report_query(request)
+            if errors is None:
+                response = render_json(await aget_cached_report_data(filters, version, tenant))
+            else:
+                response = render_json(errors, status.HTTP_400_BAD_REQUEST)
+        return set_report_headers(response, etag, last_modified)
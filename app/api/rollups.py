@@ -0,0 +1,213 @@
+"""File with rollups: sums of transactions by day, week and month which are counted during upload"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+
+from app.api.metrics import timed
+from app.api.utils import build_report
+from app.db import get_reports_database
+from app.models import Dataset, Rollup, Transaction
+
+GRANULARITIES = ('day', 'week', 'month')
+ONE_DAY = timedelta(days=1)
+
+
+def get_period_start(date, granularity):
+    """
+    function to find the first day of period which contains date
+    :param date: date object
+    :param granularity: day, week or month
+    :return: date object
+    """
+    if granularity == 'week':
+        return date - timedelta(days=date.weekday())
+    if granularity == 'month':
+        return date.replace(day=1)
+    return date
+
+
+def get_next_period_start(date, granularity):
+    """
+    function to find the first day of the next period
+    :param date: date object
+    :param granularity: day, week or month
+    :return: date object
+    """
+    start = get_period_start(date, granularity)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start + timedelta(days=31)).replace(day=1)
+    return start + ONE_DAY
+
+
+class RollupAccumulator:
+    """Class to collect sums by day, type and category during upload, memory usage depends only on
+    count of different days and categories, not on count of rows"""
+
+    def __init__(self):
+        """
+        initial method
+        """
+        self.days = {}
+
+    def add(self, columns):
+        """
+        method to add parsed rows
+        :param columns: TransactionColumns object
+        :return: None
+        """
+        days = self.days
+        for date, transaction_type, value, category in zip(columns.date, columns.type, columns.value,
+                                                           columns.expense_category):
+            key = (date, transaction_type, category or '')
+            total = days.get(key)
+            if total is None:
+                days[key] = [value, 1]
+            else:
+                total[0] += value
+                total[1] += 1
+
+    def add_day(self, date, transaction_type, category, cents, count):
+        """
+        method to add already aggregated rows
+        :param date: date object
+        :param transaction_type: 'i' or 'e'
+        :param category: expense category or empty string
+        :param cents: sum of values in cents
+        :param count: count of rows
+        :return: None
+        """
+        total = self.days.setdefault((date, transaction_type, category), [0, 0])
+        total[0] += cents
+        total[1] += count
+
+    def get_rollups(self):
+        """
+        method to expand sums by day to all granularities
+        :return: dict where key is (granularity, period, type, category) and value is [cents, count]
+        """
+        rollups = {}
+        for (date, transaction_type, category), (cents, count) in self.days.items():
+            for granularity in GRANULARITIES:
+                key = (granularity, get_period_start(date, granularity), transaction_type, category)
+                total = rollups.setdefault(key, [0, 0])
+                total[0] += cents
+                total[1] += count
+        return rollups
+
+    def save(self, generation_id):
+        """
+        method to store rollups of new generation
+        :param generation_id: id of generation
+        :return: count of created rollups
+        """
+        rollups = [
+            Rollup(generation_id=generation_id, granularity=granularity, period=period, type=transaction_type,
+                   category=category, value=Decimal(cents).scaleb(-2), count=count)
+            for (granularity, period, transaction_type, category), (cents, count) in self.get_rollups().items()
+        ]
+        Rollup.objects.bulk_create(rollups, batch_size=1000)
+        return len(rollups)
+
+    def merge(self, generation_id):
+        """
+        method to add collected sums to stored rollups of generation, it's used when rows are added to
+        or removed from existing generation. Only rollups of changed periods are read, rollups without rows
+        are removed
+        :param generation_id: id of generation
+        :return: None
+        """
+        rollups = self.get_rollups()
+        if not rollups:
+            return
+        periods = [period for _, period, _, _ in rollups]
+        stored = Rollup.objects.filter(generation_id=generation_id, period__gte=min(periods),
+                                       period__lte=max(periods))
+        changed, empty = [], []
+        for rollup in stored:
+            total = rollups.pop((rollup.granularity, rollup.period, rollup.type, rollup.category), None)
+            if total is None:
+                continue
+            rollup.value += Decimal(total[0]).scaleb(-2)
+            rollup.count += total[1]
+            (changed if rollup.count else empty).append(rollup)
+        Rollup.objects.bulk_update(changed, ['value', 'count'], batch_size=1000)
+        Rollup.objects.filter(pk__in=[rollup.pk for rollup in empty]).delete()
+        Rollup.objects.bulk_create([
+            Rollup(generation_id=generation_id, granularity=granularity, period=period, type=transaction_type,
+                   category=category, value=Decimal(cents).scaleb(-2), count=count)
+            for (granularity, period, transaction_type, category), (cents, count) in rollups.items() if count
+        ], batch_size=1000)
+
+
+def rebuild_rollups(generation_id):
+    """
+    function to count rollups of generation from its transactions again
+    :param generation_id: id of generation
+    :return: count of created rollups
+    """
+    Rollup.objects.filter(generation_id=generation_id).delete()
+    accumulator = RollupAccumulator()
+    days = Transaction.all_objects.filter(generation_id=generation_id).values(
+        'date', 'type', 'expense_category').annotate(value=Sum('value'), count=Count('id'))
+    for day in days:
+        category = (day['expense_category'] or '') if day['type'] == 'e' else ''
+        accumulator.add_day(day['date'], day['type'], category, int(day['value'].scaleb(2)), day['count'])
+    return accumulator.save(generation_id)
+
+
+def split_range(granularity, date_from, date_to):
+    """
+    function to split range of dates to part which consists of whole periods and parts at the edges
+    which are read from daily rollups
+    :param granularity: day, week or month
+    :param date_from: the first day of range or None
+    :param date_to: the last day of range or None
+    :return: list of tuples (granularity of rollups, the first period, the last period), None means no limit
+    """
+    if granularity == 'day':
+        return [('day', date_from, date_to)]
+    ranges = []
+    full_from, full_to = date_from, date_to
+    if date_from is not None and date_from != get_period_start(date_from, granularity):
+        full_from = get_next_period_start(date_from, granularity)
+        head_to = full_from - ONE_DAY if date_to is None else min(date_to, full_from - ONE_DAY)
+        ranges.append(('day', date_from, head_to))
+    if date_to is not None and date_to != get_next_period_start(date_to, granularity) - ONE_DAY:
+        full_to = get_period_start(date_to, granularity) - ONE_DAY
+        if full_from is None or full_to + ONE_DAY >= full_from:
+            ranges.append(('day', full_to + ONE_DAY, date_to))
+    if full_from is None or full_to is None or full_from <= full_to:
+        ranges.append((granularity, full_from, full_to))
+    return ranges
+
+
+def get_timeseries(granularity, date_from=None, date_to=None, tenant=Dataset.DEFAULT):
+    """
+    function to get report for each period of current generation, data is read only from rollups,
+    so year of monthly data costs 12 rows per type and category, data is read by connection REPORTS_DATABASE
+    :param granularity: day, week or month
+    :param date_from: the first day of range or None
+    :param date_to: the last day of range or None
+    :param tenant: str with key of tenant
+    :return: list of dicts with period and the same values as report contains, sorted by period
+    """
+    using = get_reports_database()
+    generation_id = Dataset.get_current_generation_id(tenant, using=using)
+    if generation_id is None:
+        return []
+    periods = {}
+    with timed('report_query_seconds', kind='timeseries'):
+        for rollup_granularity, period_from, period_to in split_range(granularity, date_from, date_to):
+            rollups = Rollup.objects.using(using).filter(generation_id=generation_id, granularity=rollup_granularity)
+            if period_from is not None:
+                rollups = rollups.filter(period__gte=period_from)
+            if period_to is not None:
+                rollups = rollups.filter(period__lte=period_to)
+            for row in rollups.values('period', 'type').annotate(value=Sum('value')).order_by():
+                totals = periods.setdefault(get_period_start(row['period'], granularity), {'i': None, 'e': None})
+                totals[row['type']] = row['value'] + (totals[row['type']] or 0)
+    return [{'period': period, **build_report(totals['i'], totals['e'])}
+            for period, totals in sorted(periods.items())]
@@ -1,9 +1,20 @@
 """File to develop serializers"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 
-from app.api.exceptions import InvalidInput
-from app.api.utils import validate_and_prepare_transaction_row
-from app.models import Transaction
+from app.api.cache import bump_report_version
+from app.api.files import get_file_path, iter_file_blocks
+from app.api.loaders import load_transactions
+from app.api.metrics import Stopwatch, inc, record_upload
+from app.api.parallel import iter_parallel_transaction_columns
+from app.api.rollups import GRANULARITIES, RollupAccumulator
+from app.api.transactions import (InvalidCursor, KeptFingerprints, decode_cursor, find_stored_transactions,
+                                  get_last_transaction_id, remove_stale_transactions)
+from app.api.uploads import find_upload_result, get_repeated_result, remember_upload_result
+from app.api.utils import RejectedRows, iter_batches, parse_transaction_rows, start_collect_retired_generations
+from app.models import UPLOAD_MODE, Dataset, Generation, UploadJob
 
 
 class TransactionFileSerializer(serializers.Serializer):
@@ -11,39 +22,279 @@ class TransactionFileSerializer(serializers.Serializer):
     Methods create and update not implemented because I'm not going to use it"""
 
     data = serializers.FileField()
+    # RejectedRows object of file which is filled while file is read
+    rejected = None
+    # Stopwatch object with time of stages of upload
+    stopwatch = None
 
-    def __init__(self, *args, **kwargs):
+    def iter_transaction_columns(self):
         """
-        initial method
-        :param args: standard options for unnamed parameters
-        :param kwargs: standard options for named parameters
+        generator to read uploaded file by batches of rows, rejected rows of batches are collected
+        to attribute rejected with lines numbered from the start of file, time of reading and parsing
+        is added to attribute stopwatch
+        :return: generator of TransactionColumns objects, one per batch
         """
-        super().__init__(*args, **kwargs)
-        self.transactions = []
+        self.rejected = RejectedRows(settings.TRANSACTIONS_REJECTED_SAMPLE_SIZE)
+        if self.stopwatch is None:
+            self.stopwatch = Stopwatch()
+        offset = 0
+        for columns in self.iter_parsed_columns():
+            self.rejected.merge(columns.rejected, offset)
+            offset += len(columns) + columns.skipped
+            yield columns
 
-    def create_transactions(self):
+    def iter_parsed_columns(self):
         """
-        method to remove old transactions and create list of new
+        generator to parse uploaded file by batches of rows, rows are never kept in memory all together.
+        Files stored on disk are mapped to memory and read by blocks, big ones are split to ranges
+        which are parsed by pool of processes
+        :return: generator of TransactionColumns objects, one per batch
+        """
+        data = self.validated_data['data']
+        path = get_file_path(data)
+        stopwatch = self.stopwatch
+        if (path is not None and settings.TRANSACTIONS_PARALLEL_WORKERS > 1
+                and data.size >= settings.TRANSACTIONS_PARALLEL_THRESHOLD):
+            # rows are read and parsed by workers, only waiting for them is measured
+            yield from stopwatch.iterate(
+                iter_parallel_transaction_columns(path, settings.TRANSACTIONS_PARALLEL_WORKERS,
+                                                  settings.TRANSACTIONS_PARALLEL_CHUNK_SIZE), 'parse')
+            return
+        if path is not None:
+            batches = iter_file_blocks(path, settings.TRANSACTIONS_MMAP_BLOCK_SIZE)
+        else:
+            batches = iter_batches(data, settings.TRANSACTIONS_BATCH_SIZE)
+        for rows in stopwatch.iterate(batches, 'read'):
+            with stopwatch.measure('parse'):
+                columns = parse_transaction_rows(rows)
+            yield columns
+
+    def create_transactions(self, progress=None, tenant=Dataset.DEFAULT):
+        """
+        method to load transactions to new generation batch by batch in one database transaction
+        and switch readers to it, previous generation is removed later in background.
+        Rollups of new generation are counted from the same batches and stored before switch.
+        Nothing is changed if file doesn't contain valid rows. Dataset of tenant is locked from the first
+        valid batch, so uploads of other tenants aren't waiting for it
+        :param progress: function which is called with TransactionColumns object after each batch
+        :param tenant: str with key of tenant
         :return: count of new created objects
         """
-        if self.transactions:
-            Transaction.objects.all().delete()
-            transactions_list = Transaction.objects.bulk_create(self.transactions)
-            return len(transactions_list)
-        return 0
+        count = 0
+        rollups = RollupAccumulator()
+        with transaction.atomic():
+            generation = None
+            for columns in self.iter_transaction_columns():
+                if columns:
+                    if generation is None:
+                        generation = Generation.objects.create(dataset=Dataset.lock(tenant))
+                    with self.stopwatch.measure('insert'):
+                        load_transactions(generation.pk, columns)
+                    with self.stopwatch.measure('rollups'):
+                        rollups.add(columns)
+                    count += len(columns)
+                if progress is not None:
+                    progress(columns)
+            if generation is not None:
+                with self.stopwatch.measure('rollups'):
+                    rollups.save(generation.pk)
+                with self.stopwatch.measure('switch'):
+                    Dataset.switch(generation)
+                bump_report_version(tenant)
+                if settings.GENERATIONS_GC_IN_BACKGROUND:
+                    transaction.on_commit(start_collect_retired_generations)
+        return count
+
+    def merge_transactions(self, mode, progress=None, tenant=Dataset.DEFAULT):
+        """
+        method to add rows of file to current generation instead of replacing it. Fingerprint of each row is
+        searched among rows stored before upload and only new rows are inserted, so file which is sent again
+        with a few new lines costs parsing and insert of new lines. Rows repeated in file are inserted
+        if they aren't stored yet. In upsert mode stored rows of dates covered by file which file doesn't
+        contain are removed, so file replaces its range of dates. Totals and rollups are changed
+        by differences in the same database transaction. Without current generation file is loaded
+        like in replace mode
+        :param mode: append or upsert
+        :param progress: function which is called with TransactionColumns object and count of inserted rows
+        after each batch
+        :param tenant: str with key of tenant
+        :return: dict with counts of inserted, already stored and removed rows
+        """
+        result = {'count': 0, 'duplicates': 0, 'removed': 0}
+        rollups = RollupAccumulator()
+        date_from = date_to = None
+        with transaction.atomic(), KeptFingerprints() as kept:
+            # uploads of the same dataset are serialized, switch of generation locks the same row
+            dataset = Dataset.lock(tenant)
+            if dataset.current_id is None:
+                result['count'] = self.create_transactions(progress, tenant)
+                return result
+            generation_id = dataset.current_id
+            last_id = get_last_transaction_id()
+            for columns in self.iter_transaction_columns():
+                with self.stopwatch.measure('lookup'):
+                    stored = find_stored_transactions(generation_id, columns.fingerprint, last_id)
+                    new = columns.select([fingerprint not in stored for fingerprint in columns.fingerprint])
+                with self.stopwatch.measure('insert'):
+                    load_transactions(generation_id, new)
+                with self.stopwatch.measure('rollups'):
+                    rollups.add(new)
+                result['count'] += len(new)
+                result['duplicates'] += len(columns) - len(new)
+                if mode == 'upsert' and columns:
+                    if stored:
+                        kept.add(stored)
+                    date_from = min(columns.date) if date_from is None else min(date_from, min(columns.date))
+                    date_to = max(columns.date) if date_to is None else max(date_to, max(columns.date))
+                if progress is not None:
+                    progress(columns, len(new))
+            if date_from is not None:
+                with self.stopwatch.measure('delete'):
+                    result['removed'] = remove_stale_transactions(generation_id, date_from, date_to, last_id,
+                                                                  kept, rollups, settings.TRANSACTIONS_BATCH_SIZE)
+            with self.stopwatch.measure('rollups'):
+                rollups.merge(generation_id)
+            if result['count'] or result['removed']:
+                bump_report_version(tenant)
+        return result
+
+    def save_transactions(self, mode='replace', progress=None, digest=None, tenant=Dataset.DEFAULT):
+        """
+        method to store transactions of file in given mode. If digest of file is known and the same file
+        was uploaded in the same mode to current generation which isn't changed since then,
+        file isn't read and result of that upload is returned with flag skipped, see get_repeated_result
+        :param mode: replace, append or upsert
+        :param progress: function which is called after each batch, see create_transactions and merge_transactions
+        :param digest: str with hex digest of file or None
+        :param tenant: str with key of tenant
+        :return: dict with count of inserted rows, summary of rejected rows (count, counts by reason and sample),
+        in append and upsert modes also counts of already stored and removed rows
+        """
+        self.stopwatch = Stopwatch()
+        if digest is not None:
+            result = find_upload_result(digest, mode, tenant)
+            if result is not None:
+                inc('uploads_total', mode=mode, result='repeated')
+                return get_repeated_result(result, mode)
+        with transaction.atomic():
+            if mode == 'replace':
+                result = {'count': self.create_transactions(progress, tenant)}
+            else:
+                result = self.merge_transactions(mode, progress, tenant)
+            result['rejected'] = self.rejected.to_dict()
+            if digest is not None:
+                remember_upload_result(digest, mode, result, tenant)
+        record_upload(self.stopwatch, mode, result, self.validated_data['data'].size)
+        return result
+
+
+class UploadModeSerializer(serializers.Serializer):
+    """Class serializer for query parameter mode of POST /transactions: replace (default) replaces all
+    transactions, append adds only new rows, upsert also removes rows of covered dates which file doesn't contain"""
+
+    mode = serializers.ChoiceField(choices=[mode for mode, _ in UPLOAD_MODE], default='replace')
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    """Class serializer to show status and progress of upload job"""
+
+    throughput = serializers.SerializerMethodField()
+
+    class Meta:
+        """Class with serializer options"""
+        model = UploadJob
+        fields = ('id', 'status', 'mode', 'rows_parsed', 'rows_skipped', 'rows_inserted', 'rejected', 'throughput',
+                  'error', 'created_at', 'started_at', 'finished_at')
+
+    def get_throughput(self, obj):
+        """
+        method to count speed of processing
+        :param obj: UploadJob object
+        :return: parsed rows per second or None if job wasn't started
+        """
+        if obj.started_at is None:
+            return None
+        seconds = ((obj.finished_at or timezone.now()) - obj.started_at).total_seconds()
+        return round(obj.rows_parsed / seconds, 2) if seconds > 0 else None
+
+
+class ReportFilterSerializer(serializers.Serializer):
+    """Class serializer for query parameters of /report, all of them are optional"""
+
+    TYPES = {'Income': 'i', 'Expense': 'e'}
+
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    type = serializers.ChoiceField(choices=list(TYPES), required=False)
+    expense_category = serializers.CharField(required=False, max_length=100, trim_whitespace=False)
+    job_address = serializers.CharField(required=False, max_length=100, trim_whitespace=False)
+
+    def get_fields(self):
+        """
+        method to rename date fields to 'from' and 'to' which can't be names of attributes
+        :return: dict with fields
+        """
+        fields = super().get_fields()
+        fields['from'] = fields.pop('date_from')
+        fields['to'] = fields.pop('date_to')
+        return fields
+
+    def get_filters(self):
+        """
+        method to convert validated query parameters to lookups for Transaction queryset
+        :return: dict with lookups
+        """
+        lookups = {'from': 'date__gte', 'to': 'date__lte', 'type': 'type',
+                   'expense_category': 'expense_category', 'job_address': 'job_address'}
+        filters = {lookups[name]: value for name, value in self.validated_data.items()}
+        if 'type' in filters:
+            filters['type'] = self.TYPES[filters['type']]
+        return filters
+
+
+class ReportTimeseriesSerializer(serializers.Serializer):
+    """Class serializer for query parameters of /report/timeseries, all of them are optional"""
+
+    granularity = serializers.ChoiceField(choices=GRANULARITIES, default='month')
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def get_fields(self):
+        """
+        method to rename date fields to 'from' and 'to' which can't be names of attributes
+        :return: dict with fields
+        """
+        fields = super().get_fields()
+        fields['from'] = fields.pop('date_from')
+        fields['to'] = fields.pop('date_to')
+        return fields
 
     def validate(self, attrs):
         """
-        method which validate data in serializer
-        :param attrs: all input data, in our case only file by name 'data'
-        :return: attrs: dict with input data
-        because we're validating file content and don't need to change it
-        """
-        data = attrs.get('data')
-        for row in data:
-            try:
-                result = validate_and_prepare_transaction_row(row)
-            except InvalidInput:
-                continue
-            self.transactions.append(Transaction(**result))
+        method to check that range of dates isn't empty
+        :param attrs: dict with values of fields
+        :return: dict with values of fields
+        """
+        if 'from' in attrs and 'to' in attrs and attrs['from'] > attrs['to']:
+            raise serializers.ValidationError({'to': "Date 'to' should not be earlier than 'from'"})
         return attrs
+
+
+class TransactionPageSerializer(serializers.Serializer):
+    """Class serializer for query parameters of GET /transactions, cursor is taken from previous page"""
+
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=settings.TRANSACTIONS_MAX_PAGE_SIZE,
+                                     default=settings.TRANSACTIONS_PAGE_SIZE)
+
+    def validate_cursor(self, value):
+        """
+        method to check that cursor could be decoded
+        :param value: str with cursor
+        :return: the same str
+        """
+        try:
+            decode_cursor(value)
+        except InvalidCursor as error:
+            raise serializers.ValidationError(str(error)) from error
+        return value
@@ -0,0 +1,28 @@
+"""File with tenants: each tenant has own dataset, tenant of request is taken from header which is set
+by authenticating proxy, requests without header use shared dataset"""
+import re
+
+from django.conf import settings
+
+from app.models import Dataset
+
+TENANT_PATTERN = re.compile(r'[A-Za-z0-9_.-]{1,100}')
+
+
+class InvalidTenant(ValueError):
+    """Exception for value of tenant header which can't be used as key of dataset"""
+
+
+def get_request_tenant(request):
+    """
+    function to get tenant of request from header API_TENANT_HEADER, key of tenant is also a part of cache keys,
+    so only letters, digits, '_', '.' and '-' are allowed
+    :param request: django or DRF request object
+    :return: str with key of tenant, Dataset.DEFAULT if header isn't sent
+    """
+    tenant = request.headers.get(settings.API_TENANT_HEADER)
+    if tenant is None:
+        return Dataset.DEFAULT
+    if not TENANT_PATTERN.fullmatch(tenant):
+        raise InvalidTenant("Tenant could contain only up to 100 letters, digits, '_', '.' and '-'")
+    return tenant
@@ -0,0 +1,267 @@
+"""File with reading of transactions: pages by keyset (seek) pagination, streaming export to CSV
+and search of stored rows by fingerprints for incremental uploads"""
+import base64
+import binascii
+import csv
+import io
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from app.models import TRANSACTION_TYPE, Dataset, Generation, Transaction
+
+TYPE_NAMES = dict(TRANSACTION_TYPE)
+PAGE_FIELDS = ('id', 'date', 'type', 'value', 'expense_category', 'job_address')
+EXPORT_HEADER = ('date', 'type', 'value', 'additional_info')
+# count of fingerprints in one IN lookup, SQLite before 3.32 allows only 999 parameters in query
+LOOKUP_SIZE = 900
+
+
+class InvalidCursor(ValueError):
+    """Exception for cursor which can't be decoded or points to replaced or removed generation"""
+
+
+def encode_cursor(generation_id, last_date, last_id):
+    """
+    function to build opaque cursor of the next page
+    :param generation_id: id of generation which is listed
+    :param last_date: date of the last transaction of page
+    :param last_id: id of the last transaction of page
+    :return: str with cursor
+    """
+    value = f'{generation_id},{last_date.isoformat()},{last_id}'
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    function to parse cursor of the next page
+    :param cursor: str from encode_cursor
+    :return: tuple with id of generation, date and id of the last transaction of previous page
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        generation_id, last_date, last_id = value.split(',')
+        return int(generation_id), date.fromisoformat(last_date), int(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+        raise InvalidCursor("Invalid cursor") from error
+
+
+def get_transactions_page(limit, cursor=None, tenant=Dataset.DEFAULT):
+    """
+    function to get page of transactions ordered by date and id. Page is found by seek to the last row
+    of previous page by index (generation, date, id), so deep pages cost the same as the first one.
+    Cursor keeps generation, so pages are never mixed from different versions of dataset: cursor of generation
+    replaced by new file is rejected because its rows are being removed by garbage collection
+    :param limit: count of transactions on page
+    :param cursor: cursor from previous page or None for the first page
+    :param tenant: str with key of tenant, cursor of generation of other tenant is invalid
+    :return: tuple with list of dicts with transactions and cursor of the next page or None for the last page
+    """
+    if cursor is None:
+        generation_id = Dataset.get_current_generation_id(tenant)
+        if generation_id is None:
+            return [], None
+        rows = Transaction.all_objects.filter(generation_id=generation_id)
+    else:
+        generation_id, last_date, last_id = decode_cursor(cursor)
+        # condition date >= last_date is redundant, but without it database doesn't seek in index by date
+        # and filters rows of generation from the first one
+        rows = Transaction.all_objects.filter(Q(date__gt=last_date) | Q(id__gt=last_id),
+                                              generation_id=generation_id, date__gte=last_date)
+    # one extra row shows that the next page exists
+    rows = list(rows.order_by('date', 'id').values(*PAGE_FIELDS)[:limit + 1])
+    # generation is checked after page is read: if it wasn't retired yet, garbage collection hasn't touched its rows
+    if cursor is not None and not Generation.objects.filter(pk=generation_id, dataset__tenant=tenant,
+                                                            retired=False).exists():
+        raise InvalidCursor("Dataset was replaced, start from the first page")
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(generation_id, rows[-1]['date'], rows[-1]['id'])
+    for row in rows:
+        row['type'] = TYPE_NAMES[row['type']]
+    return rows, next_cursor
+
+
+def iter_transactions_csv(chunk_size, tenant=Dataset.DEFAULT):
+    """
+    generator to export all transactions of current generation to CSV ordered by date and id.
+    Rows are read by database iterator with chunk_size rows at once (server-side cursor where database
+    supports it) and written to output by the same chunks, so memory doesn't depend on size of dataset.
+    Rows have the same columns as uploaded files have, so exported file can be uploaded back
+    :param chunk_size: count of rows fetched and yielded at once
+    :param tenant: str with key of tenant
+    :return: generator of str
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(EXPORT_HEADER)
+    generation_id = Dataset.get_current_generation_id(tenant)
+    if generation_id is not None:
+        rows = (Transaction.all_objects.filter(generation_id=generation_id).order_by('date', 'id')
+                .values_list('date', 'type', 'value', 'expense_category', 'job_address')
+                .iterator(chunk_size=chunk_size))
+        for index, (day, transaction_type, value, category, address) in enumerate(rows, 1):
+            writer.writerow((day, TYPE_NAMES[transaction_type], value, category or address or ''))
+            if index % chunk_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+
+def spool_transactions_csv(chunk_size, tenant=Dataset.DEFAULT):
+    """
+    function to write export of transactions to temporary file, it's kept in memory up to
+    FILE_UPLOAD_MAX_MEMORY_SIZE bytes and moved to disk after that. It's used under ASGI, where streamed content
+    is iterated in event loop and can't query database, so rows are read before response is returned
+    :param chunk_size: count of rows fetched and written at once
+    :param tenant: str with key of tenant
+    :return: binary file object positioned at the start
+    """
+    file = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    for chunk in iter_transactions_csv(chunk_size, tenant):
+        file.write(chunk.encode())
+    file.seek(0)
+    return file
+
+
+def get_last_transaction_id():
+    """
+    function to get the biggest id of stored transactions, rows inserted later have bigger ids
+    :return: int, 0 if table is empty
+    """
+    return Transaction.all_objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def find_stored_transactions(generation_id, fingerprints, last_id, using='default'):
+    """
+    function to find rows of generation with given fingerprints by index (generation, fingerprint).
+    Only rows with id up to last_id are searched, so rows inserted by the same upload aren't found.
+    Query is built without ORM because preparation of each parameter of IN lookup by ORM costs more than
+    search in index
+    :param generation_id: id of generation
+    :param fingerprints: list of fingerprints
+    :param last_id: the biggest id of rows stored before upload
+    :param using: database alias
+    :return: dict where key is fingerprint and value is list of ids of rows
+    """
+    stored = {}
+    unique = list(set(fingerprints))
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    sql = (f"SELECT {quote('fingerprint')}, {quote('id')} FROM {quote(Transaction._meta.db_table)} "
+           f"WHERE {quote('generation_id')} = %s AND {quote('id')} <= %s AND {quote('fingerprint')} IN ({{}})")
+    with connection.cursor() as cursor:
+        for start in range(0, len(unique), LOOKUP_SIZE):
+            chunk = unique[start:start + LOOKUP_SIZE]
+            cursor.execute(sql.format(', '.join(['%s'] * len(chunk))), [generation_id, last_id, *chunk])
+            for fingerprint, pk in cursor.fetchall():
+                stored.setdefault(fingerprint, []).append(pk)
+    return stored
+
+
+class KeptFingerprints:
+    """Class with temporary table of fingerprints of stored rows which were found in uploaded file, it's used
+    in upsert mode to find stale rows by anti-join in database, so memory of upload doesn't depend on size
+    of stored dataset. Table is created on the first add in current database transaction and dropped at exit,
+    after error it's removed by rollback"""
+
+    TABLE = 'upload_kept_fingerprints'
+
+    def __init__(self, using='default'):
+        """
+        initial method
+        :param using: database alias
+        """
+        self.using = using
+        self.created = False
+
+    def __enter__(self):
+        """
+        method to start use of table
+        :return: the same object
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        method to drop table if it was created and upload didn't fail
+        :param exc_type: type of exception or None
+        :param exc_value: exception or None
+        :param traceback: traceback or None
+        :return: None
+        """
+        if self.created and exc_type is None:
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(f"DROP TABLE {connections[self.using].ops.quote_name(self.TABLE)}")
+            self.created = False
+
+    def add(self, fingerprints):
+        """
+        method to save fingerprints to table
+        :param fingerprints: iterable of int
+        :return: None
+        """
+        connection = connections[self.using]
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            if not self.created:
+                cursor.execute(f"DROP TABLE IF EXISTS {quote(self.TABLE)}")
+                cursor.execute(f"CREATE TEMPORARY TABLE {quote(self.TABLE)} ({quote('fingerprint')} bigint NOT NULL)")
+                cursor.execute(f"CREATE INDEX {quote(self.TABLE + '_idx')} ON {quote(self.TABLE)} "
+                               f"({quote('fingerprint')})")
+                self.created = True
+            cursor.executemany(f"INSERT INTO {quote(self.TABLE)} ({quote('fingerprint')}) VALUES (%s)",
+                               [(fingerprint,) for fingerprint in fingerprints])
+
+    def exclude_from(self, rows):
+        """
+        method to exclude rows with saved fingerprints from queryset
+        :param rows: queryset of transactions
+        :return: queryset
+        """
+        if not self.created:
+            return rows
+        quote = connections[self.using].ops.quote_name
+        return rows.exclude(fingerprint__in=RawSQL(f"SELECT {quote('fingerprint')} FROM {quote(self.TABLE)}", []))
+
+
+def remove_stale_transactions(generation_id, date_from, date_to, last_id, kept, rollups, chunk_size):
+    """
+    function to remove rows of generation stored before upload in range of dates which weren't found
+    in uploaded file. Stale rows are read and removed by chunks in order of id, so memory doesn't depend on
+    count of removed rows. Totals of generation are changed in the same database transaction,
+    removed sums are subtracted from rollups accumulator which is merged by caller
+    :param generation_id: id of generation
+    :param date_from: the first date of range
+    :param date_to: the last date of range
+    :param last_id: the biggest id of rows stored before upload
+    :param kept: KeptFingerprints object with fingerprints of rows which were found in file
+    :param rollups: RollupAccumulator object
+    :param chunk_size: count of rows read and removed at once
+    :return: count of removed rows
+    """
+    stale = kept.exclude_from(Transaction.all_objects.filter(generation_id=generation_id, date__gte=date_from,
+                                                             date__lte=date_to, pk__lte=last_id))
+    totals = {'i': 0, 'e': 0}
+    count = previous_id = 0
+    while chunk := list(stale.filter(pk__gt=previous_id).order_by('pk').values_list(
+            'pk', 'date', 'type', 'value', 'expense_category')[:chunk_size]):
+        for _, day, transaction_type, value, category in chunk:
+            cents = int(value.scaleb(2))
+            totals[transaction_type] += cents
+            rollups.add_day(day, transaction_type, category or '', -cents, -1)
+        # range of ids with the same conditions removes exactly rows of chunk without list of their ids in query
+        stale.filter(pk__gt=previous_id, pk__lte=chunk[-1][0]).purge()
+        count += len(chunk)
+        previous_id = chunk[-1][0]
+    if count:
+        Generation.apply(generation_id, -Decimal(totals['i']).scaleb(-2), -Decimal(totals['e']).scaleb(-2))
+    return count
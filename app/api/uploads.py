@@ -0,0 +1,119 @@
+"""File with digests of uploaded files: content is hashed while request body is read, result of upload
+is remembered by digest, so the same file sent again to unchanged dataset isn't parsed and loaded again"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db.models import F, Subquery
+
+from app.models import Dataset, UploadDigest
+
+
+class DigestUploadHandler(FileUploadHandler):
+    """Class upload handler which counts SHA-256 of each uploaded file and passes data to the next handlers,
+    it has to be the first one in FILE_UPLOAD_HANDLERS. Digests are stored in request.upload_digests
+    by names of fields"""
+
+    def __init__(self, request=None):
+        """
+        initial method
+        :param request: django request object
+        """
+        super().__init__(request)
+        self.hasher = None
+
+    def new_file(self, *args, **kwargs):
+        """
+        method to start hashing of the next file
+        :param args: standard options for unnamed parameters
+        :param kwargs: standard options for named parameters
+        :return: None
+        """
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        """
+        method to hash chunk of file, chunk is passed to the next handler without changes
+        :param raw_data: bytes with chunk
+        :param start: position of chunk in file
+        :return: the same bytes
+        """
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        """
+        method to store digest of file, file object is built by the next handlers
+        :param file_size: size of file in bytes
+        :return: None
+        """
+        if not hasattr(self.request, 'upload_digests'):
+            self.request.upload_digests = {}
+        self.request.upload_digests[self.field_name] = self.hasher.hexdigest()
+
+
+def get_upload_digest(request, field_name='data'):
+    """
+    function to get digest of uploaded file counted by DigestUploadHandler
+    :param request: django or DRF request object, files have to be already parsed
+    :param field_name: name of field with file
+    :return: str with hex digest or None if handler isn't enabled
+    """
+    return getattr(request, 'upload_digests', {}).get(field_name)
+
+
+def find_upload_result(digest, mode, tenant=Dataset.DEFAULT):
+    """
+    function to find result of upload of the same file in the same mode, result is valid only if current
+    generation of tenant wasn't changed after that upload
+    :param digest: str with hex digest of file
+    :param mode: replace, append or upsert
+    :param tenant: str with key of tenant
+    :return: dict with data of response or None
+    """
+    if not settings.UPLOAD_DIGESTS_MAX_SIZE:
+        return None
+    current = Dataset.objects.filter(tenant=tenant).values('current_id')[:1]
+    return UploadDigest.objects.filter(
+        digest=digest, mode=mode, generation_id=Subquery(current), generation__revision=F('revision'),
+    ).order_by('-pk').values_list('result', flat=True).first()
+
+
+def get_repeated_result(result, mode):
+    """
+    function to build response for file which was already uploaded in the same mode to unchanged dataset.
+    In replace mode dataset is the same as after that upload, in append and upsert modes all valid rows of file
+    are already stored, so nothing is inserted or removed. Flag skipped shows that file wasn't loaded again
+    :param result: dict with data of response of previous upload
+    :param mode: replace, append or upsert
+    :return: dict with data of response
+    """
+    result = {**result, 'skipped': True}
+    if mode != 'replace':
+        result.update(count=0, duplicates=result['count'] + result['duplicates'], removed=0)
+    return result
+
+
+def remember_upload_result(digest, mode, result, tenant=Dataset.DEFAULT):
+    """
+    function to store result of upload with current state of dataset, it has to be called in the same
+    database transaction as upload. The oldest digests above UPLOAD_DIGESTS_MAX_SIZE are removed
+    :param digest: str with hex digest of file
+    :param mode: replace, append or upsert
+    :param result: dict with data of response
+    :param tenant: str with key of tenant
+    :return: None
+    """
+    max_size = settings.UPLOAD_DIGESTS_MAX_SIZE
+    if not max_size:
+        return
+    current = Dataset.objects.filter(tenant=tenant).values_list('current_id', 'current__revision').first()
+    if current is None or current[0] is None:
+        return
+    UploadDigest.objects.filter(digest=digest, mode=mode, generation_id=current[0]).delete()
+    UploadDigest.objects.create(digest=digest, mode=mode, generation_id=current[0], revision=current[1],
+                                result=result)
+    cutoff = list(UploadDigest.objects.order_by('-pk').values_list('pk', flat=True)[max_size:max_size + 1])
+    if cutoff:
+        UploadDigest.objects.filter(pk__lte=cutoff[0]).delete()
@@ -1,9 +1,23 @@
 """File with my api urls"""
+from django.conf import settings
 from django.urls import path
 
-from app.api.resources import TransactionView, ReportView
+from app.api.resources import (AsyncReportView, AsyncTransactionView, LeanReportView, LeanTransactionView,
+                               MetricsView, ReportTimeseriesView, ReportView, TransactionExportView, TransactionView,
+                               UploadJobView)
+
+if settings.API_ASYNC_VIEWS:
+    transaction_view, report_view = AsyncTransactionView.as_view(), AsyncReportView.as_view()
+elif settings.API_LEAN_VIEWS:
+    transaction_view, report_view = LeanTransactionView.as_view(), LeanReportView.as_view()
+else:
+    transaction_view, report_view = TransactionView.as_view(), ReportView.as_view()
 
 urlpatterns = [
-    path('transactions', TransactionView.as_view()),
-    path('report', ReportView.as_view()),
+    path('transactions', transaction_view),
+    path('transactions/export.csv', TransactionExportView.as_view()),
+    path('transactions/jobs/<uuid:job_id>', UploadJobView.as_view()),
+    path('report', report_view),
+    path('report/timeseries', ReportTimeseriesView.as_view()),
+    path('metrics', MetricsView.as_view()),
 ]
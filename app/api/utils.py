@@ -1,11 +1,37 @@
-"""File with utilities, in this case only one function"""
+"""File with utilities to parse uploaded files and build reports"""
+import heapq
+import logging
+import random
+import re
+import threading
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from itertools import islice
 
-from django.db.models import Sum, Q
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, Sum
 
 from app.api.exceptions import InvalidInput
-from app.models import Transaction
+from app.api.metrics import timed
+from app.db import get_reports_database
+from app.models import Dataset, Generation, Transaction, get_fingerprint
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('.01')
+ZERO = Decimal('0.00')
+# values are stored as 64-bit count of cents, limit is the same as max_digits=10 of former DecimalField,
+# so sums of hundreds of millions of rows still fit
+MAX_CENTS = 10 ** 10
+AMOUNT_PATTERN = re.compile(r'([+-]?)(\d*)(?:\.(\d*))?', re.ASCII)
+# reasons of rejected rows: empty line, not UTF-8, not 4 columns, wrong date, type or amount, additional info which
+# doesn't fit to column (too long or with NUL character which PostgreSQL doesn't store in text)
+REJECT_REASONS = ('empty', 'encoding', 'columns', 'date', 'type', 'amount', 'info')
+INFO_MAX_LENGTH = Transaction._meta.get_field('expense_category').max_length
+# longer rejected rows are cut in sample, so memory of sample doesn't depend on the file
+REJECTED_ROW_MAX_LENGTH = 200
 
 
 def validate_and_prepare_transaction_row(row):
@@ -25,39 +51,368 @@ def validate_and_prepare_transaction_row(row):
         result['date'] = datetime.strptime(date.strip(), '%Y-%m-%d')
     except ValueError as error:
         raise InvalidInput from error
+    additional_info = additional_info.strip()
+    if len(additional_info) > INFO_MAX_LENGTH or '\x00' in additional_info:
+        raise InvalidInput
     if transaction_type.strip() == 'Expense':
         result['type'] = 'e'
-        result['expense_category'] = additional_info.strip()
+        result['expense_category'] = additional_info
     elif transaction_type.strip() == 'Income':
         result['type'] = 'i'
-        result['job_address'] = additional_info.strip()
+        result['job_address'] = additional_info
     else:
         raise InvalidInput
     try:
-        result['value'] = Decimal(str(value).strip()).quantize(Decimal('.01'))
+        result['value'] = Decimal(str(value).strip()).quantize(CENT)
     except InvalidOperation as error:
         raise InvalidInput from error
+    if not result['value'].is_finite() or abs(result['value'].scaleb(2)) >= MAX_CENTS:
+        raise InvalidInput
     return result
 
 
-def get_report_data():
+class RejectedRows:
+    """Class to count rejected rows by reason and keep uniform random sample of them with fixed size.
+    Each row gets random key and only rows with the smallest keys are kept, so samples of batches
+    are merged to sample of the whole file without keeping more than size rows of each batch"""
+
+    __slots__ = ('size', 'count', 'reasons', 'sample')
+
+    def __init__(self, size):
+        """
+        initial method
+        :param size: maximal count of rows in sample, 0 disables sample
+        """
+        self.size = size
+        self.count = 0
+        self.reasons = dict.fromkeys(REJECT_REASONS, 0)
+        # heap of tuples (negative key, line, reason, row), its first item has the biggest key
+        self.sample = []
+
+    def add(self, line, reason, row):
+        """
+        method to count rejected row and put it to sample
+        :param line: number of row, from 0
+        :param reason: one of REJECT_REASONS
+        :param row: bytes or str with row from file
+        :return: None
+        """
+        self.count += 1
+        self.reasons[reason] += 1
+        self.push(-random.random(), line, reason, row[:REJECTED_ROW_MAX_LENGTH])
+
+    def add_empty(self):
+        """
+        method to count empty line, they aren't put to sample because they don't show any mistake
+        :return: None
+        """
+        self.count += 1
+        self.reasons['empty'] += 1
+
+    def push(self, key, line, reason, row):
+        """
+        method to put row to sample if its key is among the smallest ones
+        :param key: negative random key
+        :param line: number of row, from 0
+        :param reason: one of REJECT_REASONS
+        :param row: bytes or str cut to REJECTED_ROW_MAX_LENGTH
+        :return: None
+        """
+        if len(self.sample) < self.size:
+            heapq.heappush(self.sample, (key, line, reason, row))
+        elif self.sample and key > self.sample[0][0]:
+            heapq.heapreplace(self.sample, (key, line, reason, row))
+
+    def merge(self, other, offset=0):
+        """
+        method to add counts and sample of rows of next part of file
+        :param other: RejectedRows object
+        :param offset: count of rows in file before the part
+        :return: None
+        """
+        self.count += other.count
+        for reason, count in other.reasons.items():
+            self.reasons[reason] += count
+        for key, line, reason, row in other.sample:
+            self.push(key, line + offset, reason, row)
+
+    def to_dict(self):
+        """
+        method to build summary for response
+        :return: dict with count of rejected rows, counts by reason and sample sorted by line,
+        lines are numbered from 1
+        """
+        return {
+            'count': self.count,
+            'reasons': dict(self.reasons),
+            'sample': [{'line': line + 1, 'reason': reason,
+                        'row': row.decode(errors='replace').rstrip('\r\n') if isinstance(row, bytes) else row}
+                       for _, line, reason, row in sorted(self.sample, key=lambda item: item[1])],
+        }
+
+
+class TransactionColumns:
+    """Class to keep parsed rows column by column, values are stored as integer count of cents"""
+
+    __slots__ = ('date', 'type', 'value', 'expense_category', 'job_address', 'fingerprint', 'rejected')
+
+    def __init__(self):
+        """
+        initial method
+        """
+        self.date = []
+        self.type = []
+        self.value = []
+        self.expense_category = []
+        self.job_address = []
+        self.fingerprint = []
+        self.rejected = RejectedRows(settings.TRANSACTIONS_REJECTED_SAMPLE_SIZE)
+
+    def __len__(self):
+        """
+        method to get count of valid rows
+        :return: count of valid rows
+        """
+        return len(self.date)
+
+    @property
+    def skipped(self):
+        """
+        property with count of rejected rows
+        :return: int
+        """
+        return self.rejected.count
+
+    def to_transactions(self, generation_id=None):
+        """
+        method to build objects for ORM from columns
+        :param generation_id: id of generation which objects belong to, current generation by default
+        :return: list of not saved Transaction objects
+        """
+        return [Transaction(generation_id=generation_id, date=date, type=transaction_type, value=Decimal(value).scaleb(-2),
+                            expense_category=expense_category, job_address=job_address, fingerprint=fingerprint)
+                for date, transaction_type, value, expense_category, job_address, fingerprint
+                in zip(self.date, self.type, self.value, self.expense_category, self.job_address, self.fingerprint)]
+
+    def select(self, mask):
+        """
+        method to build columns only with rows for which mask is true, rejected rows are kept
+        :param mask: list of bool values, one per row
+        :return: TransactionColumns object
+        """
+        columns = TransactionColumns()
+        for name in self.__slots__[:-1]:
+            setattr(columns, name, [value for value, selected in zip(getattr(self, name), mask) if selected])
+        columns.rejected = self.rejected
+        return columns
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value):
     """
-    function to get values from database
+    function to parse date, cached because files usually contain many rows for the same day
+    :param value: stripped string with date
+    :return: date object or None if value isn't a date in format YYYY-MM-DD
+    """
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def parse_amount_to_cents(value):
+    """
+    function to convert string with decimal value to integer count of cents,
+    rounding is the same as in Decimal(value).quantize(CENT) but without creation of Decimal
+    for plain values like 12, -12.3 or 12.345
+    :param value: stripped string with value
+    :return: int with count of cents
+    """
+    match = AMOUNT_PATTERN.fullmatch(value)
+    if match is None:
+        try:
+            amount = Decimal(value).quantize(CENT)
+        except InvalidOperation as error:
+            raise InvalidInput from error
+        if not amount.is_finite() or abs(amount.scaleb(2)) >= MAX_CENTS:
+            raise InvalidInput
+        return int(amount.scaleb(2))
+    sign, integer, fraction = match.groups()
+    if not integer and not fraction:
+        raise InvalidInput
+    fraction = fraction or ''
+    cents = int(integer or '0') * 100 + int(fraction[:2].ljust(2, '0'))
+    rest = fraction[2:].rstrip('0')
+    # round half to even, like default Decimal context does
+    if rest and (rest[0] > '5' or (rest[0] == '5' and (len(rest) > 1 or cents % 2))):
+        cents += 1
+    if cents >= MAX_CENTS:
+        raise InvalidInput
+    return -cents if sign == '-' else cents
+
+
+def parse_transaction_rows(rows):
+    """
+    function to validate many rows from file at once and transform them to columns,
+    rows are accepted and skipped by the same rules as in validate_and_prepare_transaction_row.
+    Rejected rows are only counted by reason and sampled, line of row is count of rows before it,
+    so valid rows don't pay for numbering
+    :param rows: iterable with rows from input file
+    :return: TransactionColumns object with valid rows and rejected rows
+    """
+    columns = TransactionColumns()
+    dates, types, values = columns.date, columns.type, columns.value
+    categories, addresses, fingerprints = columns.expense_category, columns.job_address, columns.fingerprint
+    rejected = columns.rejected
+    for row in rows:
+        if not isinstance(row, bytes):
+            rejected.add(len(dates) + rejected.count, 'encoding', str(row))
+            continue
+        try:
+            fields = row.decode().strip().split(',')
+        except UnicodeDecodeError:
+            rejected.add(len(dates) + rejected.count, 'encoding', row)
+            continue
+        if len(fields) != 4:
+            if fields == ['']:
+                rejected.add_empty()
+            else:
+                rejected.add(len(dates) + rejected.count, 'columns', row)
+            continue
+        date_text = fields[0].strip()
+        date = parse_date(date_text)
+        if date is None:
+            rejected.add(len(dates) + rejected.count, 'date', row)
+            continue
+        transaction_type = fields[1].strip()
+        if transaction_type != 'Expense' and transaction_type != 'Income':
+            rejected.add(len(dates) + rejected.count, 'type', row)
+            continue
+        try:
+            value = parse_amount_to_cents(fields[2].strip())
+        except InvalidInput:
+            rejected.add(len(dates) + rejected.count, 'amount', row)
+            continue
+        info = fields[3].strip()
+        if len(info) > INFO_MAX_LENGTH or '\x00' in info:
+            rejected.add(len(dates) + rejected.count, 'info', row)
+            continue
+        dates.append(date)
+        values.append(value)
+        # date without leading zeros is valid too, fingerprint is counted for canonical format
+        if len(date_text) != 10:
+            date_text = date.isoformat()
+        if transaction_type == 'Expense':
+            types.append('e')
+            categories.append(info)
+            addresses.append(None)
+            fingerprints.append(get_fingerprint(date_text, 'e', value, info))
+        else:
+            types.append('i')
+            categories.append(None)
+            addresses.append(info)
+            fingerprints.append(get_fingerprint(date_text, 'i', value, info))
+    return columns
+
+
+def iter_batches(iterable, size):
+    """
+    generator to split any iterable to lists with fixed maximal length
+    :param iterable: any iterable, could be a generator
+    :param size: maximal length of each batch
+    :return: generator of lists, only the last one could be shorter than size
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def collect_retired_generations():
+    """
+    function to remove retired generations, errors are only logged because it runs in background
+    :return: None
+    """
+    try:
+        with timed('upload_stage_seconds', stage='collect'):
+            Generation.collect_retired(settings.GENERATIONS_GC_CHUNK_SIZE)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Garbage collection of retired generations failed")
+    finally:
+        connection.close()
+
+
+def start_collect_retired_generations():
+    """
+    function to run garbage collection of retired generations in background thread
+    :return: None
+    """
+    threading.Thread(target=collect_retired_generations, name='collect-generations', daemon=True).start()
+
+
+def build_report(incomes, expenses):
+    """
+    function to build report from sums, sums read from CentsField already have exactly 2 decimal places
+    so they aren't quantized
+    :param incomes: Decimal with sum of incomes or None
+    :param expenses: Decimal with sum of expenses or None
     :return: dict with
     gross-revenue - sum of all incomes
     expenses - sum of all expenses
     net-revenue - gross-revenue minus expenses
     """
-    expense_sum_filter = Sum('value', filter=Q(type='e'))
-    income_sum_filter = Sum('value', filter=Q(type='i'))
-    aggregation = Transaction.objects.aggregate(expenses=expense_sum_filter,
-                                                incomes=income_sum_filter)
-    incomes = aggregation.get('incomes') if aggregation.get('incomes') else Decimal(0)
-    expenses = aggregation.get('expenses') if aggregation.get('expenses') else Decimal(0)
-    net = incomes - expenses
+    incomes = incomes if incomes is not None else ZERO
+    expenses = expenses if expenses is not None else ZERO
     data = {
-        "gross-revenue": incomes.quantize(Decimal('.01')),
-        "expenses": expenses.quantize(Decimal('.01')),
-        "net-revenue": net.quantize(Decimal('.01')),
+        "gross-revenue": incomes,
+        "expenses": expenses,
+        "net-revenue": incomes - expenses,
     }
     return data
+
+
+def get_report_data(filters=None, tenant=Dataset.DEFAULT):
+    """
+    function to get values from database. Without filters values are read from running totals
+    of current generation so cost doesn't depend on count of transactions,
+    filtered report is counted by range scan of one of indexes of Transaction. Data is read by connection
+    REPORTS_DATABASE
+    :param filters: dict with lookups for Transaction queryset, f.e. {'type': 'e', 'date__gte': date(2020, 1, 1)}
+    :param tenant: str with key of tenant
+    :return: dict with
+    gross-revenue - sum of incomes
+    expenses - sum of expenses
+    net-revenue - gross-revenue minus expenses
+    """
+    using = get_reports_database()
+    if filters:
+        with timed('report_query_seconds', kind='filtered'):
+            aggregation = Transaction.objects.db_manager(using).for_tenant(tenant).filter(**filters).aggregate(
+                incomes=Sum('value', filter=Q(type='i')), expenses=Sum('value', filter=Q(type='e')))
+        return build_report(aggregation['incomes'], aggregation['expenses'])
+    with timed('report_query_seconds', kind='totals'):
+        totals = Dataset.objects.using(using).filter(tenant=tenant).values(
+            'current__incomes', 'current__expenses').first()
+    if totals is None:
+        return build_report(None, None)
+    return build_report(totals['current__incomes'], totals['current__expenses'])
+
+
+async def aget_report_data(filters=None, tenant=Dataset.DEFAULT):
+    """
+    coroutine with the same result as get_report_data which uses async interface of ORM
+    :param filters: dict with lookups for Transaction queryset
+    :param tenant: str with key of tenant
+    :return: dict with the same data as get_report_data returns
+    """
+    using = get_reports_database()
+    if filters:
+        with timed('report_query_seconds', kind='filtered'):
+            aggregation = await Transaction.objects.db_manager(using).for_tenant(tenant).filter(**filters).aaggregate(
+                incomes=Sum('value', filter=Q(type='i')), expenses=Sum('value', filter=Q(type='e')))
+        return build_report(aggregation['incomes'], aggregation['expenses'])
+    with timed('report_query_seconds', kind='totals'):
+        totals = await Dataset.objects.using(using).filter(tenant=tenant).values(
+            'current__incomes', 'current__expenses').afirst()
+    if totals is None:
+        return build_report(None, None)
+    return build_report(totals['current__incomes'], totals['current__expenses'])
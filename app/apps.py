@@ -1,8 +1,17 @@
 """File to config app."""
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class AppConf(AppConfig):
     """Class to config app."""
     default_auto_field = "django.db.models.BigAutoField"
     name = "app"
+
+    def ready(self):
+        """
+        method to connect receivers of signals
+        :return: None
+        """
+        from app.db import configure_sqlite_connection  # pylint: disable=import-outside-toplevel
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='configure_sqlite_connection')
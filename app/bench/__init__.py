@@ -0,0 +1,56 @@
+"""Package with benchmarks, run each module with python -m app.bench.<name> --help"""
+import os
+
+
+def setup_django():
+    """
+    function to configure django for benchmark scripts started outside of manage.py
+    :return: None
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "canonical.settings")
+    import django  # pylint: disable=import-outside-toplevel
+    django.setup()
+
+
+class TemporaryDatabase:
+    """Class context manager which creates empty database like test runner does and removes it at the end,
+    so benchmarks never touch real data, under test runner the test database is used as is. Aliases which are
+    test mirrors of database (f.e. read-only connection for reports) are pointed to the temporary database too"""
+
+    def __init__(self, using='default'):
+        """
+        initial method
+        :param using: database alias
+        """
+        self.using = using
+        self.old_name = None
+        self.mirrors = {}
+
+    def __enter__(self):
+        """
+        method to create database and apply migrations
+        :return: database connection
+        """
+        from django.db import connections  # pylint: disable=import-outside-toplevel
+        connection = connections[self.using]
+        if connection.settings_dict['NAME'] != connection.creation._get_test_db_name():  # pylint: disable=protected-access
+            self.old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            for alias in connections:
+                if connections[alias].settings_dict['TEST']['MIRROR'] == self.using:
+                    self.mirrors[alias] = connections[alias].settings_dict['NAME']
+                    connections[alias].close()
+                    connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+        return connection
+
+    def __exit__(self, *args):
+        """
+        method to remove database
+        :param args: information about exception
+        :return: None
+        """
+        from django.db import connections  # pylint: disable=import-outside-toplevel
+        for alias, name in self.mirrors.items():
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = name
+        if self.old_name is not None:
+            connections[self.using].creation.destroy_test_db(self.old_name, verbosity=0)
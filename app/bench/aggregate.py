@@ -0,0 +1,89 @@
+"""Benchmark of aggregation of money values: the same rows are stored once as decimal column
+(like DecimalField was stored before) and once as integer count of cents (like CentsField stores them),
+report query with sums of incomes and expenses is run over both tables.
+
+Usage: python -m app.bench.aggregate --rows 100000 1000000 --repeat 5
+"""
+import argparse
+import time
+from decimal import Decimal
+
+from app.bench import TemporaryDatabase, setup_django
+
+TABLES = {
+    'decimal': 'decimal(10, 2)',
+    'cents': 'bigint',
+}
+REPORT_SQL = ("SELECT SUM(CASE WHEN type = 'i' THEN value END), SUM(CASE WHEN type = 'e' THEN value END) "
+              "FROM bench_{name}")
+
+
+def fill_tables(connection, rows, batch_size):
+    """
+    function to create tables and fill them by the same generated rows
+    :param connection: database connection
+    :param rows: count of rows
+    :param batch_size: count of rows inserted at once
+    :return: None
+    """
+    # pylint: disable=import-outside-toplevel
+    from app.api.utils import iter_batches, parse_transaction_rows
+    from app.bench.data import iter_rows
+
+    with connection.cursor() as cursor:
+        for name, column_type in TABLES.items():
+            cursor.execute(f"DROP TABLE IF EXISTS bench_{name}")
+            cursor.execute(f"CREATE TABLE bench_{name} (type varchar(1) NOT NULL, value {column_type} NOT NULL)")
+        for batch in iter_batches(iter_rows(rows), batch_size):
+            columns = parse_transaction_rows(batch)
+            cursor.executemany("INSERT INTO bench_decimal (type, value) VALUES (%s, %s)",
+                               [(transaction_type, Decimal(value).scaleb(-2))
+                                for transaction_type, value in zip(columns.type, columns.value)])
+            cursor.executemany("INSERT INTO bench_cents (type, value) VALUES (%s, %s)",
+                               list(zip(columns.type, columns.value)))
+
+
+def measure(connection, name, repeat):
+    """
+    function to run report query several times
+    :param connection: database connection
+    :param name: name of table from TABLES
+    :param repeat: count of runs
+    :return: tuple with the best time in seconds and sums as Decimal
+    """
+    best = None
+    with connection.cursor() as cursor:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cursor.execute(REPORT_SQL.format(name=name))
+            incomes, expenses = cursor.fetchone()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+    if name == 'cents':
+        return best, (Decimal(incomes).scaleb(-2), Decimal(expenses).scaleb(-2))
+    return best, (Decimal(str(incomes)), Decimal(str(expenses)))
+
+
+def main():
+    """
+    function to run benchmark and print time of report query and sums for each way to store values
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+    setup_django()
+
+    with TemporaryDatabase() as connection:
+        for rows in args.rows:
+            fill_tables(connection, rows, args.batch_size)
+            for name in TABLES:
+                elapsed, (incomes, expenses) = measure(connection, name, args.repeat)
+                print(f"{rows:>10} rows  {name:<8} {elapsed * 1000:10.1f} ms  {rows / elapsed:14.0f} rows/s  "
+                      f"incomes {incomes}  expenses {expenses}")
+
+
+if __name__ == '__main__':
+    main()
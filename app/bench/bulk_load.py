@@ -0,0 +1,64 @@
+"""Benchmark of loading of parsed rows: ORM bulk_create against native loader of database
+(executemany for SQLite, COPY for PostgreSQL). Parsing isn't measured.
+
+Usage: python -m app.bench.bulk_load --rows 10000 1000000 10000000
+"""
+import argparse
+import time
+
+from app.bench import TemporaryDatabase, setup_django
+
+
+def measure(loader, rows, batch_size):
+    """
+    function to load generated rows to new generation by batches
+    :param loader: function with arguments (generation_id, columns)
+    :param rows: count of rows
+    :param batch_size: count of rows loaded at once
+    :return: seconds spent in loader
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.db import transaction
+    from app.api.utils import iter_batches, parse_transaction_rows
+    from app.bench.data import iter_rows
+    from app.models import Generation, Transaction
+
+    elapsed = 0.0
+    with transaction.atomic():
+        generation = Generation.objects.create()
+        for batch in iter_batches(iter_rows(rows), batch_size):
+            columns = parse_transaction_rows(batch)
+            started = time.perf_counter()
+            loader(generation.pk, columns)
+            elapsed += time.perf_counter() - started
+    Transaction.all_objects.filter(generation=generation).purge()
+    generation.delete()
+    return elapsed
+
+
+def main():
+    """
+    function to run benchmark and print rows per second for each loader
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 1000000, 10000000])
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    setup_django()
+    # pylint: disable=import-outside-toplevel
+    from app.api.loaders import load_transactions, load_with_bulk_create
+
+    with TemporaryDatabase() as connection:
+        loaders = {
+            'bulk_create': lambda generation_id, columns: load_with_bulk_create(connection, generation_id, columns),
+            f'native ({connection.vendor})': load_transactions,
+        }
+        for rows in args.rows:
+            for name, loader in loaders.items():
+                elapsed = measure(loader, rows, args.batch_size)
+                print(f"{rows:>10} rows  {name:<20} {rows / elapsed:12.0f} rows/s  {elapsed:8.2f} s")
+
+
+if __name__ == '__main__':
+    main()
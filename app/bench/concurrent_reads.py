@@ -0,0 +1,123 @@
+"""Benchmark of report latency while large file is uploaded: reader threads request totals and filtered
+report in a loop, latency is printed for idle database and during upload. Run it with default settings
+(rollback journal, reports are read by the same connection alias as uploads) and with production profile
+(WAL, read-only connection for reports) to compare them.
+
+Usage: python -m app.bench.concurrent_reads --rows 1000000 --readers 4
+       DJANGO_SETTINGS_MODULE=canonical.settings_production python -m app.bench.concurrent_reads --rows 1000000
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+from app.bench import TemporaryDatabase, setup_django
+
+FILTERS = (None, {'type': 'e'})
+
+
+def read_reports(stop, latencies, errors):
+    """
+    function of reader thread which builds reports without cache until stop is set
+    :param stop: threading.Event
+    :param latencies: list to append latency of each report in seconds
+    :param errors: list to append text of each failed report
+    :return: None
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.db import DatabaseError, connections
+    from app.api.utils import get_report_data
+
+    try:
+        while not stop.is_set():
+            for filters in FILTERS:
+                started = time.perf_counter()
+                try:
+                    get_report_data(filters)
+                except DatabaseError as error:
+                    errors.append(str(error))
+                    continue
+                latencies.append(time.perf_counter() - started)
+    finally:
+        connections.close_all()
+
+
+def measure(readers, action):
+    """
+    function to run reader threads while action is running
+    :param readers: count of reader threads
+    :param action: function without arguments
+    :return: tuple (list of latencies in seconds, list of errors)
+    """
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [threading.Thread(target=read_reports, args=(stop, latencies, errors)) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    try:
+        action()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return latencies, errors
+
+
+def print_latencies(name, latencies, errors, elapsed):
+    """
+    function to print statistics of reads
+    :param name: name of phase
+    :param latencies: list of latencies in seconds
+    :param errors: list of errors
+    :param elapsed: duration of phase in seconds
+    :return: None
+    """
+    if len(latencies) < 2:
+        print(f"{name:<8} {len(latencies):8} reads {len(errors):6} errors in {elapsed:6.2f} s")
+        return
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(f"{name:<8} {len(latencies):8} reads {len(errors):6} errors in {elapsed:6.2f} s  "
+          f"p50 {percentiles[49] * 1000:8.2f} ms  p99 {percentiles[98] * 1000:8.2f} ms  "
+          f"max {max(latencies) * 1000:8.2f} ms")
+
+
+def main():
+    """
+    function to run benchmark and print latency of reports without upload and during upload
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help="Count of rows in uploaded file")
+    parser.add_argument('--base-rows', type=int, default=100000, help="Count of rows in dataset before upload")
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--idle', type=float, default=2.0, help="Seconds of reads without upload")
+    args = parser.parse_args()
+    setup_django()
+    # pylint: disable=import-outside-toplevel
+    from django.db import connections
+    from django.test import override_settings
+    from app.bench.data import iter_rows
+    from app.bench.suite import upload
+    from app.db import get_reports_database
+
+    base = b'\n'.join(iter_rows(args.base_rows))
+    content = b'\n'.join(iter_rows(args.rows, seed=1))
+    with TemporaryDatabase() as connection, override_settings(GENERATIONS_GC_IN_BACKGROUND=False):
+        upload(base)
+        database = connection.vendor
+        if database == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                database += f' with journal mode {cursor.fetchone()[0]}'
+        print(f"settings {os.environ['DJANGO_SETTINGS_MODULE']}, {database}, "
+              f"reports are read by '{get_reports_database()}'")
+        for name, action in (('idle', lambda: time.sleep(args.idle)), ('upload', lambda: upload(content))):
+            started = time.perf_counter()
+            latencies, errors = measure(args.readers, action)
+            print_latencies(name, latencies, errors, time.perf_counter() - started)
+        connections.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""File with generator of synthetic files with transactions"""
+import random
+from datetime import date, timedelta
+
+INVALID_ROWS = (
+    '{date}, {type}, {value}',
+    '{date}, {type}, {value}, {info}, extra',
+    '2020-13-{day:02d}, {type}, {value}, {info}',
+    '{date}, Transfer, {value}, {info}',
+    '{date}, {type}, {day}abc, {info}',
+)
+CATEGORIES = ('Fuel', 'Repairs', 'Food', 'Tools', 'Insurance')
+ADDRESSES = ('347 Woodrow', '219 Pleasant', 'Blackburn St.', '19 Maple Dr.', '12 Oak Ave.')
+
+
+def iter_rows(rows, invalid_ratio=0.0, seed=0, start=date(2020, 1, 1), days=3 * 365):
+    """
+    generator of rows in format of uploaded file, the same arguments always give the same rows
+    :param rows: count of rows
+    :param invalid_ratio: part of rows (from 0 to 1) which have to be skipped by parser
+    :param seed: seed for random generator
+    :param start: the earliest date of transactions
+    :param days: count of days from start date to spread transactions over
+    :return: generator of bytes without line ending
+    """
+    generator = random.Random(seed)
+    for _ in range(rows):
+        day = generator.randrange(days)
+        is_income = generator.random() < 0.5
+        values = {
+            'date': (start + timedelta(days=day)).isoformat(),
+            'day': day % 28 + 1,
+            'type': 'Income' if is_income else 'Expense',
+            'value': f'{generator.randrange(1, 100000) / 100:.2f}',
+            'info': generator.choice(ADDRESSES if is_income else CATEGORIES),
+        }
+        if generator.random() < invalid_ratio:
+            template = generator.choice(INVALID_ROWS)
+        else:
+            template = '{date}, {type}, {value}, {info}'
+        yield template.format(**values).encode()
+
+
+def write_file(path, rows, invalid_ratio=0.0, seed=0):
+    """
+    function to write generated rows to file
+    :param path: path to file
+    :param rows: count of rows
+    :param invalid_ratio: part of rows (from 0 to 1) which have to be skipped by parser
+    :param seed: seed for random generator
+    :return: size of file in bytes
+    """
+    size = 0
+    with open(path, 'wb') as file:
+        for row in iter_rows(rows, invalid_ratio, seed):
+            size += file.write(row + b'\n')
+    return size
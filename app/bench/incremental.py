@@ -0,0 +1,75 @@
+"""Benchmark of upload of file which was already loaded with a few new rows: full replace against
+append and upsert modes which insert only rows with new fingerprints. Parsing of the same file is measured
+separately as the lower bound. The last line is the same file sent again to unchanged dataset, its result is
+found by digest of file.
+
+Usage: python -m app.bench.incremental --rows 1000000 --new-rows 1000
+"""
+import argparse
+import hashlib
+import time
+
+from app.bench import TemporaryDatabase, setup_django
+
+MODES = ('replace', 'append', 'upsert')
+
+
+def upload(content, mode, digest=None):
+    """
+    function to upload content like POST /transactions does
+    :param content: bytes with file
+    :param mode: replace, append or upsert
+    :param digest: str with hex digest of file or None
+    :return: dict with result of upload
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from app.api.serializers import TransactionFileSerializer
+
+    serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile('bench.csv', content)})
+    serializer.is_valid(raise_exception=True)
+    return serializer.save_transactions(mode, digest=digest)
+
+
+def main():
+    """
+    function to run benchmark and print time of upload in each mode
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--new-rows', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+    setup_django()
+    # pylint: disable=import-outside-toplevel
+    from django.test import override_settings
+    from app.api.utils import iter_batches, parse_transaction_rows
+    from app.bench.data import iter_rows
+    from app.models import Generation
+
+    # the first rows are the same for any count of rows, so the second file is the first one with new lines
+    base = b'\n'.join(iter_rows(args.rows))
+    content = b'\n'.join(iter_rows(args.rows + args.new_rows))
+    with TemporaryDatabase(), override_settings(TRANSACTIONS_BATCH_SIZE=args.batch_size,
+                                                GENERATIONS_GC_IN_BACKGROUND=False):
+        started = time.perf_counter()
+        for batch in iter_batches(content.splitlines(), args.batch_size):
+            parse_transaction_rows(batch)
+        print(f"{'parse only':<10} {time.perf_counter() - started:8.2f} s")
+        for mode in MODES:
+            upload(base, 'replace')
+            Generation.collect_retired(10000)
+            started = time.perf_counter()
+            result = upload(content, mode)
+            print(f"{mode:<10} {time.perf_counter() - started:8.2f} s  {result}")
+        digest = hashlib.sha256(content).hexdigest()
+        upload(content, 'replace', digest)
+        started = time.perf_counter()
+        # the same request hashes file while body is read, so digest is counted in timing too
+        result = upload(content, 'replace', hashlib.sha256(content).hexdigest())
+        print(f"{'repeated':<10} {time.perf_counter() - started:8.2f} s  {result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Load test of running server: many concurrent clients poll one url by keep-alive connections,
+throughput and latency percentiles are printed for each level of concurrency. Client is plain asyncio,
+so one process can keep thousands of connections.
+
+Compare WSGI and ASGI by the same run against both servers, f.e.
+
+    python -m app.bench.load --url http://127.0.0.1:8000/report --concurrency 10 100 1000 \\
+        --server-command "gunicorn canonical.wsgi --workers 1 --threads 32 --bind 127.0.0.1:8000"
+    API_ASYNC_VIEWS=1 python -m app.bench.load --url http://127.0.0.1:8000/report --concurrency 10 100 1000 \\
+        --server-command "uvicorn canonical.asgi:application --workers 1 --port 8000"
+
+Server command is started before test and stopped after it, without it server has to be started manually.
+With --etag clients send If-None-Match with the ETag of the first response, like pollers which got report already.
+"""
+import argparse
+import asyncio
+import os
+import shlex
+import socket
+import subprocess
+import time
+from urllib.parse import urlsplit
+
+
+async def read_response(reader):
+    """
+    coroutine to read one HTTP/1.1 response with Content-Length
+    :param reader: asyncio StreamReader
+    :return: tuple with status code, dict with lowercase headers and body
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by server")
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+        name, _, value = line.decode('latin1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(status_line.split()[1]), headers, body
+
+
+class LoadTest:
+    """Class to send requests by many concurrent keep-alive connections and collect latencies"""
+
+    def __init__(self, url, requests, etag=None):
+        """
+        initial method
+        :param url: url to request
+        :param requests: total count of requests
+        :param etag: value of If-None-Match header or None
+        """
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.request = (f"GET {parts.path or '/'}{'?' + parts.query if parts.query else ''} HTTP/1.1\r\n"
+                        f"Host: {parts.netloc}\r\n"
+                        + (f"If-None-Match: {etag}\r\n" if etag else '') + "\r\n").encode('latin1')
+        self.remaining = requests
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+    async def client(self):
+        """
+        coroutine of one client which sends requests one by one until all requests are sent
+        :return: None
+        """
+        reader = writer = None
+        while self.remaining > 0:
+            self.remaining -= 1
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(self.host, self.port)
+                writer.write(self.request)
+                status, headers, _ = await read_response(reader)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                self.errors += 1
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                continue
+            self.latencies.append(time.perf_counter() - started)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if headers.get('connection', '').lower() == 'close':
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    async def run(self, concurrency):
+        """
+        coroutine to run clients
+        :param concurrency: count of concurrent clients
+        :return: seconds spent
+        """
+        started = time.perf_counter()
+        await asyncio.gather(*(self.client() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+
+def get_percentile(values, percent):
+    """
+    function to get percentile of sorted values
+    :param values: sorted list
+    :param percent: percentile from 0 to 100
+    :return: value or None for empty list
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def get_etag(url):
+    """
+    coroutine to get ETag of url by one request
+    :param url: url to request
+    :return: str with ETag or None
+    """
+    test = LoadTest(url, 0)
+    reader, writer = await asyncio.open_connection(test.host, test.port)
+    writer.write(test.request)
+    _, headers, _ = await read_response(reader)
+    writer.close()
+    return headers.get('etag')
+
+
+def wait_for_port(host, port, timeout):
+    """
+    function to wait until server accepts connections
+    :param host: host of server
+    :param port: port of server
+    :param timeout: seconds to wait
+    :return: None
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def main():
+    """
+    function to run load test and print requests per second and latencies for each level of concurrency
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000/report')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--requests', type=int, default=10000, help="Count of requests for each level of concurrency")
+    parser.add_argument('--etag', action='store_true', help="Send If-None-Match with actual ETag")
+    parser.add_argument('--server-command', help="Command to start server before test")
+    args = parser.parse_args()
+
+    parts = urlsplit(args.url)
+    server = None
+    if args.server_command:
+        server = subprocess.Popen(shlex.split(args.server_command), env=os.environ.copy())  # pylint: disable=consider-using-with
+    try:
+        wait_for_port(parts.hostname, parts.port or 80, timeout=30)
+        etag = asyncio.run(get_etag(args.url)) if args.etag else None
+        print(f"{'clients':>8} {'requests/s':>12} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}  statuses")
+        for concurrency in args.concurrency:
+            test = LoadTest(args.url, args.requests, etag)
+            elapsed = asyncio.run(test.run(concurrency))
+            latencies = sorted(test.latencies)
+            p50, p99 = get_percentile(latencies, 50), get_percentile(latencies, 99)
+            print(f"{concurrency:>8} {len(latencies) / elapsed:12.0f} {(p50 or 0) * 1000:9.1f} {(p99 or 0) * 1000:9.1f} "
+                  f"{(latencies[-1] if latencies else 0) * 1000:9.1f} {test.errors:>7}  {test.statuses}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark of reading of transactions: page at different depth by OFFSET against keyset (seek) pagination
+of GET /transactions, and full export to CSV with peak of memory allocated by python during export.
+
+Usage: python -m app.bench.pagination --rows 1000000 --limit 100 --depths 0 0.5 0.99
+"""
+import argparse
+import time
+import tracemalloc
+
+from app.bench import TemporaryDatabase, setup_django
+
+
+def load_rows(rows, batch_size):
+    """
+    function to upload generated rows like POST /transactions does
+    :param rows: count of rows
+    :param batch_size: count of rows in one batch
+    :return: None
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import override_settings
+    from app.api.serializers import TransactionFileSerializer
+    from app.bench.data import iter_rows
+
+    content = b'\n'.join(iter_rows(rows))
+    with override_settings(TRANSACTIONS_BATCH_SIZE=batch_size, GENERATIONS_GC_IN_BACKGROUND=False):
+        serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile('bench.csv', content)})
+        serializer.is_valid(raise_exception=True)
+        serializer.create_transactions()
+
+
+def measure(function, repeat):
+    """
+    function to find the best time of several runs
+    :param function: function without arguments
+    :param repeat: count of runs
+    :return: seconds
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    """
+    function to run benchmark and print time of page for each depth and time and memory of export
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--depths', type=float, nargs='+', default=[0, 0.5, 0.99],
+                        help="Position of page as part of dataset")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched at once by export")
+    args = parser.parse_args()
+    setup_django()
+    # pylint: disable=import-outside-toplevel
+    from app.api.transactions import PAGE_FIELDS, encode_cursor, get_transactions_page, iter_transactions_csv
+    from app.models import Dataset, Transaction
+
+    with TemporaryDatabase():
+        load_rows(args.rows, args.batch_size)
+        generation_id = Dataset.get_current_generation_id()
+        rows = Transaction.all_objects.filter(generation_id=generation_id).order_by('date', 'id')
+        print(f"{'depth':>8} {'offset ms':>10} {'keyset ms':>10}")
+        for depth in args.depths:
+            offset = int((args.rows - args.limit) * depth)
+            page = rows.values(*PAGE_FIELDS)[offset:offset + args.limit]
+            previous = rows.values_list('date', 'id')[offset - 1] if offset else None
+            cursor = encode_cursor(generation_id, *previous) if previous else None
+            offset_time = measure(lambda: list(page.all()), args.repeat)  # pylint: disable=cell-var-from-loop
+            keyset_time = measure(lambda: get_transactions_page(args.limit, cursor),  # pylint: disable=cell-var-from-loop
+                                  args.repeat)
+            print(f"{depth:>8.2f} {offset_time * 1000:10.2f} {keyset_time * 1000:10.2f}")
+
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in iter_transactions_csv(args.chunk_size))
+        elapsed = time.perf_counter() - started
+        # tracing slows allocations down, so memory is measured by separate run
+        tracemalloc.start()
+        for _ in iter_transactions_csv(args.chunk_size):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"export: {args.rows} rows, {size / 2 ** 20:.1f} MiB of CSV in {elapsed:.2f} s "
+              f"({args.rows / elapsed:.0f} rows/s), peak of python memory {peak / 2 ** 20:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Benchmark of parallel parsing of big files, shows how speed depends on count of processes.
+
+Usage: python -m app.bench.parallel_parse --rows 1000000 --workers 1 2 4 8
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from app.bench import setup_django
+
+
+def main():
+    """
+    function to run benchmark and print rows per second for each count of processes
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--invalid-ratio', type=float, default=0.01)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk-size', type=int, default=2 * 1024 * 1024)
+    args = parser.parse_args()
+    setup_django()
+    # pylint: disable=import-outside-toplevel
+    from app.api.parallel import iter_parallel_transaction_columns
+    from app.api.utils import iter_batches, parse_transaction_rows
+    from app.bench.data import write_file
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, 'transactions.csv')
+        size = write_file(path, args.rows, args.invalid_ratio)
+        print(f"file: {args.rows} rows, {size / 1024 / 1024:.1f} MB")
+
+        started = time.perf_counter()
+        with open(path, 'rb') as file:
+            serial = sum(len(parse_transaction_rows(rows)) for rows in iter_batches(file, 1000))
+        serial_time = time.perf_counter() - started
+        print(f"serial:    {args.rows / serial_time:12.0f} rows/s  {serial_time:8.2f} s")
+
+        for workers in args.workers:
+            started = time.perf_counter()
+            count = sum(len(columns) for columns in
+                        iter_parallel_transaction_columns(str(path), workers, args.chunk_size))
+            elapsed = time.perf_counter() - started
+            assert count == serial, f"parallel result {count} differs from serial {serial}"
+            print(f"workers {workers:2d}: {args.rows / elapsed:12.0f} rows/s  {elapsed:8.2f} s  "
+                  f"speedup x{serial_time / elapsed:.2f}")
+
+
+if __name__ == '__main__':
+    main()
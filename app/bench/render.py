@@ -0,0 +1,63 @@
+"""Benchmark of JSON rendering of report payloads: DRF JSONRenderer against FastJSONRenderer
+with orjson (if it's installed) and with precomputed encoder of json module.
+
+Usage: python -m app.bench.render --periods 10000
+"""
+import argparse
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from app.bench import setup_django
+
+
+def measure(render, data, seconds=1.0):
+    """
+    function to call render repeatedly during given time
+    :param render: function with one argument
+    :param data: data to render
+    :param seconds: minimal time of measurement
+    :return: microseconds per call
+    """
+    count = 0
+    started = time.perf_counter()
+    while (elapsed := time.perf_counter() - started) < seconds:
+        render(data)
+        count += 1
+    return elapsed / count * 10 ** 6
+
+
+def main():
+    """
+    function to run benchmark and print time of rendering for each renderer and payload
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--periods', type=int, default=10000, help="Count of items in time series payload")
+    args = parser.parse_args()
+    setup_django()
+    # pylint: disable=import-outside-toplevel
+    from rest_framework.renderers import JSONRenderer
+    from app.api import renderers
+
+    report = {'gross-revenue': Decimal('225.00'), 'expenses': Decimal('72.93'), 'net-revenue': Decimal('152.07')}
+    timeseries = [{'period': date(2000, 1, 1) + timedelta(days=day), **report} for day in range(args.periods)]
+    fast = renderers.FastJSONRenderer()
+    variants = {
+        'DRF JSONRenderer': JSONRenderer().render,
+        f"FastJSONRenderer ({'orjson' if renderers.orjson else 'json'})": fast.render,
+        'FastJSONRenderer streamed': lambda data: b''.join(fast.iter_render(data)),
+    }
+    for name, data in (('report', report), (f'timeseries of {args.periods}', timeseries)):
+        for variant, render in variants.items():
+            if variant.endswith('streamed') and not isinstance(data, list):
+                continue
+            print(f"{name:<22} {variant:<28} {measure(render, data):12.1f} us")
+        if renderers.orjson is not None:
+            with mock.patch.object(renderers, 'orjson', None):
+                print(f"{name:<22} {'FastJSONRenderer (json)':<28} {measure(fast.render, data):12.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Microbenchmark of per-request overhead of settings profiles: requests are passed straight to WSGI application
+(full middleware stack and views, without network), report is cached, so time is spent by request stack.
+Each profile is measured in its own process because middleware and urls are loaded once.
+
+Usage: python -m app.bench.request_overhead --requests 5000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from app.bench import TemporaryDatabase, setup_django
+
+PROFILES = {
+    'default': {'DJANGO_SETTINGS_MODULE': 'canonical.settings', 'API_LEAN_VIEWS': '0'},
+    'default, lean views': {'DJANGO_SETTINGS_MODULE': 'canonical.settings', 'API_LEAN_VIEWS': '1'},
+    'production, DRF views': {'DJANGO_SETTINGS_MODULE': 'canonical.settings_production', 'API_LEAN_VIEWS': '0'},
+    'production': {'DJANGO_SETTINGS_MODULE': 'canonical.settings_production', 'API_LEAN_VIEWS': '1'},
+}
+CASES = {
+    'GET /report': ('/report', {}),
+    'GET /report 304': ('/report', {'etag': True}),
+    'GET /report?type=Expense': ('/report?type=Expense', {}),
+}
+
+
+def measure(application, environ, requests):
+    """
+    function to pass the same request to WSGI application many times
+    :param application: WSGI application
+    :param environ: dict with WSGI environment
+    :param requests: count of requests
+    :return: tuple with microseconds per request and status of the last response
+    """
+    statuses = []
+
+    def start_response(status, headers):
+        statuses.append(status)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        for _ in application(dict(environ), start_response):
+            pass
+    return (time.perf_counter() - started) / requests * 10 ** 6, statuses[-1]
+
+
+def run_worker(requests):
+    """
+    function to measure all cases for settings of current process, result is printed as JSON
+    :param requests: count of requests for each case
+    :return: None
+    """
+    setup_django()
+    # pylint: disable=import-outside-toplevel
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.core.wsgi import get_wsgi_application
+    from django.test import RequestFactory
+    from app.api.serializers import TransactionFileSerializer
+    from app.bench.data import iter_rows
+
+    with TemporaryDatabase():
+        content = b'\n'.join(iter_rows(1000))
+        serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile('bench.csv', content)})
+        serializer.is_valid(raise_exception=True)
+        serializer.create_transactions()
+        application = get_wsgi_application()
+        factory = RequestFactory()
+        results = {}
+        for name, (path, options) in CASES.items():
+            environ = factory.get(path, HTTP_HOST='localhost').environ
+            if options.get('etag'):
+                headers = []
+                for _ in application(dict(environ), lambda status, response_headers: headers.extend(response_headers)):
+                    pass
+                environ['HTTP_IF_NONE_MATCH'] = dict(headers)['ETag']
+            measure(application, environ, min(requests, 100))
+            results[name] = measure(application, environ, requests)
+    print(json.dumps(results))
+
+
+def main():
+    """
+    function to run benchmark for each profile and print microseconds per request
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args.requests)
+        return
+    print(f"{'profile':<24}" + ''.join(f"{name:>28}" for name in CASES))
+    for profile, env in PROFILES.items():
+        output = subprocess.run([sys.executable, '-m', 'app.bench.request_overhead', '--worker',
+                                 '--requests', str(args.requests)],
+                                env={**os.environ, **env}, check=True, capture_output=True, text=True).stdout
+        results = json.loads(output.splitlines()[-1])
+        print(f"{profile:<24}" + ''.join(f"{results[name][0]:>18.1f} us ({results[name][1][:3]})" for name in CASES))
+
+
+if __name__ == '__main__':
+    main()
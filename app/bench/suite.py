@@ -0,0 +1,219 @@
+"""Benchmark suite which is run by command bench: throughput of row validation, batch parsing, insert and
+full upload of generated file, latency of report at several sizes of dataset and peak RSS of process.
+Results are flat dict of metrics, names which end with _per_s are better when bigger, others when smaller.
+Module needs configured django, it's imported by command"""
+import platform
+import statistics
+import time
+from datetime import date
+
+import django
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+
+from app.api.exceptions import InvalidInput
+from app.api.loaders import load_transactions
+from app.api.serializers import TransactionFileSerializer
+from app.api.utils import get_report_data, iter_batches, parse_transaction_rows, validate_and_prepare_transaction_row
+from app.bench.data import iter_rows
+from app.models import Generation
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+REPORT_FILTERS = {
+    'totals': None,
+    'filtered': {'type': 'e'},
+    'range': {'date__gte': date(2021, 1, 1), 'date__lte': date(2021, 3, 31)},
+}
+HIGHER_IS_BETTER = '_per_s'
+
+
+def best_time(function, repeat):
+    """
+    function to find the best time of several runs
+    :param function: function without arguments
+    :param repeat: count of runs
+    :return: seconds
+    """
+    return min(timed(function) for _ in range(repeat))
+
+
+def timed(function):
+    """
+    function to measure one run
+    :param function: function without arguments
+    :return: seconds
+    """
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+
+def measure_validate(rows, repeat):
+    """
+    function to measure validation of rows one by one like serializer did before batch parser
+    :param rows: list of bytes
+    :param repeat: count of runs
+    :return: rows per second
+    """
+    def run():
+        for row in rows:
+            try:
+                validate_and_prepare_transaction_row(row)
+            except InvalidInput:
+                pass
+
+    return len(rows) / best_time(run, repeat)
+
+
+def measure_parse(rows, batch_size, repeat):
+    """
+    function to measure batch parser which validates rows and builds columns for loader
+    :param rows: list of bytes
+    :param batch_size: count of rows parsed at once
+    :param repeat: count of runs
+    :return: rows per second
+    """
+    def run():
+        for batch in iter_batches(rows, batch_size):
+            parse_transaction_rows(batch)
+
+    return len(rows) / best_time(run, repeat)
+
+
+def measure_insert(rows, batch_size, repeat):
+    """
+    function to measure loader of already parsed rows, each run is rolled back so database isn't growing
+    :param rows: list of bytes
+    :param batch_size: count of rows loaded at once
+    :param repeat: count of runs
+    :return: valid rows per second
+    """
+    batches = [parse_transaction_rows(batch) for batch in iter_batches(rows, batch_size)]
+    count = sum(len(columns) for columns in batches)
+    elapsed = []
+    for _ in range(repeat):
+        with transaction.atomic():
+            generation = Generation.objects.create()
+            started = time.perf_counter()
+            for columns in batches:
+                load_transactions(generation.pk, columns)
+            elapsed.append(time.perf_counter() - started)
+            transaction.set_rollback(True)
+    return count / min(elapsed)
+
+
+def upload(content):
+    """
+    function to upload file like POST /transactions does in replace mode, retired generation is removed
+    :param content: bytes with file
+    :return: count of stored rows
+    """
+    serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile('bench.csv', content)})
+    serializer.is_valid(raise_exception=True)
+    count = serializer.create_transactions()
+    Generation.collect_retired(10000)
+    return count
+
+
+def measure_upload(content, rows, repeat):
+    """
+    function to measure full upload: reading of file, parsing, insert, rollups and switch of generation
+    :param content: bytes with file
+    :param rows: count of rows in file
+    :param repeat: count of runs
+    :return: rows per second
+    """
+    return rows / best_time(lambda: upload(content), repeat)
+
+
+def measure_report(repeat):
+    """
+    function to measure report of current dataset without cache
+    :param repeat: count of runs
+    :return: dict with median latency in milliseconds for each of REPORT_FILTERS
+    """
+    latencies = {}
+    for name, filters in REPORT_FILTERS.items():
+        runs = [timed(lambda: get_report_data(filters)) for _ in range(repeat)]  # pylint: disable=cell-var-from-loop
+        latencies[name] = statistics.median(runs) * 1000
+    return latencies
+
+
+def get_peak_rss():
+    """
+    function to get peak resident set size of process
+    :return: MiB or None if platform doesn't provide it
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux returns kilobytes, macOS returns bytes
+    return peak / 2 ** 20 if platform.system() == 'Darwin' else peak / 2 ** 10
+
+
+def run_suite(rows, invalid_ratio, seed, batch_size, report_sizes, repeat, progress=None):
+    """
+    function to run all benchmarks on current database, it has to be empty temporary database
+    :param rows: count of rows in generated file for throughput benchmarks
+    :param invalid_ratio: part of rows which have to be skipped by parser
+    :param seed: seed of generator, the same seed gives the same file
+    :param batch_size: count of rows parsed and loaded at once
+    :param report_sizes: counts of rows in dataset for report latency
+    :param repeat: count of runs of each benchmark
+    :param progress: function which is called with name and value of each metric
+    :return: dict with meta information about run and metrics
+    """
+    metrics = {}
+
+    def add(name, value):
+        metrics[name] = value
+        if progress is not None:
+            progress(name, value)
+
+    lines = list(iter_rows(rows, invalid_ratio, seed))
+    add('validate.rows_per_s', measure_validate(lines, repeat))
+    add('parse.rows_per_s', measure_parse(lines, batch_size, repeat))
+    add('insert.rows_per_s', measure_insert(lines, batch_size, repeat))
+    add('upload.rows_per_s', measure_upload(b'\n'.join(lines), rows, repeat))
+    del lines
+    for size in sorted(report_sizes):
+        upload(b'\n'.join(iter_rows(size, invalid_ratio, seed)))
+        for name, latency in measure_report(repeat).items():
+            add(f'report.{size}.{name}_ms', latency)
+    peak_rss = get_peak_rss()
+    if peak_rss is not None:
+        add('peak_rss_mib', peak_rss)
+    return {
+        'meta': {
+            'rows': rows, 'invalid_ratio': invalid_ratio, 'seed': seed, 'batch_size': batch_size,
+            'report_sizes': sorted(report_sizes), 'repeat': repeat, 'database': connection.vendor,
+            'python': platform.python_version(), 'django': django.get_version(), 'created_at': time.time(),
+        },
+        'metrics': metrics,
+    }
+
+
+def compare_results(metrics, baseline, threshold):
+    """
+    function to find metrics which are worse than baseline by more than threshold,
+    metrics which aren't in both results are skipped
+    :param metrics: dict with metrics of current run
+    :param baseline: dict with metrics of baseline run
+    :param threshold: allowed relative change, f.e. 0.2 is 20%
+    :return: list of tuples (name, baseline value, current value, relative change), change is negative if worse
+    """
+    regressions = []
+    for name, value in metrics.items():
+        expected = baseline.get(name)
+        if not expected or value is None:
+            continue
+        change = (value - expected) / expected
+        if not name.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change < -threshold:
+            regressions.append((name, expected, value, change))
+    return regressions
@@ -0,0 +1,31 @@
+"""File with tuning of database connections: pragmas of new SQLite connections and alias of connection
+which reads reports, so in production profile readers of /report don't wait for uploads"""
+from django.conf import settings
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):  # pylint: disable=unused-argument
+    """
+    receiver of signal connection_created which executes SQLITE_PRAGMAS on new SQLite connection,
+    connections from DATABASES_READ_ONLY also get pragma query_only, so any write through them fails
+    :param sender: class of database wrapper
+    :param connection: database wrapper with just opened connection
+    :param kwargs: other arguments of signal
+    :return: None
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(settings.SQLITE_PRAGMAS)
+    if connection.alias in settings.DATABASES_READ_ONLY:
+        pragmas['query_only'] = 'ON'
+    for name, value in pragmas.items():
+        # names and values come from settings, they can't be passed as parameters of PRAGMA
+        connection.connection.execute(f'PRAGMA {name} = {value}').fetchall()
+
+
+def get_reports_database():
+    """
+    function to get alias of connection which reads reports, it sees only committed data,
+    so it's used only for reads outside of transactions of request
+    :return: str with database alias
+    """
+    return settings.REPORTS_DATABASE
@@ -0,0 +1,70 @@
+"""File with command to run benchmark suite and compare results with baseline"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from app.bench import TemporaryDatabase
+from app.bench.suite import compare_results, run_suite
+
+
+class Command(BaseCommand):
+    """Class command to measure ingestion and reports on generated data in temporary database"""
+
+    help = ("Measure rows per second of validation, parsing, insert and upload of generated file, latency of report "
+            "at several sizes of dataset and peak RSS, write results as JSON and compare them with baseline")
+
+    def add_arguments(self, parser):
+        """
+        method to add command options
+        :param parser: argument parser
+        :return: None
+        """
+        parser.add_argument('--rows', type=int, default=100000, help="Count of rows in generated file")
+        parser.add_argument('--invalid-ratio', type=float, default=0.05,
+                            help="Part of rows which are skipped by parser, from 0 to 1")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of generator, the same seed gives the same file")
+        parser.add_argument('--batch-size', type=int, default=settings.TRANSACTIONS_BATCH_SIZE,
+                            help="Count of rows parsed and loaded at once")
+        parser.add_argument('--report-sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help="Counts of rows in dataset for report latency")
+        parser.add_argument('--repeat', type=int, default=3, help="Count of runs of each benchmark")
+        parser.add_argument('--output', help="Path to JSON file with results")
+        parser.add_argument('--baseline', help="Path to JSON file with results of previous run")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Allowed relative regression against baseline, f.e. 0.2 is 20%%")
+
+    def handle(self, *args, **options):
+        """
+        method to run command
+        :param args: standard options for unnamed parameters
+        :param options: parsed command options
+        :return: None
+        """
+        if not 0 <= options['invalid_ratio'] <= 1:
+            raise CommandError("Invalid ratio has to be from 0 to 1")
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)['metrics']
+
+        def progress(name, value):
+            self.stdout.write(f"{name:<32} {value:14.2f}")
+
+        with TemporaryDatabase(), override_settings(TRANSACTIONS_BATCH_SIZE=options['batch_size'],
+                                                    GENERATIONS_GC_IN_BACKGROUND=False):
+            results = run_suite(options['rows'], options['invalid_ratio'], options['seed'], options['batch_size'],
+                                options['report_sizes'], options['repeat'], progress)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+        if baseline is None:
+            return
+        regressions = compare_results(results['metrics'], baseline, options['threshold'])
+        for name, expected, value, change in regressions:
+            self.stderr.write(f"{name}: {value:.2f} against {expected:.2f} in baseline ({change:+.0%})")
+        if regressions:
+            raise CommandError(f"{len(regressions)} metrics are worse than baseline by more than "
+                               f"{options['threshold']:.0%}")
+        self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
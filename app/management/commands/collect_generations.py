@@ -0,0 +1,30 @@
+"""File with command to remove retired generations of transactions"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.models import Generation
+
+
+class Command(BaseCommand):
+    """Class command to remove generations which were replaced by newer uploads"""
+
+    help = "Remove retired generations of transactions"
+
+    def add_arguments(self, parser):
+        """
+        method to add command options
+        :param parser: argument parser
+        :return: None
+        """
+        parser.add_argument('--chunk-size', type=int, default=settings.GENERATIONS_GC_CHUNK_SIZE,
+                            help="Count of transactions removed by one query")
+
+    def handle(self, *args, **options):
+        """
+        method to run command
+        :param args: standard options for unnamed parameters
+        :param options: parsed command options
+        :return: None
+        """
+        count = Generation.collect_retired(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Removed generations: {count}"))
@@ -0,0 +1,50 @@
+"""File with command to rebuild running totals for /report"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.api.cache import bump_report_version
+from app.api.rollups import rebuild_rollups
+from app.models import Dataset, Generation
+
+
+class Command(BaseCommand):
+    """Class command to recount totals and rollups of current generation of tenant by full scan of its transactions"""
+
+    help = "Recount report totals and rollups from all transactions or check that stored totals are correct"
+
+    def add_arguments(self, parser):
+        """
+        method to add command options
+        :param parser: argument parser
+        :return: None
+        """
+        parser.add_argument('--check', action='store_true',
+                            help="Only compare stored totals with full recount, exit with error if they differ")
+        parser.add_argument('--tenant', default=Dataset.DEFAULT, help="Key of tenant, shared dataset by default")
+
+    def handle(self, *args, **options):
+        """
+        method to run command
+        :param args: standard options for unnamed parameters
+        :param options: parsed command options
+        :return: None
+        """
+        with transaction.atomic():
+            generation_id = Dataset.get_current_generation_id(options['tenant'])
+            if generation_id is None:
+                self.stdout.write(self.style.SUCCESS("There are no transactions"))
+                return
+            generation = Generation.objects.select_for_update().get(pk=generation_id)
+            expected = generation.calculate()
+            stored = {'incomes': generation.incomes, 'expenses': generation.expenses}
+            if options['check']:
+                if stored != expected:
+                    raise CommandError(f"Report totals mismatch: stored {stored}, expected {expected}")
+                self.stdout.write(self.style.SUCCESS("Report totals are correct"))
+                return
+            generation.incomes = expected['incomes']
+            generation.expenses = expected['expenses']
+            generation.save(update_fields=['incomes', 'expenses'])
+            rebuild_rollups(generation_id)
+            bump_report_version(options['tenant'])
+        self.stdout.write(self.style.SUCCESS(f"Report totals rebuilt: {expected}"))
@@ -0,0 +1,29 @@
+"""File with command to finish upload jobs left by stopped server"""
+from django.core.management.base import BaseCommand
+
+from app.api.jobs import recover_upload_jobs
+
+
+class Command(BaseCommand):
+    """Class command to fail interrupted upload jobs and load pending ones, it's run before start of server"""
+
+    help = "Fail upload jobs interrupted by restart of server and load pending ones"
+
+    def add_arguments(self, parser):
+        """
+        method to add command options
+        :param parser: argument parser
+        :return: None
+        """
+        parser.add_argument('--no-resume', action='store_false', dest='resume',
+                            help="Fail pending jobs instead of loading them")
+
+    def handle(self, *args, **options):
+        """
+        method to run command
+        :param args: standard options for unnamed parameters
+        :param options: parsed command options
+        :return: None
+        """
+        result = recover_upload_jobs(options['resume'])
+        self.stdout.write(self.style.SUCCESS(f"Failed jobs: {result['failed']}, resumed jobs: {result['resumed']}"))
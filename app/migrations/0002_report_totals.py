@@ -0,0 +1,50 @@
+"""File with migration details"""
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def fill_report_totals(apps, schema_editor):
+    """
+    function to count totals for transactions which were stored before migration
+    :param apps: registry with historical models
+    :param schema_editor: editor for current database
+    :return: None
+    """
+    alias = schema_editor.connection.alias
+    transaction_model = apps.get_model('app', 'Transaction')
+    report_totals_model = apps.get_model('app', 'ReportTotals')
+    aggregation = transaction_model.objects.using(alias).aggregate(expenses=Sum('value', filter=Q(type='e')),
+                                                                   incomes=Sum('value', filter=Q(type='i')))
+    report_totals_model.objects.using(alias).create(pk=1, incomes=aggregation['incomes'] or Decimal(0),
+                                                    expenses=aggregation['expenses'] or Decimal(0))
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportTotals",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("incomes", models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ("expenses", models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+            ],
+        ),
+        migrations.RunPython(fill_report_totals, migrations.RunPython.noop),
+    ]
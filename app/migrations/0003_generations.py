@@ -0,0 +1,101 @@
+"""File with migration details"""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_transactions_to_generation(apps, schema_editor):
+    """
+    function to put transactions stored before migration to the first generation with the same totals
+    :param apps: registry with historical models
+    :param schema_editor: editor for current database
+    :return: None
+    """
+    alias = schema_editor.connection.alias
+    transaction_model = apps.get_model('app', 'Transaction')
+    report_totals_model = apps.get_model('app', 'ReportTotals')
+    generation_model = apps.get_model('app', 'Generation')
+    dataset_model = apps.get_model('app', 'Dataset')
+    generation = None
+    if transaction_model.objects.using(alias).exists():
+        totals = report_totals_model.objects.using(alias).filter(pk=1).first()
+        generation = generation_model.objects.using(alias).create(incomes=totals.incomes if totals else 0,
+                                                                  expenses=totals.expenses if totals else 0)
+        transaction_model.objects.using(alias).update(generation=generation)
+    dataset_model.objects.using(alias).create(pk=1, current=generation)
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0002_report_totals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Generation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("retired", models.BooleanField(default=False)),
+                ("incomes", models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ("expenses", models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Dataset",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "current",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="app.generation",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="generation",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="transactions",
+                to="app.generation",
+            ),
+        ),
+        migrations.RunPython(move_transactions_to_generation, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="transaction",
+            name="generation",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="transactions",
+                to="app.generation",
+            ),
+        ),
+        migrations.DeleteModel(
+            name="ReportTotals",
+        ),
+    ]
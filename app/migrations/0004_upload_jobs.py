@@ -0,0 +1,51 @@
+"""File with migration details"""
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0003_generations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UploadJob",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("file_path", models.CharField(max_length=255)),
+                ("rows_parsed", models.BigIntegerField(default=0)),
+                ("rows_skipped", models.BigIntegerField(default=0)),
+                ("rows_inserted", models.BigIntegerField(default=0)),
+                ("error", models.TextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
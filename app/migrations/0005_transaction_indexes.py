@@ -0,0 +1,42 @@
+"""File with migration details"""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0004_upload_jobs"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["generation", "date"], name="transaction_gen_date"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["generation", "type", "date"], name="transaction_gen_type_date"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["generation", "expense_category", "date"],
+                               name="transaction_gen_category_date"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["generation", "job_address", "date"], name="transaction_gen_address_date"),
+        ),
+        migrations.AlterField(
+            model_name="transaction",
+            name="generation",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="transactions",
+                to="app.generation",
+            ),
+        ),
+    ]
@@ -0,0 +1,98 @@
+"""File with migration details"""
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_rollups(apps, schema_editor):
+    """
+    function to count rollups for transactions of current generation stored before migration
+    :param apps: registry with historical models
+    :param schema_editor: editor for current database
+    :return: None
+    """
+    alias = schema_editor.connection.alias
+    transaction_model = apps.get_model('app', 'Transaction')
+    dataset_model = apps.get_model('app', 'Dataset')
+    rollup_model = apps.get_model('app', 'Rollup')
+    generation_id = dataset_model.objects.using(alias).filter(pk=1).values_list('current_id', flat=True).first()
+    if generation_id is None:
+        return
+    rollups = {}
+    days = transaction_model.objects.using(alias).filter(generation_id=generation_id).values(
+        'date', 'type', 'expense_category').annotate(value=Sum('value'), count=Count('id'))
+    for day in days:
+        category = (day['expense_category'] or '') if day['type'] == 'e' else ''
+        periods = (('day', day['date']), ('week', day['date'] - timedelta(days=day['date'].weekday())),
+                   ('month', day['date'].replace(day=1)))
+        for granularity, period in periods:
+            key = (granularity, period, day['type'], category)
+            value, count = rollups.get(key, (0, 0))
+            rollups[key] = (value + day['value'], count + day['count'])
+    rollup_model.objects.using(alias).bulk_create([
+        rollup_model(generation_id=generation_id, granularity=granularity, period=period, type=transaction_type,
+                     category=category, value=value, count=count)
+        for (granularity, period, transaction_type, category), (value, count) in rollups.items()
+    ])
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0005_transaction_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Rollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("day", "Day"), ("week", "Week"), ("month", "Month")],
+                        max_length=5,
+                    ),
+                ),
+                ("period", models.DateField(help_text="The first day of period, weeks start on Monday")),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[("i", "Income"), ("e", "Expense")], max_length=1
+                    ),
+                ),
+                ("category", models.CharField(blank=True, default="", max_length=100)),
+                ("value", models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ("count", models.BigIntegerField(default=0)),
+                (
+                    "generation",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="app.generation",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="rollup",
+            constraint=models.UniqueConstraint(
+                fields=("generation", "granularity", "period", "type", "category"),
+                name="rollup_unique_key",
+            ),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+"""File with migration details"""
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Cast, Round
+
+import app.models
+
+# (model, field) pairs which are moved from DecimalField to CentsField
+MONEY_FIELDS = (
+    ('transaction', 'value'),
+    ('generation', 'incomes'),
+    ('generation', 'expenses'),
+    ('rollup', 'value'),
+)
+
+
+def copy_to_cents(apps, schema_editor):
+    """
+    function to copy decimal values to integer count of cents by one update per table
+    :param apps: registry with historical models
+    :param schema_editor: editor for current database
+    :return: None
+    """
+    alias = schema_editor.connection.alias
+    for model_name, field in MONEY_FIELDS:
+        model = apps.get_model('app', model_name)
+        model.objects.using(alias).update(**{
+            f'{field}_cents': Cast(Round(F(field) * 100), models.BigIntegerField())
+        })
+
+
+def copy_from_cents(apps, schema_editor):
+    """
+    function to copy integer count of cents back to decimal values
+    :param apps: registry with historical models
+    :param schema_editor: editor for current database
+    :return: None
+    """
+    alias = schema_editor.connection.alias
+    for model_name, field in MONEY_FIELDS:
+        model = apps.get_model('app', model_name)
+        model.objects.using(alias).update(**{
+            field: F(f'{field}_cents') * Value(Decimal('0.01'), output_field=models.DecimalField())
+        })
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0006_rollups"),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name=f"{field}_cents",
+                field=app.models.CentsField(default=0),
+            )
+            for model_name, field in MONEY_FIELDS
+        ],
+        # default is needed only to add decimal column back to not empty table when migration is reverted
+        migrations.AlterField(
+            model_name="transaction",
+            name="value",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(copy_to_cents, copy_from_cents),
+        *[
+            migrations.RemoveField(model_name=model_name, name=field)
+            for model_name, field in MONEY_FIELDS
+        ],
+        *[
+            migrations.RenameField(model_name=model_name, old_name=f"{field}_cents", new_name=field)
+            for model_name, field in MONEY_FIELDS
+        ],
+        migrations.AlterField(
+            model_name="transaction",
+            name="value",
+            field=app.models.CentsField(),
+        ),
+    ]
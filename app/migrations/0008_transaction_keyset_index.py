@@ -0,0 +1,22 @@
+"""File with migration details"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0007_money_in_cents"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="transaction",
+            name="transaction_gen_date",
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["generation", "date", "id"], name="transaction_gen_date_id"),
+        ),
+    ]
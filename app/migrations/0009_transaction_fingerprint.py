@@ -0,0 +1,80 @@
+"""File with migration details"""
+
+import struct
+from hashlib import blake2b
+
+from django.db import migrations, models
+
+FINGERPRINT = struct.Struct('>q')
+CHUNK_SIZE = 10000
+
+
+def get_fingerprint(date, transaction_type, cents, info):
+    """
+    function to count fingerprint like app.models.get_fingerprint does, copied to keep migration independent
+    :param date: str in format YYYY-MM-DD
+    :param transaction_type: 'i' or 'e'
+    :param cents: int with count of cents
+    :param info: expense category for expenses or job address for incomes, could be None
+    :return: signed 64-bit int
+    """
+    content = f'{date},{transaction_type},{cents},{info or ""}'.encode()
+    return FINGERPRINT.unpack(blake2b(content, digest_size=8).digest())[0]
+
+
+def fill_fingerprints(apps, schema_editor):
+    """
+    function to count fingerprints of stored transactions, rows are read by id ranges and updated by one
+    prepared statement
+    :param apps: registry of historical models
+    :param schema_editor: schema editor object
+    :return: None
+    """
+    transaction_model = apps.get_model('app', 'Transaction')
+    rows = transaction_model.objects.using(schema_editor.connection.alias).order_by('pk')
+    table = schema_editor.quote_name(transaction_model._meta.db_table)
+    last_pk = 0
+    while chunk := list(rows.filter(pk__gt=last_pk).values_list(
+            'pk', 'date', 'type', 'value', 'expense_category', 'job_address')[:CHUNK_SIZE]):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(f"UPDATE {table} SET fingerprint = %s WHERE id = %s", [
+                (get_fingerprint(date.isoformat(), transaction_type, int(value.scaleb(2)),
+                                 category if transaction_type == 'e' else address), pk)
+                for pk, date, transaction_type, value, category, address in chunk
+            ])
+        last_pk = chunk[-1][0]
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0008_transaction_keyset_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="fingerprint",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="transaction",
+            name="fingerprint",
+            field=models.BigIntegerField(help_text="Hash of date, type, value and additional info"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["generation", "fingerprint"], name="transaction_gen_fingerprint"),
+        ),
+        migrations.AddField(
+            model_name="uploadjob",
+            name="mode",
+            field=models.CharField(
+                choices=[("replace", "Replace"), ("append", "Append"), ("upsert", "Upsert")],
+                default="replace",
+                max_length=10,
+            ),
+        ),
+    ]
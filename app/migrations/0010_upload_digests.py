@@ -0,0 +1,38 @@
+"""File with migration details"""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0009_transaction_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="generation",
+            name="revision",
+            field=models.BigIntegerField(default=0, help_text="Count of changes of transactions of generation"),
+        ),
+        migrations.CreateModel(
+            name="UploadDigest",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("digest", models.CharField(help_text="SHA-256 of content of uploaded file", max_length=64)),
+                ("mode", models.CharField(
+                    choices=[("replace", "Replace"), ("append", "Append"), ("upsert", "Upsert")], max_length=10)),
+                ("revision", models.BigIntegerField()),
+                ("result", models.JSONField(help_text="Data of response to upload")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("generation", models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE, related_name="+", to="app.generation")),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="uploaddigest",
+            index=models.Index(fields=["digest", "mode"], name="upload_digest_key"),
+        ),
+    ]
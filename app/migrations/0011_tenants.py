@@ -0,0 +1,45 @@
+"""File with migration details"""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_generations(apps, schema_editor):
+    """
+    function to add existing generations to shared dataset, before tenants it was the only one
+    :param apps: registry of historical models
+    :param schema_editor: schema editor object
+    :return: None
+    """
+    using = schema_editor.connection.alias
+    dataset = apps.get_model('app', 'Dataset').objects.using(using).filter(tenant='').first()
+    if dataset is not None:
+        apps.get_model('app', 'Generation').objects.using(using).filter(dataset=None).update(dataset=dataset)
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0010_upload_digests"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="tenant",
+            field=models.CharField(default="", max_length=100, unique=True),
+        ),
+        migrations.AddField(
+            model_name="generation",
+            name="dataset",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                                    related_name="generations", to="app.dataset"),
+        ),
+        migrations.RunPython(link_generations, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="uploadjob",
+            name="tenant",
+            field=models.CharField(default="", max_length=100),
+        ),
+    ]
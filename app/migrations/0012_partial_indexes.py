@@ -0,0 +1,53 @@
+"""File with migration details"""
+
+from django.db import migrations
+
+# name of index for each type of transaction, index contains only rows of the type and covers value,
+# so report filtered by type and dates is counted by index-only scan
+PARTIAL_INDEXES = {
+    'i': 'transaction_income_gen_date',
+    'e': 'transaction_expense_gen_date',
+}
+
+
+def create_partial_indexes(apps, schema_editor):
+    """
+    function to create partial indexes on PostgreSQL, other databases use index (generation, type, date).
+    SQLite could create them too, but it doesn't use partial index when type is bound parameter of query
+    :param apps: registry with historical models
+    :param schema_editor: editor for current database
+    :return: None
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+    table = apps.get_model('app', 'Transaction')._meta.db_table
+    for transaction_type, name in PARTIAL_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} ({quote('generation_id')}, {quote('date')}) "
+            f"INCLUDE ({quote('value')}) WHERE {quote('type')} = '{transaction_type}'")
+
+
+def drop_partial_indexes(apps, schema_editor):  # pylint: disable=unused-argument
+    """
+    function to drop partial indexes
+    :param apps: registry with historical models
+    :param schema_editor: editor for current database
+    :return: None
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in PARTIAL_INDEXES.values():
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0011_tenants"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_partial_indexes, drop_partial_indexes),
+    ]
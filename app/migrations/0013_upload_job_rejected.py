@@ -0,0 +1,19 @@
+"""File with migration details"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Class needed to migration"""
+
+    dependencies = [
+        ("app", "0012_partial_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadjob",
+            name="rejected",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,16 +1,432 @@
 """File to describe models for ORM."""
-from django.db import models
+import struct
+import uuid
+from decimal import Decimal
+from hashlib import blake2b
+
+from django.core.exceptions import ValidationError
+from django.db import models, router, transaction
+from django.db.models import F, Q, Subquery, Sum
 
 TRANSACTION_TYPE = (
     ('i', 'Income'),
     ('e', 'Expense')
 )
 
+GRANULARITY = (
+    ('day', 'Day'),
+    ('week', 'Week'),
+    ('month', 'Month'),
+)
+
+CENT = Decimal('.01')
+
+FINGERPRINT = struct.Struct('>q')
+
+UPLOAD_MODE = (
+    ('replace', 'Replace'),
+    ('append', 'Append'),
+    ('upsert', 'Upsert'),
+)
+
+UPLOAD_JOB_STATUS = (
+    ('pending', 'Pending'),
+    ('running', 'Running'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+)
+
+
+def sum_by_type(transactions):
+    """
+    function to count sums of incomes and expenses for not saved (or just saved) objects
+    :param transactions: iterable with pairs (type, value)
+    :return: tuple with sum of incomes and sum of expenses
+    """
+    incomes = expenses = Decimal(0)
+    for transaction_type, value in transactions:
+        if transaction_type == 'i':
+            incomes += value
+        elif transaction_type == 'e':
+            expenses += value
+    return incomes, expenses
+
+
+def to_cents(value):
+    """
+    function to convert money value to integer count of cents, rounding is half to even
+    :param value: Decimal, int, float or str with value
+    :return: int with count of cents
+    """
+    return int(Decimal(str(value)).quantize(CENT).scaleb(2))
+
+
+def get_fingerprint(date, transaction_type, cents, info):
+    """
+    function to count fingerprint of transaction content, it's used to find rows which are already stored
+    when file is uploaded in append or upsert mode. Hash has to be the same in all processes, so built-in
+    hash isn't used
+    :param date: date object or str in format YYYY-MM-DD
+    :param transaction_type: 'i' or 'e'
+    :param cents: int with count of cents
+    :param info: expense category for expenses or job address for incomes, could be None
+    :return: signed 64-bit int
+    """
+    content = f'{date},{transaction_type},{cents},{info or ""}'.encode()
+    return FINGERPRINT.unpack(blake2b(content, digest_size=8).digest())[0]
+
+
+class CentsField(models.BigIntegerField):
+    """Class field for money which is stored as integer count of cents, so database sums integers without
+    conversion of types. Python value is Decimal with 2 decimal places like DecimalField has"""
+
+    def from_db_value(self, value, expression, connection):
+        """
+        method to convert value from database, it's called for selected columns and for aggregations of them
+        :param value: int with count of cents or None
+        :param expression: selected expression
+        :param connection: database connection
+        :return: Decimal or None
+        """
+        return None if value is None else Decimal(value).scaleb(-2)
+
+    def to_python(self, value):
+        """
+        method to convert value from any input to python value
+        :param value: Decimal, int, float, str or None
+        :return: Decimal with 2 decimal places or None
+        """
+        if value is None or value == '':
+            return None
+        try:
+            return Decimal(str(value)).quantize(CENT)
+        except ArithmeticError as error:
+            raise ValidationError(self.error_messages['invalid'], code='invalid', params={'value': value}) from error
+
+    def get_prep_value(self, value):
+        """
+        method to convert python value to value for database
+        :param value: Decimal, int, float, str or None
+        :return: int with count of cents or None
+        """
+        if value is None:
+            return None
+        return to_cents(value)
+
+
+class TransactionQuerySet(models.QuerySet):
+    """Class queryset which keeps totals of generations up to date on bulk operations.
+    Method update isn't tracked, use command rebuild_report_totals after it"""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        method to create many objects by one query and add their values to totals of their generations,
+        objects without generation are added to current one
+        :param objs: list of not saved Transaction objects
+        :param args: standard options for unnamed parameters
+        :param kwargs: standard options for named parameters
+        :return: list of created objects
+        """
+        with transaction.atomic(using=self.db):
+            if any(obj.generation_id is None for obj in objs):
+                generation_id = Dataset.get_current_generation_id(create=True, using=self.db)
+                for obj in objs:
+                    if obj.generation_id is None:
+                        obj.generation_id = generation_id
+            for obj in objs:
+                if obj.fingerprint is None:
+                    obj.fingerprint = obj.get_fingerprint()
+            objs = super().bulk_create(objs, *args, **kwargs)
+            by_generation = {}
+            for obj in objs:
+                by_generation.setdefault(obj.generation_id, []).append((obj.type, obj.value))
+            for generation_id, values in by_generation.items():
+                Generation.apply(generation_id, *sum_by_type(values), using=self.db)
+        return objs
+
+    def delete(self):
+        """
+        method to delete objects from queryset and subtract their values from totals of their generations
+        :return: the same as default delete method
+        """
+        with transaction.atomic(using=self.db):
+            totals = self.order_by().values('generation').annotate(
+                incomes=Sum('value', filter=Q(type='i')), expenses=Sum('value', filter=Q(type='e')))
+            for row in totals:
+                Generation.apply(row['generation'], -(row['incomes'] or 0), -(row['expenses'] or 0),
+                                 using=self.db)
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def purge(self):
+        """
+        method to delete objects without changing totals, used to remove rows of retired generations
+        :return: the same as default delete method
+        """
+        return super().delete()
+
+    purge.alters_data = True
+    purge.queryset_only = True
+
+
+class CurrentTransactionManager(models.Manager.from_queryset(TransactionQuerySet)):
+    """Class manager which shows only transactions of current generation of dataset,
+    default queryset contains transactions of shared dataset"""
+
+    def get_queryset(self):
+        """
+        method to build default queryset
+        :return: queryset filtered by current generation of shared dataset
+        """
+        return self.for_tenant(Dataset.DEFAULT)
+
+    def for_tenant(self, tenant):
+        """
+        method to build queryset of dataset of tenant
+        :param tenant: str with key of tenant
+        :return: queryset filtered by current generation of tenant
+        """
+        current = Dataset.objects.filter(tenant=tenant).values('current_id')[:1]
+        return super().get_queryset().filter(generation_id=Subquery(current))
+
+
+class Generation(models.Model):
+    """Class mapping for one uploaded version of dataset with running totals of its transactions.
+    Retired generation was replaced by newer one and waits for garbage collection"""
+    dataset = models.ForeignKey('Dataset', on_delete=models.SET_NULL, related_name='generations', blank=True,
+                                null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    retired = models.BooleanField(default=False)
+    incomes = CentsField(default=0)
+    expenses = CentsField(default=0)
+    revision = models.BigIntegerField(default=0, help_text="Count of changes of transactions of generation")
+
+    @classmethod
+    def apply(cls, generation_id, incomes, expenses, using='default'):
+        """
+        method to add differences to totals in the current database transaction, it's called on each change
+        of transactions of generation, so revision is incremented even if sums aren't changed
+        :param generation_id: id of generation
+        :param incomes: difference for sum of incomes
+        :param expenses: difference for sum of expenses
+        :param using: database alias
+        :return: None
+        """
+        # values are added in cents, expressions aren't converted by CentsField
+        cls.objects.using(using).filter(pk=generation_id).update(incomes=F('incomes') + to_cents(incomes),
+                                                                 expenses=F('expenses') + to_cents(expenses),
+                                                                 revision=F('revision') + 1)
+
+    @classmethod
+    def collect_retired(cls, chunk_size, using='default'):
+        """
+        method to remove retired generations with their transactions,
+        transactions are removed by chunks in separate database transactions to not keep long locks
+        :param chunk_size: count of transactions removed by one query
+        :param using: database alias
+        :return: count of removed generations
+        """
+        count = 0
+        for generation_id in cls.objects.using(using).filter(retired=True).values_list('pk', flat=True):
+            rows = Transaction.all_objects.using(using).filter(generation_id=generation_id)
+            while pks := list(rows.values_list('pk', flat=True)[:chunk_size]):
+                Transaction.all_objects.using(using).filter(pk__in=pks).purge()
+            cls.objects.using(using).filter(pk=generation_id).delete()
+            count += 1
+        return count
+
+    def calculate(self):
+        """
+        method to count totals by full scan of transactions of generation
+        :return: dict with incomes and expenses
+        """
+        aggregation = Transaction.all_objects.filter(generation=self).aggregate(
+            expenses=Sum('value', filter=Q(type='e')), incomes=Sum('value', filter=Q(type='i')))
+        return {
+            'incomes': aggregation.get('incomes') or Decimal(0),
+            'expenses': aggregation.get('expenses') or Decimal(0),
+        }
+
 
 class Transaction(models.Model):
     """Class mapping for each transaction object."""
+    generation = models.ForeignKey(Generation, on_delete=models.CASCADE, related_name='transactions', db_index=False)
     date = models.DateField()
     type = models.CharField(max_length=1, choices=TRANSACTION_TYPE)
-    value = models.DecimalField(max_digits=10, decimal_places=2)
+    value = CentsField()
     expense_category = models.CharField(max_length=100, blank=True, null=True)
     job_address = models.CharField(max_length=100, blank=True, null=True)
+    fingerprint = models.BigIntegerField(help_text="Hash of date, type, value and additional info")
+
+    objects = CurrentTransactionManager()
+    all_objects = TransactionQuerySet.as_manager()
+
+    class Meta:
+        """Class with model options, all indexes start with generation because readers see only one generation"""
+        indexes = [
+            models.Index(fields=['generation', 'date', 'id'], name='transaction_gen_date_id'),
+            models.Index(fields=['generation', 'type', 'date'], name='transaction_gen_type_date'),
+            models.Index(fields=['generation', 'expense_category', 'date'], name='transaction_gen_category_date'),
+            models.Index(fields=['generation', 'job_address', 'date'], name='transaction_gen_address_date'),
+            models.Index(fields=['generation', 'fingerprint'], name='transaction_gen_fingerprint'),
+        ]
+
+    def get_fingerprint(self):
+        """
+        method to count fingerprint of current values of object
+        :return: signed 64-bit int
+        """
+        date = self._meta.get_field('date').to_python(self.date)
+        info = self.expense_category if self.type == 'e' else self.job_address
+        return get_fingerprint(date.isoformat(), self.type, to_cents(self.value), info)
+
+    def save(self, *args, **kwargs):
+        """
+        method to save object (to current generation by default) and move difference of its value to totals
+        :param args: standard options for unnamed parameters
+        :param kwargs: standard options for named parameters
+        :return: None
+        """
+        using = kwargs.get('using') or router.db_for_write(Transaction, instance=self)
+        with transaction.atomic(using=using):
+            if self.generation_id is None:
+                self.generation_id = Dataset.get_current_generation_id(create=True, using=using)
+            self.fingerprint = self.get_fingerprint()
+            if self.pk is not None:
+                previous = Transaction.all_objects.using(using).filter(pk=self.pk).values_list(
+                    'generation', 'type', 'value').first()
+                if previous is not None:
+                    old_incomes, old_expenses = sum_by_type([previous[1:]])
+                    Generation.apply(previous[0], -old_incomes, -old_expenses, using=using)
+            super().save(*args, **kwargs)
+            Generation.apply(self.generation_id, *sum_by_type([(self.type, Decimal(str(self.value)))]), using=using)
+
+    def delete(self, *args, **kwargs):
+        """
+        method to delete object and subtract its value from totals
+        :param args: standard options for unnamed parameters
+        :param kwargs: standard options for named parameters
+        :return: the same as default delete method
+        """
+        using = kwargs.get('using') or router.db_for_write(Transaction, instance=self)
+        with transaction.atomic(using=using):
+            incomes, expenses = sum_by_type([(self.type, Decimal(str(self.value)))])
+            Generation.apply(self.generation_id, -incomes, -expenses, using=using)
+            return super().delete(*args, **kwargs)
+
+
+class Dataset(models.Model):
+    """Class mapping for pointer to current generation of transactions of one tenant, readers see only
+    current generation. Table contains one row per tenant, requests without tenant use shared dataset
+    with tenant DEFAULT"""
+    DEFAULT = ''
+
+    tenant = models.CharField(max_length=100, unique=True, default=DEFAULT)
+    current = models.ForeignKey(Generation, on_delete=models.PROTECT, related_name='+', blank=True, null=True)
+
+    @classmethod
+    def get_current_generation_id(cls, tenant=DEFAULT, create=False, using='default'):
+        """
+        method to get id of current generation
+        :param tenant: str with key of tenant
+        :param create: create and switch to new generation if there is no current one
+        :param using: database alias
+        :return: id of generation or None
+        """
+        generation_id = cls.objects.using(using).filter(tenant=tenant).values_list('current_id', flat=True).first()
+        if generation_id is None and create:
+            generation = Generation.objects.using(using).create(dataset=cls.lock(tenant, using=using))
+            cls.switch(generation, using=using)
+            generation_id = generation.pk
+        return generation_id
+
+    @classmethod
+    def lock(cls, tenant=DEFAULT, using='default'):
+        """
+        method to get dataset of tenant and lock it until the end of database transaction, so changes
+        of the same dataset are serialized while changes of other tenants aren't blocked by row locks.
+        Dataset is locked by update which is the first write of transaction, so SQLite waits for
+        the write lock instead of failing on upgrade of read lock
+        :param tenant: str with key of tenant
+        :param using: database alias
+        :return: Dataset object, it's created for new tenant
+        """
+        datasets = cls.objects.using(using).filter(tenant=tenant)
+        if not datasets.update(tenant=F('tenant')):
+            return datasets.get_or_create(tenant=tenant)[0]
+        return datasets.select_for_update().get()
+
+    @classmethod
+    def switch(cls, generation, using='default'):
+        """
+        method to make generation current by one update, previous generation is retired.
+        Generation without dataset is added to shared dataset
+        :param generation: new current Generation object
+        :param using: database alias
+        :return: None
+        """
+        with transaction.atomic(using=using):
+            if generation.dataset_id is None:
+                generation.dataset = cls.lock(using=using)
+                generation.save(using=using, update_fields=['dataset'])
+            dataset = cls.objects.using(using).select_for_update().get(pk=generation.dataset_id)
+            if dataset.current_id is not None:
+                Generation.objects.using(using).filter(pk=dataset.current_id).update(retired=True)
+            dataset.current = generation
+            dataset.save(using=using, update_fields=['current'])
+
+
+class Rollup(models.Model):
+    """Class mapping for sum of transactions of one generation for period (day, week or month),
+    type and category. Category is expense_category for expenses and empty string for incomes"""
+    generation = models.ForeignKey(Generation, on_delete=models.CASCADE, related_name='rollups', db_index=False)
+    granularity = models.CharField(max_length=5, choices=GRANULARITY)
+    period = models.DateField(help_text="The first day of period, weeks start on Monday")
+    type = models.CharField(max_length=1, choices=TRANSACTION_TYPE)
+    category = models.CharField(max_length=100, blank=True, default='')
+    value = CentsField(default=0)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        """Class with model options"""
+        constraints = [
+            models.UniqueConstraint(fields=['generation', 'granularity', 'period', 'type', 'category'],
+                                    name='rollup_unique_key'),
+        ]
+
+
+class UploadJob(models.Model):
+    """Class mapping for file uploaded to be processed in background"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=10, choices=UPLOAD_JOB_STATUS, default='pending')
+    file_path = models.CharField(max_length=255)
+    mode = models.CharField(max_length=10, choices=UPLOAD_MODE, default='replace')
+    tenant = models.CharField(max_length=100, default=Dataset.DEFAULT)
+    rows_parsed = models.BigIntegerField(default=0)
+    rows_skipped = models.BigIntegerField(default=0)
+    rows_inserted = models.BigIntegerField(default=0)
+    # summary of rejected rows of finished job: count, counts by reason and sample
+    rejected = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+
+class UploadDigest(models.Model):
+    """Class mapping for result of upload of file with given content, it's valid while generation
+    has the same revision as it had after upload. Table is bounded, the oldest rows are removed"""
+    digest = models.CharField(max_length=64, help_text="SHA-256 of content of uploaded file")
+    mode = models.CharField(max_length=10, choices=UPLOAD_MODE)
+    generation = models.ForeignKey(Generation, on_delete=models.CASCADE, related_name='+')
+    revision = models.BigIntegerField()
+    result = models.JSONField(help_text="Data of response to upload")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """Class with model options"""
+        indexes = [
+            models.Index(fields=['digest', 'mode'], name='upload_digest_key'),
+        ]
@@ -0,0 +1,207 @@
+"""File with middleware which profiles one request on demand: request with header PROFILING_HEADER
+or query parameter PROFILING_QUERY_PARAMETER is run under cProfile and its SQL queries are logged, both are
+saved to PROFILING_DIR. Other requests cost one lookup of header and query parameter"""
+import asyncio
+import cProfile
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+TRIGGER_VALUES = ('1', 'true')
+# params of query are saved as repr cut to this length, bulk inserts have thousands of them
+SQL_PARAMS_MAX_LENGTH = 200
+
+# only one profiler could be active in process, since Python 3.12 enable() of the second one raises ValueError
+_profiler_lock = threading.Lock()
+
+
+class QueryLog:
+    """Class to log queries executed by connections of current thread, it's used as execute wrapper"""
+
+    def __init__(self):
+        """
+        initial method
+        """
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        method to execute query and log its text, params and duration
+        :param execute: next wrapper or function which executes query
+        :param sql: str with query
+        :param params: params of query
+        :param many: True for executemany
+        :param context: dict with connection and cursor
+        :return: result of execute
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'seconds': time.perf_counter() - started,
+                'many': many,
+                'sql': sql,
+                'params': repr(params)[:SQL_PARAMS_MAX_LENGTH],
+            })
+
+    def to_dict(self):
+        """
+        method to build summary of log which could be saved as JSON
+        :return: dict with count and total duration of queries and list of queries in order of execution
+        """
+        return {
+            'count': len(self.queries),
+            'seconds': sum(query['seconds'] for query in self.queries),
+            'queries': self.queries,
+        }
+
+
+class ProfilingMiddleware:
+    """Class middleware to profile requests which ask for it, request is profiled only if setting
+    PROFILING_ALLOWED is on or user is staff. Profile is saved as pstats file (open it by python -m pstats
+    or snakeviz) and SQL log as JSON with the same name, name is returned in header X-Profile-Id.
+    Async views are profiled only in thread of event loop, code run by sync_to_async isn't seen by profiler,
+    content of streaming responses is generated after middleware, so it isn't profiled too.
+    Requests are profiled one at a time, concurrent requests are served without profiling"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """
+        initial method
+        :param get_response: next middleware or view
+        """
+        self.get_response = get_response
+        self.meta_key = 'HTTP_' + settings.PROFILING_HEADER.upper().replace('-', '_')
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # the same mark as django.utils.deprecation.MiddlewareMixin sets, so handler awaits middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine  # pylint: disable=protected-access
+
+    def __call__(self, request):
+        """
+        method to process request
+        :param request: django request object
+        :return: response
+        """
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.is_triggered(request) or not is_profiling_allowed(request):
+            return self.get_response(request)
+        profiler = start_profiler(request)
+        if profiler is None:
+            return self.get_response(request)
+        log = QueryLog()
+        with ExitStack() as stack:
+            stack.callback(stop_profiler, profiler)
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            response = self.get_response(request)
+        return save_profile(request, response, profiler, log)
+
+    async def __acall__(self, request):
+        """
+        coroutine to process request by async middleware chain
+        :param request: django request object
+        :return: response
+        """
+        if not self.is_triggered(request) or not await sync_to_async(is_profiling_allowed)(request):
+            return await self.get_response(request)
+        profiler = start_profiler(request)
+        if profiler is None:
+            return await self.get_response(request)
+        log = QueryLog()
+        with ExitStack() as stack:
+            stack.callback(stop_profiler, profiler)
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            response = await self.get_response(request)
+        return await sync_to_async(save_profile)(request, response, profiler, log)
+
+    def is_triggered(self, request):
+        """
+        method to check if request asks for profiling
+        :param request: django request object
+        :return: bool
+        """
+        return (request.META.get(self.meta_key) in TRIGGER_VALUES
+                or request.GET.get(settings.PROFILING_QUERY_PARAMETER) in TRIGGER_VALUES)
+
+
+def is_profiling_allowed(request):
+    """
+    function to check if request could be profiled, user is read only for request which asks for profiling
+    :param request: django request object
+    :return: bool
+    """
+    if settings.PROFILING_ALLOWED:
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_active and user.is_staff
+
+
+def start_profiler(request):
+    """
+    function to enable profiler for request, request which comes while other one is profiled
+    or other profiler is active in process is served without profiling
+    :param request: django request object
+    :return: enabled cProfile.Profile object or None
+    """
+    if not _profiler_lock.acquire(blocking=False):
+        logger.warning("Request %s %s isn't profiled, other request is profiled now", request.method, request.path)
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        _profiler_lock.release()
+        logger.warning("Request %s %s isn't profiled, other profiler is active", request.method, request.path)
+        return None
+    return profiler
+
+
+def stop_profiler(profiler):
+    """
+    function to disable profiler of request and allow profiling of the next one
+    :param profiler: enabled cProfile.Profile object
+    :return: None
+    """
+    try:
+        profiler.disable()
+    finally:
+        _profiler_lock.release()
+
+
+def save_profile(request, response, profiler, log):
+    """
+    function to save profile and SQL log of request to PROFILING_DIR
+    :param request: django request object
+    :param response: response of request
+    :param profiler: disabled cProfile.Profile object
+    :param log: QueryLog object
+    :return: the same response with header X-Profile-Id
+    """
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method.lower()}-{slug}-{uuid.uuid4().hex[:8]}"
+    directory = Path(settings.PROFILING_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(directory / f'{name}.prof')
+    sql = {'method': request.method, 'path': request.get_full_path(), 'status': response.status_code,
+           **log.to_dict()}
+    (directory / f'{name}.sql.json').write_text(json.dumps(sql, indent=2, default=str), encoding='utf-8')
+    response['X-Profile-Id'] = name
+    return response
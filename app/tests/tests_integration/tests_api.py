@@ -1,13 +1,39 @@
 """Integration tests for API"""
+import asyncio
+import json
+import tempfile
+import threading
+import uuid
 from decimal import Decimal
 from pathlib import Path
+from unittest import mock
 
+from asgiref.sync import async_to_sync, sync_to_async
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, tag
+from django.db import connection
+from django.test import (AsyncClient, AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase,
+                         override_settings, tag)
 from rest_framework.test import APIClient
 
-from app.models import Transaction
+from app.api.jobs import run_upload_job
+from app.api.resources import (AsyncReportView, AsyncTransactionView, LeanReportView, LeanTransactionView,
+                               get_file_serializer)
+from app.api.serializers import TransactionFileSerializer
+from app.api.utils import collect_retired_generations
+from app.models import Dataset, Generation, Transaction, TransactionQuerySet, UploadJob
+
+# summary of rejected rows of file without mistakes
+NOT_REJECTED = {'count': 0, 'reasons': {'empty': 0, 'encoding': 0, 'columns': 0, 'date': 0, 'type': 0, 'amount': 0,
+                                         'info': 0},
+                'sample': []}
+# test_data_10_correct.csv contains comment and ends with 2 empty lines
+REJECTED_10_CORRECT = {
+    'count': 3,
+    'reasons': {**NOT_REJECTED['reasons'], 'empty': 2, 'columns': 1},
+    'sample': [{'line': 4, 'reason': 'columns', 'row': '# new spark plugs I think'}],
+}
 
 
 class TestTransactionsPost(TestCase):
@@ -32,7 +58,7 @@ class TestTransactionsPost(TestCase):
                                         {'data': SimpleUploadedFile(file.name, file.read(),
                                                                     content_type='multipart/form-data')})
             self.assertEqual(response.status_code, 200)
-            self.assertDictEqual(response.data, {'count': 10})
+            self.assertDictEqual(response.data, {'count': 10, 'rejected': REJECTED_10_CORRECT})
 
     @tag('integration')
     def test_correct_empty_file(self):
@@ -46,7 +72,11 @@ class TestTransactionsPost(TestCase):
                                         {'data': SimpleUploadedFile(file.name, file.read(),
                                                                     content_type='multipart/form-data')})
             self.assertEqual(response.status_code, 200)
-            self.assertDictEqual(response.data, {'count': 0})
+            self.assertDictEqual(response.data, {'count': 0, 'rejected': {
+                'count': 1,
+                'reasons': {**NOT_REJECTED['reasons'], 'columns': 1},
+                'sample': [{'line': 1, 'reason': 'columns', 'row': '2020-07-01, Expense, 18.77, Fuel, 123'}],
+            }})
 
     @tag('integration')
     def test_empty_file(self):
@@ -80,13 +110,176 @@ class TestTransactionsPost(TestCase):
         response = self.client.post('/transactions')
         self.assertEqual(response.status_code, 400)
 
+    @tag('integration')
+    def test_append_mode(self):
+        """
+        test that file sent again in append mode adds only new rows
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        self.client.post('/transactions', {'data': SimpleUploadedFile(path.name, path.read_bytes())})
+        content = path.read_bytes() + b'\n2020-07-31, Income, 10.00, Main St.'
+        response = self.client.post('/transactions?mode=append', {'data': SimpleUploadedFile(path.name, content)})
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(response.data, {'count': 1, 'duplicates': 10, 'removed': 0, 'rejected': {
+            **REJECTED_10_CORRECT, 'count': 4, 'reasons': {**REJECTED_10_CORRECT['reasons'], 'empty': 3}}})
+        self.assertEqual(self.client.get('/report').data['gross-revenue'], Decimal('235.00'))
+
+    @tag('integration')
+    def test_repeated_file(self):
+        """
+        test that the same file sent again to unchanged dataset gets the previous result without new generation,
+        and it's loaded again after change of dataset
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        self.client.post('/transactions', {'data': SimpleUploadedFile(path.name, path.read_bytes())})
+        generation_id = Dataset.get_current_generation_id()
+        response = self.client.post('/transactions', {'data': SimpleUploadedFile('other.csv', path.read_bytes())})
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(response.data, {'count': 10, 'rejected': REJECTED_10_CORRECT, 'skipped': True})
+        self.assertEqual(Dataset.get_current_generation_id(), generation_id)
+        Transaction.objects.first().delete()
+        response = self.client.post('/transactions', {'data': SimpleUploadedFile(path.name, path.read_bytes())})
+        self.assertDictEqual(response.data, {'count': 10, 'rejected': REJECTED_10_CORRECT})
+        self.assertNotEqual(Dataset.get_current_generation_id(), generation_id)
+        self.assertEqual(Transaction.objects.count(), 10)
+
+    @tag('integration')
+    def test_repeated_append(self):
+        """
+        test that the same file appended again reports nothing inserted and all valid rows as duplicates
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        self.client.post('/transactions', {'data': SimpleUploadedFile(path.name, b'2020-06-01, Income, 1.00, A')})
+        response = self.client.post('/transactions?mode=append', {'data': SimpleUploadedFile(path.name,
+                                                                                              path.read_bytes())})
+        self.assertDictEqual(response.data, {'count': 10, 'duplicates': 0, 'removed': 0,
+                                             'rejected': REJECTED_10_CORRECT})
+        response = self.client.post('/transactions?mode=append', {'data': SimpleUploadedFile(path.name,
+                                                                                              path.read_bytes())})
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(response.data, {'count': 0, 'duplicates': 10, 'removed': 0,
+                                             'rejected': REJECTED_10_CORRECT, 'skipped': True})
+        self.assertEqual(Transaction.objects.count(), 11)
+
+    @tag('integration')
+    def test_unknown_mode(self):
+        """
+        test request with incorrect mode
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        response = self.client.post('/transactions?mode=merge', {'data': SimpleUploadedFile(path.name, b'')})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('mode', response.data)
+        self.assertEqual(Transaction.objects.count(), 0)
+
+
+class TestTransactionsAsyncPost(TestCase):
+    """Class to test upload of file which is processed in background"""
+
+    def setUp(self):
+        """
+        Change default client to APIClient and directory for uploaded files to temporary one
+        :return: None
+        """
+        self.client = APIClient()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(UPLOAD_JOBS_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    @tag('integration')
+    def test_async_upload(self):
+        """
+        test that job is created, processed and its progress is available
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        with open(path, 'rb') as file:
+            response = self.client.post('/transactions?async=1',
+                                        {'data': SimpleUploadedFile(file.name, file.read(),
+                                                                    content_type='multipart/form-data')})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertEqual(response['Location'], f"/transactions/jobs/{response.data['id']}")
+        self.assertEqual(Transaction.objects.count(), 0)
+        job = run_upload_job(response.data['id'])
+        self.assertFalse(Path(job.file_path).exists())
+        response = self.client.get(response['Location'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['rows_parsed'], 13)
+        self.assertEqual(response.data['rows_skipped'], 3)
+        self.assertEqual(response.data['rows_inserted'], 10)
+        self.assertDictEqual(response.data['rejected'], REJECTED_10_CORRECT)
+        self.assertEqual(Transaction.objects.count(), 10)
+
+    @tag('integration')
+    def test_async_append(self):
+        """
+        test that job keeps mode and counts only new rows as inserted
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        self.client.post('/transactions', {'data': SimpleUploadedFile(path.name, path.read_bytes())})
+        response = self.client.post('/transactions?async=1&mode=append',
+                                    {'data': SimpleUploadedFile(path.name, path.read_bytes())})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['mode'], 'append')
+        job = run_upload_job(response.data['id'])
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.rows_parsed, 13)
+        self.assertEqual(job.rows_inserted, 0)
+        self.assertEqual(Transaction.objects.count(), 10)
+
+    @tag('integration')
+    def test_async_upload_missing_file(self):
+        """
+        test that job fails if saved file disappeared
+        :return: None
+        """
+        job = UploadJob.objects.create(file_path=str(Path(tempfile.gettempdir(), f'{uuid.uuid4()}.csv')))
+        with self.assertLogs('app.api.jobs', 'ERROR'):
+            self.assertEqual(run_upload_job(job.pk).status, 'failed')
+        response = self.client.get(f'/transactions/jobs/{job.pk}')
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertNotEqual(response.data['error'], '')
+
+    @tag('integration')
+    def test_job_run_once(self):
+        """
+        test that job which was already claimed by worker isn't run again
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        response = self.client.post('/transactions?async=1', {'data': SimpleUploadedFile(path.name, path.read_bytes())})
+        self.assertEqual(run_upload_job(response.data['id']).status, 'done')
+        with self.assertLogs('app.api.jobs', 'WARNING'):
+            job = run_upload_job(response.data['id'])
+        self.assertEqual(job.rows_inserted, 10)
+        self.assertEqual(Transaction.objects.count(), 10)
+
+    @tag('integration')
+    def test_unknown_job(self):
+        """
+        test request of job which doesn't exist
+        :return: None
+        """
+        response = self.client.get(f'/transactions/jobs/{uuid.uuid4()}')
+        self.assertEqual(response.status_code, 404)
+
 
 class TestReportGet(TestCase):
     """Class to test GET method of /report API"""
 
     def setUp(self):
-        """Change default client to APIClient"""
+        """Change default client to APIClient and drop reports cached by previous tests"""
         self.client = APIClient()
+        cache.clear()
 
     @tag('integration')
     def test_empty_report(self):
@@ -159,6 +352,742 @@ class TestReportGet(TestCase):
                                                  'expenses': Decimal('72.93'),
                                                  'net-revenue': Decimal('152.07')})
 
+    @tag('integration')
+    def test_filtered_report(self):
+        """
+        test report filtered by dates, type, category and address
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        with open(path, 'rb') as file:
+            self.client.post('/transactions',
+                             {'data': SimpleUploadedFile(file.name, file.read(),
+                                                         content_type='multipart/form-data')})
+        cases = (
+            ('from=2020-07-15&to=2020-07-22', ('100.00', '12.45', '87.55')),
+            ('type=Expense', ('0.00', '72.93', '-72.93')),
+            ('expense_category=Fuel&from=2020-07-10', ('0.00', '26.66', '-26.66')),
+            ('job_address=219 Pleasant', ('70.00', '0.00', '70.00')),
+            ('job_address=Unknown', ('0.00', '0.00', '0.00')),
+        )
+        for query, (incomes, expenses, net) in cases:
+            response = self.client.get(f'/report?{query}')
+            self.assertEqual(response.status_code, 200)
+            self.assertDictEqual(response.data, {'gross-revenue': Decimal(incomes),
+                                                 'expenses': Decimal(expenses),
+                                                 'net-revenue': Decimal(net)})
+
+    @tag('integration')
+    def test_filtered_report_etag(self):
+        """
+        test that reports with different filters have different ETag
+        :return: None
+        """
+        etag = self.client.get('/report')['ETag']
+        response = self.client.get('/report?type=Income', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @tag('integration')
+    def test_incorrect_filters(self):
+        """
+        test incorrect values of filters
+        :return: None
+        """
+        for query in ('from=2020-13-01', 'to=yesterday', 'type=Transfer'):
+            response = self.client.get(f'/report?{query}')
+            self.assertEqual(response.status_code, 400)
+
+    @tag('integration')
+    def test_not_modified_report(self):
+        """
+        test that client with actual ETag gets 304 without database queries
+        :return: None
+        """
+        response = self.client.get('/report')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/report', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    @tag('integration')
+    def test_upload_invalidates_report(self):
+        """
+        test that new upload changes ETag and cached report
+        :return: None
+        """
+        response = self.client.get('/report')
+        etag = response['ETag']
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_1_correct.csv')
+        with open(path, 'rb') as file:
+            self.client.post('/transactions',
+                             {'data': SimpleUploadedFile(file.name, file.read(),
+                                                         content_type='multipart/form-data')})
+        response = self.client.get('/report', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['expenses'], Decimal('18.77'))
+
+    def tearDown(self):
+        """To clean up database between tests"""
+        Transaction.objects.all().delete()
+
+
+class TestReportTimeseriesGet(TestCase):
+    """Class to test GET method of /report/timeseries API"""
+
+    def setUp(self):
+        """Change default client to APIClient, drop reports cached by previous tests and upload transactions"""
+        self.client = APIClient()
+        cache.clear()
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        with open(path, 'rb') as file:
+            self.client.post('/transactions',
+                             {'data': SimpleUploadedFile(file.name, file.read(),
+                                                         content_type='multipart/form-data')})
+
+    @tag('integration')
+    def test_empty_timeseries(self):
+        """
+        test endpoint without any data
+        :return: None
+        """
+        Transaction.objects.all().delete()
+        Dataset.objects.all().delete()
+        response = self.client.get('/report/timeseries')
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(json.loads(b''.join(response.streaming_content)), [])
+
+    @tag('integration')
+    def test_monthly_timeseries(self):
+        """
+        test default granularity
+        :return: None
+        """
+        response = self.client.get('/report/timeseries')
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(json.loads(b''.join(response.streaming_content)), [
+            {'period': '2020-07-01', 'gross-revenue': 225.0, 'expenses': 72.93, 'net-revenue': 152.07},
+        ])
+
+    @tag('integration')
+    def test_unaligned_ranges(self):
+        """
+        test ranges which don't start or end on boundaries of periods
+        :return: None
+        """
+        cases = (
+            ('granularity=week&from=2020-07-02&to=2020-07-15', [
+                {'period': '2020-06-29', 'gross-revenue': 40.0, 'expenses': 0.0, 'net-revenue': 40.0},
+                {'period': '2020-07-06', 'gross-revenue': 35.0, 'expenses': 27.5, 'net-revenue': 7.5},
+                {'period': '2020-07-13', 'gross-revenue': 25.0, 'expenses': 0.0, 'net-revenue': 25.0},
+            ]),
+            ('granularity=month&from=2020-07-10&to=2020-07-20', [
+                {'period': '2020-07-01', 'gross-revenue': 25.0, 'expenses': 39.95, 'net-revenue': -14.95},
+            ]),
+            ('granularity=day&from=2020-07-22&to=2020-07-22', [
+                {'period': '2020-07-22', 'gross-revenue': 75.0, 'expenses': 0.0, 'net-revenue': 75.0},
+            ]),
+        )
+        for query, expected in cases:
+            response = self.client.get(f'/report/timeseries?{query}')
+            self.assertEqual(response.status_code, 200)
+            self.assertListEqual(json.loads(b''.join(response.streaming_content)), expected)
+
+    @tag('integration')
+    def test_incorrect_parameters(self):
+        """
+        test incorrect granularity and range
+        :return: None
+        """
+        for query in ('granularity=year', 'from=2020-07-10&to=2020-07-01'):
+            response = self.client.get(f'/report/timeseries?{query}')
+            self.assertEqual(response.status_code, 400)
+
+    @tag('integration')
+    def test_not_modified_timeseries(self):
+        """
+        test that client with actual ETag gets 304
+        :return: None
+        """
+        etag = self.client.get('/report/timeseries?granularity=week')['ETag']
+        response = self.client.get('/report/timeseries?granularity=week', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
     def tearDown(self):
         """To clean up database between tests"""
         Transaction.objects.all().delete()
+
+
+class TestTransactionsGet(TestCase):
+    """Class to test GET method of /transactions and /transactions/export.csv API"""
+
+    def setUp(self):
+        """Change default client to APIClient and upload transactions"""
+        self.client = APIClient()
+        self.upload()
+
+    def upload(self, content=None):
+        """
+        upload test file or given content
+        :param content: bytes with file or None for test_data_10_correct.csv
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        response = self.client.post('/transactions',
+                                    {'data': SimpleUploadedFile(path.name, content or path.read_bytes())})
+        self.assertEqual(response.status_code, 200)
+
+    def get_all_pages(self, url):
+        """
+        follow links to the next pages
+        :param url: url of the first page
+        :return: list of pages
+        """
+        pages = []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            url = pages[-1]['next']
+        return pages
+
+    @tag('integration')
+    def test_pages(self):
+        """
+        test that pages contain all transactions ordered by date and id without repeats
+        :return: None
+        """
+        pages = self.get_all_pages('/transactions?limit=3')
+        self.assertListEqual([len(page['results']) for page in pages], [3, 3, 3, 1])
+        results = [row for page in pages for row in page['results']]
+        self.assertListEqual(results, sorted(results, key=lambda row: (row['date'], row['id'])))
+        self.assertEqual(len({row['id'] for row in results}), 10)
+        self.assertDictEqual({key: value for key, value in results[0].items() if key != 'id'}, {
+            'date': '2020-07-01', 'type': 'Expense', 'value': 18.77,
+            'expense_category': 'Fuel', 'job_address': None,
+        })
+        # two transactions of 2020-07-25 are split between pages
+        self.assertEqual(pages[2]['results'][-1]['date'], '2020-07-25')
+        self.assertEqual(pages[3]['results'][0]['date'], '2020-07-25')
+
+    @tag('integration')
+    def test_default_limit(self):
+        """
+        test that all transactions fit to the first page with default limit
+        :return: None
+        """
+        response = self.client.get('/transactions')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 10)
+        self.assertIsNone(response.json()['next'])
+
+    @tag('integration')
+    def test_empty_dataset(self):
+        """
+        test list without any data
+        :return: None
+        """
+        Transaction.objects.all().delete()
+        Dataset.objects.all().delete()
+        response = self.client.get('/transactions')
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(response.json(), {'next': None, 'results': []})
+
+    @tag('integration')
+    def test_incorrect_parameters(self):
+        """
+        test incorrect limit and cursor
+        :return: None
+        """
+        for query in ('limit=0', f'limit={settings.TRANSACTIONS_MAX_PAGE_SIZE + 1}', 'limit=a', 'cursor=abc',
+                      'cursor=MSwyMDIwLTEzLTAxLDE'):
+            response = self.client.get(f'/transactions?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    @tag('integration')
+    def test_cursor_of_replaced_dataset(self):
+        """
+        test that the next page is read from the same dataset and cursor is rejected after dataset is replaced,
+        before and after removal of replaced dataset
+        :return: None
+        """
+        first = self.client.get('/transactions?limit=5').json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertEqual(second['results'][-1]['date'], '2020-07-25')
+        self.upload(b'2021-01-01, Income, 1.00, Main St.')
+        for _ in range(2):
+            response = self.client.get(first['next'])
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('cursor', response.json())
+            Generation.collect_retired(settings.GENERATIONS_GC_CHUNK_SIZE)
+
+    @tag('integration')
+    def test_export(self):
+        """
+        test that export contains all transactions in format of uploaded file and could be uploaded back
+        :return: None
+        """
+        response = self.client.get('/transactions/export.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content)
+        lines = content.decode().splitlines()
+        self.assertEqual(len(lines), 11)
+        self.assertEqual(lines[0], 'date,type,value,additional_info')
+        self.assertEqual(lines[1], '2020-07-01,Expense,18.77,Fuel')
+        self.assertEqual(lines[-1], '2020-07-25,Income,50.00,19 Maple Dr.')
+        report = self.client.get('/report').json()
+        self.upload(content)
+        cache.clear()
+        self.assertDictEqual(self.client.get('/report').json(), report)
+        self.assertEqual(Transaction.objects.count(), 10)
+
+    @tag('integration')
+    @override_settings(TRANSACTIONS_EXPORT_CHUNK_SIZE=3)
+    def test_export_by_chunks(self):
+        """
+        test that export is streamed by chunks of rows
+        :return: None
+        """
+        chunks = list(self.client.get('/transactions/export.csv').streaming_content)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(b''.join(chunks).count(b'\n'), 11)
+
+    @tag('integration')
+    @override_settings(TRANSACTIONS_EXPORT_CHUNK_SIZE=3)
+    async def test_export_asgi(self):
+        """
+        test that export is read completely under ASGI, where streamed content is iterated in event loop
+        :return: None
+        """
+        response = await AsyncClient().get('/transactions/export.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.csv"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 11)
+        self.assertEqual(lines[1], '2020-07-01,Expense,18.77,Fuel')
+        self.assertEqual(int(response['Content-Length']), len('\n'.join(lines)) + 1)
+
+    def tearDown(self):
+        """To clean up database between tests"""
+        Transaction.objects.all().delete()
+
+
+class TestLeanViews(TestCase):
+    """Class to test lean views which are used instead of DRF views with setting API_LEAN_VIEWS"""
+
+    def setUp(self):
+        """Create factory of requests and drop reports cached by previous tests"""
+        self.factory = RequestFactory()
+        self.client = APIClient()
+        cache.clear()
+
+    @tag('integration')
+    @override_settings(UPLOAD_DIGESTS_MAX_SIZE=0)
+    def test_same_responses_as_drf_views(self):
+        """
+        test that lean views return the same bytes as DRF views
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        for content, query in ((path.read_bytes(), ''), (None, ''), (path.read_bytes(), '?mode=append'),
+                               (path.read_bytes(), '?mode=merge')):
+            data = {'data': SimpleUploadedFile(path.name, content)} if content else {}
+            response = LeanTransactionView.as_view()(self.factory.post(f'/transactions{query}', data))
+            data = {'data': SimpleUploadedFile(path.name, content)} if content else {}
+            expected = self.client.post(f'/transactions{query}', data)
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(response.content, expected.content)
+        for query in ('', '?type=Expense', '?from=2020-07-15&to=2020-07-22', '?type=Transfer'):
+            expected = self.client.get(f'/report{query}')
+            cache.clear()
+            response = LeanReportView.as_view()(self.factory.get(f'/report{query}'))
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response['Content-Type'], expected['Content-Type'])
+        for query in ('', '?limit=3', '?limit=0'):
+            expected = self.client.get(f'/transactions{query}')
+            response = LeanTransactionView.as_view()(self.factory.get(f'/transactions{query}'))
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(response.content, expected.content)
+
+    @tag('integration')
+    def test_not_modified_report(self):
+        """
+        test that client with actual ETag gets 304
+        :return: None
+        """
+        response = LeanReportView.as_view()(self.factory.get('/report'))
+        self.assertEqual(response.status_code, 200)
+        response = LeanReportView.as_view()(self.factory.get('/report', HTTP_IF_NONE_MATCH=response['ETag']))
+        self.assertEqual(response.status_code, 304)
+
+    def tearDown(self):
+        """To clean up database between tests"""
+        Transaction.objects.all().delete()
+
+
+@override_settings(GENERATIONS_GC_IN_BACKGROUND=False)
+class TestAsyncViews(TransactionTestCase):
+    """Class to test async views which are used instead of DRF views with setting API_ASYNC_VIEWS,
+    uploads are run in threads with own database connections"""
+
+    def setUp(self):
+        """Create factory of async requests and drop reports cached by previous tests"""
+        self.factory = AsyncRequestFactory()
+        self.client = APIClient()
+        cache.clear()
+
+    async def upload(self, name):
+        """
+        upload test file by async view
+        :param name: name of file from test_files
+        :return: response
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', name)
+        request = self.factory.post('/transactions', {'data': SimpleUploadedFile(path.name, path.read_bytes())})
+        # body is read at once like ASGI handler does, fake stream of test client doesn't allow to read more
+        # than content length by chunks of multipart parser
+        request.body  # pylint: disable=pointless-statement
+        return await AsyncTransactionView.as_view()(request)
+
+    @tag('integration')
+    async def test_upload(self):
+        """
+        test that async upload returns the same response as sync one and stores transactions
+        :return: None
+        """
+        response = await self.upload('test_data_10_correct.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'count': 10, 'rejected': REJECTED_10_CORRECT})
+        self.assertEqual(await Transaction.objects.acount(), 10)
+
+    @tag('integration')
+    async def test_upload_parsed_in_thread(self):
+        """
+        test that multipart body is parsed outside of event loop, so big upload doesn't block other requests
+        :return: None
+        """
+        threads = []
+
+        def parse(request):
+            threads.append(threading.get_ident())
+            return get_file_serializer(request)
+
+        with mock.patch('app.api.resources.get_file_serializer', parse):
+            response = await self.upload('test_data_10_correct.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    @tag('integration')
+    async def test_report_during_upload(self):
+        """
+        test that async report isn't queued behind upload which is still running
+        :return: None
+        """
+        parsing, resume = threading.Event(), threading.Event()
+
+        def parse(request):
+            parsing.set()
+            resume.wait(10)
+            return get_file_serializer(request)
+
+        with mock.patch('app.api.resources.get_file_serializer', parse):
+            upload = asyncio.ensure_future(self.upload('test_data_10_correct.csv'))
+            try:
+                self.assertTrue(await sync_to_async(parsing.wait, thread_sensitive=False)(10))
+                response = await asyncio.wait_for(AsyncReportView.as_view()(self.factory.get('/report')), 5)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(upload.done())
+            finally:
+                resume.set()
+            response = await upload
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await Transaction.objects.acount(), 10)
+
+    @tag('integration')
+    async def test_upload_without_file(self):
+        """
+        test that request without file returns errors like sync view does
+        :return: None
+        """
+        request = self.factory.post('/transactions', {})
+        request.body  # pylint: disable=pointless-statement
+        response = await AsyncTransactionView.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b'"data"', response.content)
+
+    @tag('integration')
+    def test_same_report_as_sync_view(self):
+        """
+        test that async report returns the same bytes as DRF view for reports with and without filters
+        :return: None
+        """
+        async_to_sync(self.upload)('test_data_10_correct.csv')
+        for query in ('', '?type=Expense', '?from=2020-07-15&to=2020-07-22', '?type=Transfer'):
+            expected = self.client.get(f'/report{query}')
+            cache.clear()
+            response = async_to_sync(AsyncReportView.as_view())(self.factory.get(f'/report{query}'))
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response['Content-Type'], expected['Content-Type'])
+        for query in ('', '?limit=3', '?limit=0'):
+            expected = self.client.get(f'/transactions{query}')
+            response = async_to_sync(AsyncTransactionView.as_view())(self.factory.get(f'/transactions{query}'))
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(response.content, expected.content)
+
+    @tag('integration')
+    async def test_not_modified_report(self):
+        """
+        test that client with actual ETag gets 304
+        :return: None
+        """
+        response = await AsyncReportView.as_view()(self.factory.get('/report'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+        request = self.factory.get('/report', **{'If-None-Match': response['ETag']})
+        response = await AsyncReportView.as_view()(request)
+        self.assertEqual(response.status_code, 304)
+
+
+class TestTenants(TestCase):
+    """Class to test that each tenant has own dataset"""
+
+    def setUp(self):
+        """Create client and drop reports cached by previous tests"""
+        self.client = APIClient()
+        self.path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        cache.clear()
+
+    def upload(self, tenant, content, query=''):
+        """
+        upload file as tenant
+        :param tenant: key of tenant
+        :param content: bytes with file
+        :param query: query string of request
+        :return: response
+        """
+        return self.client.post(f'/transactions{query}', {'data': SimpleUploadedFile(self.path.name, content)},
+                                HTTP_X_TENANT=tenant)
+
+    @tag('integration')
+    def test_separate_datasets(self):
+        """
+        test that upload of tenant doesn't change datasets of other tenants and shared one
+        :return: None
+        """
+        self.client.post('/transactions', {'data': SimpleUploadedFile(self.path.name, self.path.read_bytes())})
+        self.assertDictEqual(self.upload('a', b'2020-07-01, Income, 10.00, Main St.').data,
+                             {'count': 1, 'rejected': NOT_REJECTED})
+        generation_id = Dataset.get_current_generation_id('a')
+        self.assertDictEqual(self.upload('b', self.path.read_bytes()).data,
+                             {'count': 10, 'rejected': REJECTED_10_CORRECT})
+        response = self.upload('b', b'2020-07-02, Expense, 5.00, Fuel', '?mode=append')
+        self.assertDictEqual(response.data, {'count': 1, 'duplicates': 0, 'removed': 0, 'rejected': NOT_REJECTED})
+        self.assertEqual(Dataset.get_current_generation_id('a'), generation_id)
+        self.assertEqual(self.client.get('/report').data['gross-revenue'], Decimal('225.00'))
+        self.assertEqual(self.client.get('/report', HTTP_X_TENANT='a').data['gross-revenue'], Decimal('10.00'))
+        self.assertEqual(self.client.get('/report', HTTP_X_TENANT='b').data['expenses'], Decimal('77.93'))
+        self.assertEqual(self.client.get('/report', HTTP_X_TENANT='c').data['gross-revenue'], Decimal('0'))
+        response = self.client.get('/report?type=Income', HTTP_X_TENANT='a')
+        self.assertEqual(response.data['gross-revenue'], Decimal('10.00'))
+        self.assertIn('X-Tenant', response['Vary'])
+        response = self.client.get('/report/timeseries', HTTP_X_TENANT='a')
+        self.assertEqual(json.loads(b''.join(response.streaming_content))[0]['gross-revenue'], 10.0)
+        self.assertEqual(len(self.client.get('/transactions', HTTP_X_TENANT='a').data['results']), 1)
+        response = self.client.get('/transactions/export.csv', HTTP_X_TENANT='a')
+        self.assertEqual(b''.join(response.streaming_content).count(b'\n'), 2)
+        self.assertEqual(Transaction.objects.for_tenant('b').count(), 11)
+        self.assertEqual(Transaction.objects.count(), 10)
+
+    @tag('integration')
+    def test_report_cache_of_tenant(self):
+        """
+        test that upload of tenant invalidates only its own reports
+        :return: None
+        """
+        self.upload('a', self.path.read_bytes())
+        etag = self.client.get('/report', HTTP_X_TENANT='a')['ETag']
+        other_etag = self.client.get('/report', HTTP_X_TENANT='b')['ETag']
+        self.upload('b', self.path.read_bytes())
+        self.assertEqual(self.client.get('/report', HTTP_X_TENANT='a', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/report', HTTP_X_TENANT='b', HTTP_IF_NONE_MATCH=other_etag).status_code,
+                         200)
+
+    @tag('integration')
+    def test_foreign_cursor_and_job(self):
+        """
+        test that tenant can't read pages and jobs of other tenant
+        :return: None
+        """
+        self.upload('a', self.path.read_bytes())
+        cursor = self.client.get('/transactions?limit=3', HTTP_X_TENANT='a').data['next']
+        self.assertEqual(self.client.get(cursor, HTTP_X_TENANT='a').status_code, 200)
+        response = self.client.get(cursor, HTTP_X_TENANT='b')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
+        job = UploadJob.objects.create(file_path='', tenant='a')
+        self.assertEqual(self.client.get(f'/transactions/jobs/{job.pk}', HTTP_X_TENANT='a').status_code, 200)
+        self.assertEqual(self.client.get(f'/transactions/jobs/{job.pk}', HTTP_X_TENANT='b').status_code, 404)
+
+    @tag('integration')
+    def test_invalid_tenant(self):
+        """
+        test that tenant which can't be used as key is rejected by all views
+        :return: None
+        """
+        response = self.upload('a b', self.path.read_bytes())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tenant', response.data)
+        self.assertEqual(self.client.get('/report', HTTP_X_TENANT='x' * 101).status_code, 400)
+        self.assertEqual(self.client.get('/transactions/export.csv', HTTP_X_TENANT='a:b').status_code, 400)
+        factory = RequestFactory()
+        request = factory.post('/transactions', {'data': SimpleUploadedFile(self.path.name, self.path.read_bytes())},
+                               HTTP_X_TENANT='a b')
+        self.assertEqual(LeanTransactionView.as_view()(request).content, response.content)
+        self.assertEqual(LeanReportView.as_view()(factory.get('/report', HTTP_X_TENANT='a b')).status_code, 400)
+        self.assertFalse(Transaction.all_objects.exists())
+
+    def tearDown(self):
+        """To clean up database between tests"""
+        Transaction.all_objects.all().delete()
+
+
+class TestCursorGarbageCollection(TransactionTestCase):
+    """Class to test cursor of dataset which is removed by garbage collection started after commit of upload"""
+
+    @tag('integration')
+    @override_settings(GENERATIONS_GC_CHUNK_SIZE=4)
+    def test_page_during_collection(self):
+        """
+        test that cursor of replaced dataset is rejected while its rows are removed by chunks and after removal
+        :return: None
+        """
+        client = APIClient()
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        client.post('/transactions', {'data': SimpleUploadedFile(path.name, path.read_bytes())})
+        cursor = client.get('/transactions?limit=3').data['next']
+        responses = []
+        purge = TransactionQuerySet.purge
+
+        def purge_and_read(queryset):
+            count = purge(queryset)
+            if not responses:
+                responses.append(client.get(cursor))
+            return count
+
+        # collection is run in thread of test instead of background thread, so page is read after the first chunk
+        with mock.patch('app.api.serializers.start_collect_retired_generations', collect_retired_generations), \
+                mock.patch.object(TransactionQuerySet, 'purge', purge_and_read):
+            client.post('/transactions', {'data': SimpleUploadedFile('data.csv', b'2021-01-01, Income, 1.00, A')})
+        self.assertEqual(len(responses), 1)
+        self.assertFalse(Generation.objects.filter(retired=True).exists())
+        responses.append(client.get(cursor))
+        for response in responses:
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('cursor', response.data)
+
+
+@override_settings(GENERATIONS_GC_IN_BACKGROUND=False)
+class TestConcurrentTenants(TransactionTestCase):
+    """Class to test uploads of different tenants from several threads with own database connections"""
+
+    def setUp(self):
+        """Drop reports cached by previous tests"""
+        cache.clear()
+
+    @staticmethod
+    def get_content(tenant, rows):
+        """
+        build file with rows which values depend on tenant
+        :param tenant: key of tenant
+        :param rows: count of rows
+        :return: bytes with file
+        """
+        return '\n'.join(f'2020-07-{day % 28 + 1:02d}, Income, {len(tenant)}.00, Main St.'
+                         for day in range(rows)).encode()
+
+    @staticmethod
+    def run_in_thread(target, *args):
+        """
+        run function in thread which closes its database connection at the end
+        :param target: function
+        :param args: arguments of function
+        :return: started thread
+        """
+        def run():
+            try:
+                target(*args)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    @tag('integration')
+    def test_simultaneous_uploads(self):
+        """
+        test that uploads of different tenants started at the same time are all stored in own datasets
+        :return: None
+        """
+        tenants = ['a', 'bb', 'ccc', 'dddd']
+        barrier = threading.Barrier(len(tenants))
+        responses = {}
+
+        def upload(tenant):
+            client = APIClient()
+            data = {'data': SimpleUploadedFile('data.csv', self.get_content(tenant, 500))}
+            barrier.wait()
+            responses[tenant] = client.post('/transactions', data, HTTP_X_TENANT=tenant)
+
+        for thread in [self.run_in_thread(upload, tenant) for tenant in tenants]:
+            thread.join()
+        client = APIClient()
+        for tenant in tenants:
+            self.assertEqual(responses[tenant].status_code, 200)
+            self.assertDictEqual(responses[tenant].data, {'count': 500, 'rejected': NOT_REJECTED})
+            report = client.get('/report', HTTP_X_TENANT=tenant).data
+            self.assertEqual(report['gross-revenue'], Decimal(500 * len(tenant)))
+            self.assertEqual(Transaction.objects.for_tenant(tenant).count(), 500)
+        self.assertEqual(Dataset.objects.count(), len(tenants))
+
+    @tag('integration')
+    @override_settings(TRANSACTIONS_BATCH_SIZE=100)
+    def test_report_during_upload(self):
+        """
+        test that report of tenant is available while upload of other tenant keeps its database transaction open,
+        and uploaded rows aren't visible before commit
+        :return: None
+        """
+        client = APIClient()
+        client.post('/transactions', {'data': SimpleUploadedFile('data.csv', self.get_content('b', 10))},
+                    HTTP_X_TENANT='b')
+        loaded, resume = threading.Event(), threading.Event()
+
+        def pause(columns):
+            loaded.set()
+            resume.wait(10)
+
+        def upload():
+            serializer = TransactionFileSerializer(
+                data={'data': SimpleUploadedFile('data.csv', self.get_content('a', 1000))})
+            serializer.is_valid(raise_exception=True)
+            serializer.save_transactions(progress=pause, tenant='a')
+
+        thread = self.run_in_thread(upload)
+        try:
+            self.assertTrue(loaded.wait(10))
+            self.assertEqual(client.get('/report', HTTP_X_TENANT='b').data['gross-revenue'], Decimal('10.00'))
+            self.assertEqual(client.get('/report', HTTP_X_TENANT='a').data['gross-revenue'], Decimal('0'))
+        finally:
+            resume.set()
+            thread.join()
+        self.assertEqual(client.get('/report', HTTP_X_TENANT='a').data['gross-revenue'], Decimal('1000.00'))
@@ -0,0 +1,199 @@
+"""File to test management commands"""
+import json
+import os
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase, tag
+
+from app.api.exceptions import InvalidInput
+from app.api.utils import validate_and_prepare_transaction_row
+from app.bench.data import iter_rows
+from app.bench.suite import compare_results
+from app.models import Dataset, Generation, Transaction, UploadJob
+
+
+class TestRebuildReportTotals(TestCase):
+    """Class to test command which recounts report totals"""
+
+    def setUp(self):
+        """
+        Create transactions and break stored totals
+        :return: None
+        """
+        Transaction.objects.create(date=datetime.now(), type='i', value=Decimal('12.34'), job_address='test address')
+        Generation.objects.filter(pk=Dataset.get_current_generation_id()).update(incomes=Decimal('1.00'))
+
+    @tag('unit')
+    def test_check_mismatch(self):
+        """
+        test that check fails if totals are wrong
+        :return: None
+        """
+        with self.assertRaises(CommandError):
+            call_command('rebuild_report_totals', '--check', stdout=StringIO())
+
+    @tag('unit')
+    def test_rebuild(self):
+        """
+        test that rebuild fixes totals
+        :return: None
+        """
+        call_command('rebuild_report_totals', stdout=StringIO())
+        self.assertEqual(Generation.objects.get(pk=Dataset.get_current_generation_id()).incomes, Decimal('12.34'))
+        out = StringIO()
+        call_command('rebuild_report_totals', '--check', stdout=out)
+        self.assertIn('correct', out.getvalue())
+
+
+class TestCollectGenerations(TestCase):
+    """Class to test command which removes retired generations"""
+
+    @tag('unit')
+    def test_collect(self):
+        """
+        test that only retired generations are removed
+        :return: None
+        """
+        Transaction.objects.create(date=datetime.now(), type='i', value=Decimal('12.34'), job_address='test address')
+        retired = Generation.objects.create(retired=True)
+        Transaction.all_objects.create(generation=retired, date=datetime.now(), type='e', value=Decimal('1.00'))
+        out = StringIO()
+        call_command('collect_generations', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(Transaction.all_objects.count(), 1)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+
+class TestRecoverUploadJobs(TestCase):
+    """Class to test command which finishes upload jobs left by stopped server"""
+
+    def setUp(self):
+        """
+        Create temporary directory for files of jobs
+        :return: None
+        """
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def create_job(self, status, name, content=b'2020-07-01, Expense, 18.77, Fuel\n'):
+        """
+        Create job with saved file
+        :param status: status of job
+        :param name: str with name of file, file isn't created if content is None
+        :param content: bytes with file or None
+        :return: UploadJob object
+        """
+        path = self.directory / name
+        if content is not None:
+            path.write_bytes(content)
+        return UploadJob.objects.create(status=status, file_path=str(path))
+
+    @tag('unit')
+    def test_recover(self):
+        """
+        test that running jobs and pending jobs without file are failed, other pending jobs are loaded
+        :return: None
+        """
+        running = self.create_job('running', 'running.csv')
+        pending = self.create_job('pending', 'pending.csv')
+        lost = self.create_job('pending', 'lost.csv', content=None)
+        done = self.create_job('done', 'done.csv')
+        out = StringIO()
+        call_command('recover_upload_jobs', stdout=out)
+        self.assertIn('Failed jobs: 2, resumed jobs: 1', out.getvalue())
+        running.refresh_from_db()
+        self.assertEqual(running.status, 'failed')
+        self.assertIn('interrupted', running.error)
+        self.assertIsNotNone(running.finished_at)
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'done')
+        self.assertEqual(pending.rows_inserted, 1)
+        lost.refresh_from_db()
+        self.assertEqual(lost.status, 'failed')
+        self.assertEqual(UploadJob.objects.get(pk=done.pk).status, 'done')
+        self.assertEqual([path.name for path in self.directory.iterdir()], ['done.csv'])
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    @tag('unit')
+    def test_no_resume(self):
+        """
+        test that pending jobs are failed without loading if they shouldn't be resumed
+        :return: None
+        """
+        pending = self.create_job('pending', 'pending.csv')
+        call_command('recover_upload_jobs', '--no-resume', stdout=StringIO())
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'failed')
+        self.assertFalse(Path(pending.file_path).exists())
+        self.assertEqual(Transaction.objects.count(), 0)
+
+
+class TestBench(TestCase):
+    """Class to test benchmark suite and command which runs it"""
+
+    def setUp(self):
+        """
+        Create temporary directory for results
+        :return: None
+        """
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, 'bench.json')
+
+    @tag('unit')
+    def test_generator(self):
+        """
+        test that generator is deterministic and gives requested part of invalid rows
+        :return: None
+        """
+        rows = list(iter_rows(2000, invalid_ratio=0.1, seed=5))
+        self.assertEqual(rows, list(iter_rows(2000, invalid_ratio=0.1, seed=5)))
+        self.assertNotEqual(rows, list(iter_rows(2000, invalid_ratio=0.1, seed=6)))
+        invalid = 0
+        for row in rows:
+            try:
+                validate_and_prepare_transaction_row(row)
+            except InvalidInput:
+                invalid += 1
+        self.assertAlmostEqual(invalid / len(rows), 0.1, delta=0.03)
+
+    @tag('unit')
+    def test_compare_results(self):
+        """
+        test that only metrics which are worse than threshold are regressions
+        :return: None
+        """
+        baseline = {'parse.rows_per_s': 1000, 'report.10.totals_ms': 10, 'peak_rss_mib': 50, 'removed_ms': 1}
+        metrics = {'parse.rows_per_s': 700, 'report.10.totals_ms': 13, 'peak_rss_mib': 40, 'added_ms': 1}
+        regressions = compare_results(metrics, baseline, 0.2)
+        self.assertEqual([name for name, *_ in regressions], ['parse.rows_per_s', 'report.10.totals_ms'])
+        self.assertAlmostEqual(regressions[0][3], -0.3)
+        self.assertEqual(compare_results(metrics, baseline, 0.5), [])
+
+    @tag('unit')
+    def test_bench(self):
+        """
+        test that command writes results and fails if they are worse than baseline
+        :return: None
+        """
+        options = ['--rows', '200', '--report-sizes', '10', '50', '--repeat', '1', '--batch-size', '64']
+        call_command('bench', *options, '--output', self.output, stdout=StringIO())
+        with open(self.output, encoding='utf-8') as file:
+            results = json.load(file)
+        self.assertEqual(results['meta']['rows'], 200)
+        self.assertIn('upload.rows_per_s', results['metrics'])
+        self.assertIn('report.50.filtered_ms', results['metrics'])
+        self.assertEqual(Transaction.objects.count(), 48)  # the largest dataset is left, 5% of rows are invalid
+        results['metrics']['upload.rows_per_s'] *= 1000
+        with open(self.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file)
+        stderr = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('bench', *options, '--baseline', self.output, stdout=StringIO(), stderr=stderr)
+        self.assertIn('upload.rows_per_s', stderr.getvalue())
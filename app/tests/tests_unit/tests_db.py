@@ -0,0 +1,57 @@
+"""File to test tuning of database connections"""
+from django.db import OperationalError, connections
+from django.test import TestCase, override_settings, tag
+from django.utils.connection import ConnectionDoesNotExist
+
+from app.api.utils import get_report_data
+from app.db import get_reports_database
+
+
+class TestConfigureSqliteConnection(TestCase):
+    """Class to test pragmas which are executed on new SQLite connection"""
+
+    def connect(self):
+        """
+        Open new connection to test database, so receiver of connection_created is called with current settings
+        :return: database wrapper
+        """
+        connection = connections.create_connection('default')
+        connection.ensure_connection()
+        self.addCleanup(connection.close)
+        return connection
+
+    @tag('unit')
+    def test_pragmas(self):
+        """
+        test that pragmas from settings are executed
+        :return: None
+        """
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234, 'cache_size': -2048}):
+            connection = self.connect()
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 1234)
+            self.assertEqual(cursor.execute('PRAGMA cache_size').fetchone()[0], -2048)
+            self.assertEqual(cursor.execute('PRAGMA query_only').fetchone()[0], 0)
+
+    @tag('unit')
+    def test_read_only(self):
+        """
+        test that connection from DATABASES_READ_ONLY reads but doesn't write
+        :return: None
+        """
+        with override_settings(DATABASES_READ_ONLY=['default']):
+            connection = self.connect()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM app_dataset')
+            with self.assertRaises(OperationalError):
+                cursor.execute("INSERT INTO app_dataset (tenant) VALUES ('test')")
+
+    @tag('unit')
+    def test_reports_database(self):
+        """
+        test that reports are read by connection REPORTS_DATABASE
+        :return: None
+        """
+        self.assertEqual(get_reports_database(), 'default')
+        with override_settings(REPORTS_DATABASE='missing'), self.assertRaises(ConnectionDoesNotExist):
+            get_report_data({'type': 'e'})
@@ -0,0 +1,66 @@
+"""File to test reading of files stored on disk"""
+import tempfile
+from pathlib import Path
+
+from django.core.files import File
+from django.test import TestCase, tag
+
+from app.api.files import get_file_path, iter_file_blocks
+
+
+class TestIterFileBlocks(TestCase):
+    """Class to test reading of file mapped to memory"""
+
+    def setUp(self):
+        """
+        Create file with different line endings
+        :return: None
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name, 'transactions.csv')
+        self.path.write_bytes(b'2020-07-01, Expense, 18.77, Fuel\r\n\n2020-07-04, Income, 40.00, 347 Woodrow\r'
+                              b'# comment\n' * 20 + b'2020-07-06, Income, 35.00, 219 Pleasant')
+
+    @tag('unit')
+    def test_same_rows_as_django_file(self):
+        """
+        test that rows are the same as django File object returns for any size of block
+        :return: None
+        """
+        with open(self.path, 'rb') as file:
+            expected = list(File(file))
+        for block_size in (1, 7, 64, 1024 * 1024):
+            rows = [row for block in iter_file_blocks(self.path, block_size) for row in block]
+            self.assertListEqual(rows, expected)
+
+    @tag('unit')
+    def test_range(self):
+        """
+        test reading of part of file
+        :return: None
+        """
+        content = self.path.read_bytes()
+        start = content.index(b'\n') + 1
+        end = content.index(b'# comment')
+        rows = [row for block in iter_file_blocks(self.path, 10, start, end) for row in block]
+        self.assertEqual(b''.join(rows), content[start:end])
+
+    @tag('unit')
+    def test_empty_file(self):
+        """
+        test that empty file doesn't give any block
+        :return: None
+        """
+        self.path.write_bytes(b'')
+        self.assertListEqual(list(iter_file_blocks(self.path, 10)), [])
+
+    @tag('unit')
+    def test_get_file_path(self):
+        """
+        test that path is found for file on disk only
+        :return: None
+        """
+        with open(self.path, 'rb') as file:
+            self.assertEqual(get_file_path(File(file)), str(self.path))
+        self.assertIsNone(get_file_path(File(tempfile.SpooledTemporaryFile())))
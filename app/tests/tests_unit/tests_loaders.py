@@ -0,0 +1,87 @@
+"""File to test loaders of parsed rows to database"""
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, tag
+
+from app.api.loaders import escape_copy_value, load_transactions, load_with_bulk_create, load_with_copy
+from app.api.utils import parse_transaction_rows
+from app.models import Generation, Transaction
+
+ROWS = [
+    b"2020-07-01, Expense, 18.77, Fuel",
+    b"2020-07-04, Income, 40.00, 347 Woodrow",
+    b"2020-07-05, Income, -0.5, tab\tinside",
+    b"# comment",
+    b"2020-07-06, Expense, 1000, ",
+]
+
+
+class TestLoaders(TestCase):
+    """Class to test that fast loaders store the same data as ORM"""
+
+    def load_and_read(self, loader):
+        """
+        load rows to new generation and read them back
+        :param loader: function to load rows
+        :return: tuple with list of stored rows and generation
+        """
+        generation = Generation.objects.create()
+        loader(generation.pk, parse_transaction_rows(ROWS))
+        rows = list(Transaction.all_objects.filter(generation=generation).order_by('pk').values_list(
+            'date', 'type', 'value', 'expense_category', 'job_address'))
+        generation.refresh_from_db()
+        return rows, generation
+
+    @tag('unit')
+    def test_same_data_as_bulk_create(self):
+        """
+        test that native loader of current database stores the same rows and totals as bulk_create
+        :return: None
+        """
+        expected, expected_generation = self.load_and_read(
+            lambda generation_id, columns: load_with_bulk_create(connection, generation_id, columns))
+        rows, generation = self.load_and_read(load_transactions)
+        self.assertListEqual(rows, expected)
+        self.assertEqual(rows[2][2], Decimal('-0.50'))
+        self.assertEqual(rows[3][3], '')
+        self.assertEqual(generation.incomes, expected_generation.incomes)
+        self.assertEqual(generation.expenses, expected_generation.expenses)
+        self.assertDictEqual(generation.calculate(), {'incomes': generation.incomes, 'expenses': generation.expenses})
+
+    @tag('unit')
+    @skipUnless(connection.vendor == 'postgresql', "COPY is supported only by PostgreSQL")
+    def test_copy(self):
+        """
+        test loading by COPY
+        :return: None
+        """
+        expected, _ = self.load_and_read(
+            lambda generation_id, columns: load_with_bulk_create(connection, generation_id, columns))
+        rows, _ = self.load_and_read(lambda generation_id, columns: load_with_copy(connection, generation_id, columns))
+        self.assertListEqual(rows, expected)
+
+    @tag('unit')
+    def test_stored_as_cents(self):
+        """
+        test that values are stored as integer count of cents
+        :return: None
+        """
+        generation = Generation.objects.create()
+        load_transactions(generation.pk, parse_transaction_rows(ROWS))
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT value FROM {Transaction._meta.db_table} WHERE generation_id = %s ORDER BY id",
+                           [generation.pk])
+            self.assertListEqual([row[0] for row in cursor.fetchall()], [1877, 4000, -50, 100000])
+        generation.refresh_from_db()
+        self.assertEqual(generation.incomes, Decimal('39.50'))
+
+    @tag('unit')
+    def test_escape_copy_value(self):
+        """
+        test escaping of values for COPY
+        :return: None
+        """
+        self.assertEqual(escape_copy_value(None), '\\N')
+        self.assertEqual(escape_copy_value('a\tb\\c'), 'a\\tb\\\\c')
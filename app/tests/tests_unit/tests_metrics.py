@@ -0,0 +1,187 @@
+"""File to test metrics of uploads and reports"""
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings, tag
+
+from app.api import metrics
+from app.api.cache import get_cached_report_data
+from app.api.serializers import TransactionFileSerializer
+
+
+class MetricsTestCase(TestCase):
+    """Class with metrics of process cleared before each test"""
+
+    def setUp(self):
+        """
+        Forget metrics recorded by other tests
+        :return: None
+        """
+        metrics.REGISTRY.reset()
+        self.addCleanup(metrics.REGISTRY.reset)
+
+    def upload(self, content, mode='replace'):
+        """
+        Upload file in given mode
+        :param content: bytes with file
+        :param mode: replace, append or upsert
+        :return: dict with result of upload
+        """
+        serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile('data.csv', content)})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save_transactions(mode)
+
+
+class TestMetrics(MetricsTestCase):
+    """Class to test recording and rendering of metrics"""
+
+    ROWS = b'2020-07-01, Expense, 18.77, Fuel\n2020-07-04, Income, 40.00, 347 Woodrow\nwrong\n'
+
+    @tag('unit')
+    def test_disabled(self):
+        """
+        test that nothing is recorded while metrics are disabled
+        :return: None
+        """
+        with override_settings(METRICS_ENABLED=False):
+            self.assertIs(metrics.timed('report_query_seconds', kind='totals'), metrics.NULL_CONTEXT)
+            metrics.inc('upload_bytes_total', 10)
+            self.upload(self.ROWS)
+            get_cached_report_data()
+        self.assertDictEqual(metrics.REGISTRY.snapshot(), {'counters': [], 'histograms': []})
+
+    @tag('unit')
+    @override_settings(METRICS_ENABLED=True)
+    def test_histogram(self):
+        """
+        test that buckets of histogram are cumulative and labels are escaped
+        :return: None
+        """
+        for value in (0.0005, 0.001, 0.3, 1000):
+            metrics.observe('report_query_seconds', value, kind='a"b')
+        text = metrics.render_metrics()
+        self.assertIn('# TYPE report_query_seconds histogram\n', text)
+        self.assertIn('report_query_seconds_bucket{kind="a\\"b",le="0.001"} 2\n', text)
+        self.assertIn('report_query_seconds_bucket{kind="a\\"b",le="0.25"} 2\n', text)
+        self.assertIn('report_query_seconds_bucket{kind="a\\"b",le="0.5"} 3\n', text)
+        self.assertIn('report_query_seconds_bucket{kind="a\\"b",le="+Inf"} 4\n', text)
+        self.assertIn('report_query_seconds_sum{kind="a\\"b"} 1000.3015\n', text)
+        self.assertIn('report_query_seconds_count{kind="a\\"b"} 4\n', text)
+
+    @tag('unit')
+    @override_settings(METRICS_ENABLED=True)
+    def test_upload_and_report(self):
+        """
+        test metrics of stages of upload, rows and reads of report
+        :return: None
+        """
+        self.upload(self.ROWS)
+        self.upload(self.ROWS, 'upsert')
+        get_cached_report_data()
+        get_cached_report_data()
+        text = metrics.render_metrics()
+        self.assertIn('uploads_total{mode="replace",result="loaded"} 1\n', text)
+        self.assertIn('uploads_total{mode="upsert",result="loaded"} 1\n', text)
+        self.assertIn('upload_rows_total{result="stored"} 2\n', text)
+        self.assertIn('upload_rows_total{result="duplicate"} 2\n', text)
+        self.assertIn('upload_rows_total{result="rejected"} 2\n', text)
+        self.assertIn(f'upload_bytes_total {2 * len(self.ROWS)}\n', text)
+        for stage, count in (('read', 2), ('parse', 2), ('insert', 2), ('lookup', 1), ('delete', 1), ('switch', 1)):
+            self.assertIn(f'upload_stage_seconds_count{{stage="{stage}"}} {count}\n', text)
+        self.assertIn('upload_rows_per_second_count 2\n', text)
+        self.assertIn('report_cache_total{result="hit"} 1\n', text)
+        self.assertIn('report_cache_total{result="miss"} 1\n', text)
+        self.assertIn('report_query_seconds_count{kind="totals"} 1\n', text)
+
+    @tag('unit')
+    @override_settings(METRICS_ENABLED=True, METRICS_FLUSH_INTERVAL=0)
+    def test_processes(self):
+        """
+        test that metrics written by other processes to METRICS_DIR are summed with metrics of current process
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            Path(directory, 'metrics-1-other.json').write_text(json.dumps({
+                'counters': [['upload_bytes_total', [], 100]],
+                'histograms': [['report_query_seconds', [['kind', 'totals']], [1] + [0] * 16, 0.0005]],
+            }))
+            Path(directory, 'metrics-2-broken.json').write_text('{')
+            metrics.inc('upload_bytes_total', 10)
+            metrics.observe('report_query_seconds', 100, kind='totals')
+            text = metrics.render_metrics()
+            self.assertTrue(Path(directory, metrics.REGISTRY.file_name).exists())
+        self.assertIn('upload_bytes_total 110\n', text)
+        self.assertIn('report_query_seconds_bucket{kind="totals",le="0.001"} 1\n', text)
+        self.assertIn('report_query_seconds_bucket{kind="totals",le="+Inf"} 2\n', text)
+        self.assertIn('report_query_seconds_sum{kind="totals"} 100.0005\n', text)
+
+    @tag('unit')
+    @override_settings(METRICS_ENABLED=True, METRICS_FLUSH_INTERVAL=0)
+    def test_threads(self):
+        """
+        test that threads which write metrics at the same time don't fail and file of process stays valid
+        :return: None
+        """
+        errors = []
+
+        def work():
+            try:
+                for _ in range(50):
+                    metrics.inc('upload_bytes_total', 1)
+                    metrics.REGISTRY.flush()
+            except Exception as error:  # pylint: disable=broad-except
+                errors.append(error)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            threads = [threading.Thread(target=work) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertListEqual(errors, [])
+            self.assertListEqual([path.name for path in Path(directory).iterdir()], [metrics.REGISTRY.file_name])
+            self.assertIn('upload_bytes_total 400\n', metrics.render_metrics())
+
+    @tag('unit')
+    @override_settings(METRICS_ENABLED=True, METRICS_FLUSH_INTERVAL=0)
+    def test_write_error(self):
+        """
+        test that metrics which can't be written to METRICS_DIR are only logged
+        :return: None
+        """
+        with tempfile.NamedTemporaryFile() as file, override_settings(METRICS_DIR=file.name):
+            with self.assertLogs('app.api.metrics', 'ERROR') as logs:
+                metrics.inc('upload_bytes_total', 10)
+                text = metrics.render_metrics()
+        self.assertTrue(logs.records)
+        self.assertIn('upload_bytes_total 10\n', text)
+
+
+class TestMetricsView(MetricsTestCase):
+    """Class to test endpoint /metrics"""
+
+    @tag('unit')
+    def test_disabled(self):
+        """
+        test that endpoint isn't found while metrics are disabled
+        :return: None
+        """
+        with override_settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @tag('unit')
+    @override_settings(METRICS_ENABLED=True)
+    def test_enabled(self):
+        """
+        test that endpoint returns metrics in Prometheus text format, time of receiving of file is recorded by view
+        :return: None
+        """
+        self.client.post('/transactions', {'data': SimpleUploadedFile('data.csv', b'2020-07-01, Expense, 1.00, A')})
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn(b'upload_stage_seconds_count{stage="receive"} 1\n', response.content)
+        self.assertIn(b'# TYPE uploads_total counter\n', response.content)
@@ -0,0 +1,107 @@
+"""File to test models"""
+from datetime import datetime
+from decimal import Decimal
+
+from django.test import TestCase, tag
+
+from app.models import Dataset, Generation, Transaction
+
+
+class TestGenerationTotals(TestCase):
+    """Class to test that running totals of generation follow changes of transactions"""
+
+    def assertTotals(self, incomes, expenses):
+        """
+        check that stored totals of current generation are equal to expected and to full recount
+        :param incomes: expected sum of incomes
+        :param expenses: expected sum of expenses
+        :return: None
+        """
+        generation = Generation.objects.get(pk=Dataset.get_current_generation_id())
+        self.assertEqual(generation.incomes, Decimal(incomes))
+        self.assertEqual(generation.expenses, Decimal(expenses))
+        self.assertDictEqual(generation.calculate(), {'incomes': Decimal(incomes), 'expenses': Decimal(expenses)})
+
+    @tag('unit')
+    def test_create_and_delete(self):
+        """
+        test single object operations
+        :return: None
+        """
+        income = Transaction.objects.create(date=datetime.now(), type='i', value=Decimal('12.34'),
+                                            job_address='test address')
+        Transaction.objects.create(date=datetime.now(), type='e', value=Decimal('1.11'),
+                                   expense_category='test category')
+        self.assertTotals('12.34', '1.11')
+        income.value = Decimal('10.00')
+        income.save()
+        self.assertTotals('10.00', '1.11')
+        income.type = 'e'
+        income.save()
+        self.assertTotals('0', '11.11')
+        income.delete()
+        self.assertTotals('0', '1.11')
+
+    @tag('unit')
+    def test_bulk_create_and_delete(self):
+        """
+        test bulk operations
+        :return: None
+        """
+        Transaction.objects.bulk_create([
+            Transaction(date=datetime.now(), type='e', value=Decimal('12.34'), expense_category='fuel'),
+            Transaction(date=datetime.now(), type='e', value=Decimal('23.45'), expense_category='food'),
+            Transaction(date=datetime.now(), type='i', value=Decimal('34.56'), job_address='test address'),
+        ])
+        self.assertTotals('34.56', '35.79')
+        Transaction.objects.filter(expense_category='fuel').delete()
+        self.assertTotals('34.56', '23.45')
+        Transaction.objects.all().delete()
+        self.assertTotals('0', '0')
+
+
+class TestDatasetSwitch(TestCase):
+    """Class to test switching of readers between generations"""
+
+    @tag('unit')
+    def test_switch_and_collect(self):
+        """
+        test that readers see only current generation and retired one is removed by garbage collection
+        :return: None
+        """
+        Transaction.objects.create(date=datetime.now(), type='i', value=Decimal('12.34'), job_address='address')
+        old_generation_id = Dataset.get_current_generation_id()
+        generation = Generation.objects.create()
+        Transaction.all_objects.bulk_create([
+            Transaction(generation=generation, date=datetime.now(), type='e', value=Decimal('1.00')),
+            Transaction(generation=generation, date=datetime.now(), type='e', value=Decimal('2.00')),
+        ])
+        self.assertEqual(Transaction.objects.count(), 1)
+        Dataset.switch(generation)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertTrue(Generation.objects.get(pk=old_generation_id).retired)
+        self.assertEqual(Generation.collect_retired(chunk_size=1), 1)
+        self.assertFalse(Generation.objects.filter(pk=old_generation_id).exists())
+        self.assertEqual(Transaction.all_objects.count(), 2)
+        self.assertEqual(Generation.objects.get(pk=generation.pk).expenses, Decimal('3.00'))
+
+    @tag('unit')
+    def test_switch_of_tenant(self):
+        """
+        test that switch of tenant's dataset retires only its own previous generation
+        :return: None
+        """
+        shared_generation_id = Dataset.get_current_generation_id(create=True)
+        old_generation_id = Dataset.get_current_generation_id('tenant', create=True)
+        self.assertNotEqual(old_generation_id, shared_generation_id)
+        generation = Generation.objects.create(dataset=Dataset.lock('tenant'))
+        Transaction.all_objects.bulk_create([
+            Transaction(generation=generation, date=datetime.now(), type='e', value=Decimal('1.00')),
+        ])
+        Dataset.switch(generation)
+        self.assertEqual(Dataset.get_current_generation_id('tenant'), generation.pk)
+        self.assertEqual(Dataset.get_current_generation_id(), shared_generation_id)
+        self.assertTrue(Generation.objects.get(pk=old_generation_id).retired)
+        self.assertFalse(Generation.objects.get(pk=shared_generation_id).retired)
+        self.assertEqual(Transaction.objects.for_tenant('tenant').count(), 1)
+        self.assertEqual(Transaction.objects.count(), 0)
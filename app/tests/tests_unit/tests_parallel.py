@@ -0,0 +1,81 @@
+"""File to test parallel parsing of big files"""
+import tempfile
+from pathlib import Path
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.test import TestCase, override_settings, tag
+
+from app.api.files import split_file
+from app.api.parallel import iter_parallel_transaction_columns
+from app.api.serializers import TransactionFileSerializer
+from app.api.utils import REJECT_REASONS, iter_batches, parse_transaction_rows
+from app.bench.data import iter_rows
+from app.models import Transaction
+
+
+class TestParallelParsing(TestCase):
+    """Class to test that parallel parsing gives the same result as serial one"""
+
+    def setUp(self):
+        """
+        Create file with valid and invalid rows and different line endings
+        :return: None
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name, 'transactions.csv')
+        rows = list(iter_rows(500, invalid_ratio=0.2, seed=1))
+        content = b''.join(row + (b'\r\n' if index % 3 else b'\n') for index, row in enumerate(rows))
+        self.path.write_bytes(content + b'2020-07-01, Expense, 18.77, Fuel')
+
+    @tag('unit')
+    def test_split_file(self):
+        """
+        test that ranges cover the whole file and end at the end of line
+        :return: None
+        """
+        content = self.path.read_bytes()
+        ranges = split_file(self.path, 100)
+        self.assertGreater(len(ranges), 1)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(content))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(content[end - 1:end], b'\n')
+
+    @tag('unit')
+    def test_same_result_as_serial(self):
+        """
+        test that rows are parsed, skipped and ordered like in serial parsing
+        :return: None
+        """
+        with open(self.path, 'rb') as file:
+            serial = [parse_transaction_rows(rows) for rows in iter_batches(file, 1000)]
+        parallel = list(iter_parallel_transaction_columns(str(self.path), 2, 1000))
+        self.assertGreater(len(parallel), 1)
+        for field in ('date', 'type', 'value', 'expense_category', 'job_address'):
+            self.assertListEqual([value for columns in parallel for value in getattr(columns, field)],
+                                 [value for columns in serial for value in getattr(columns, field)])
+        self.assertEqual(sum(columns.skipped for columns in parallel), sum(columns.skipped for columns in serial))
+        for reason in REJECT_REASONS:
+            self.assertEqual(sum(columns.rejected.reasons[reason] for columns in parallel),
+                             sum(columns.rejected.reasons[reason] for columns in serial))
+
+    @tag('unit')
+    @override_settings(TRANSACTIONS_PARALLEL_THRESHOLD=0, TRANSACTIONS_PARALLEL_WORKERS=2,
+                       TRANSACTIONS_PARALLEL_CHUNK_SIZE=1000)
+    def test_serializer_uses_parallel_parsing(self):
+        """
+        test that file stored on disk is loaded with the same count of rows
+        :return: None
+        """
+        with open(self.path, 'rb') as file:
+            expected = sum(len(parse_transaction_rows(rows)) for rows in iter_batches(file, 1000))
+        uploaded_file = TemporaryUploadedFile('transactions.csv', 'text/csv', self.path.stat().st_size, None)
+        uploaded_file.write(self.path.read_bytes())
+        uploaded_file.seek(0)
+        self.addCleanup(uploaded_file.close)
+        serializer = TransactionFileSerializer(data={'data': uploaded_file})
+        serializer.is_valid(raise_exception=True)
+        self.assertEqual(serializer.create_transactions(), expected)
+        self.assertEqual(Transaction.objects.count(), expected)
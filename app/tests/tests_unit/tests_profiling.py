@@ -0,0 +1,144 @@
+"""File to test profiling of requests"""
+import asyncio
+import json
+import pstats
+import tempfile
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings, tag
+
+from app.models import Transaction
+from app.profiling import ProfilingMiddleware
+
+
+class TestProfilingMiddleware(TestCase):
+    """Class to test middleware which profiles requests on demand"""
+
+    def setUp(self):
+        """
+        Save profiles to temporary directory
+        :return: None
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(PROFILING_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, **kwargs):
+        """
+        Upload file with one row
+        :param kwargs: additional arguments of test client, f.e. headers
+        :return: response
+        """
+        data = {'data': SimpleUploadedFile('data.csv', b'2020-07-01, Expense, 1.00, A')}
+        return self.client.post('/transactions', data, **kwargs)
+
+    @tag('unit')
+    def test_not_triggered(self):
+        """
+        test that request without header and query parameter isn't profiled
+        :return: None
+        """
+        with override_settings(PROFILING_ALLOWED=True):
+            response = self.upload()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertListEqual(list(self.directory.iterdir()), [])
+
+    @tag('unit')
+    def test_not_allowed(self):
+        """
+        test that request of anonymous user isn't profiled if profiling isn't allowed by setting
+        :return: None
+        """
+        with override_settings(PROFILING_ALLOWED=False):
+            response = self.upload(HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertListEqual(list(self.directory.iterdir()), [])
+
+    @tag('unit')
+    def test_profile(self):
+        """
+        test that profile and SQL log of triggered request are saved
+        :return: None
+        """
+        with override_settings(PROFILING_ALLOWED=True):
+            response = self.upload(HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        name = response['X-Profile-Id']
+        self.assertIn('-post-transactions-', name)
+        stats = pstats.Stats(str(self.directory / f'{name}.prof'))
+        self.assertTrue(any(function == 'parse_transaction_rows' for _, _, function in stats.stats))
+        log = json.loads((self.directory / f'{name}.sql.json').read_text(encoding='utf-8'))
+        self.assertEqual(log['path'], '/transactions')
+        self.assertEqual(log['status'], 200)
+        self.assertEqual(log['count'], len(log['queries']))
+        self.assertTrue(any('INSERT INTO "app_transaction"' in query['sql'] for query in log['queries']))
+
+    @tag('unit')
+    def test_staff(self):
+        """
+        test that request of staff user triggered by query parameter is profiled without setting
+        :return: None
+        """
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        with override_settings(PROFILING_ALLOWED=False):
+            response = self.client.get('/report', {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue((self.directory / f"{response['X-Profile-Id']}.sql.json").exists())
+
+    @tag('unit')
+    @override_settings(PROFILING_ALLOWED=True)
+    def test_async(self):
+        """
+        test that middleware in async chain awaits view and profiles it
+        :return: None
+        """
+        async def view(request):  # pylint: disable=unused-argument
+            return HttpResponse('ok')
+
+        middleware = ProfilingMiddleware(view)
+        response = async_to_sync(middleware)(RequestFactory().get('/report', HTTP_X_PROFILE='true'))
+        self.assertEqual(response.content, b'ok')
+        self.assertTrue((self.directory / f"{response['X-Profile-Id']}.prof").exists())
+        response = async_to_sync(middleware)(RequestFactory().get('/report'))
+        self.assertNotIn('X-Profile-Id', response)
+
+    @tag('unit')
+    @override_settings(PROFILING_ALLOWED=True)
+    def test_concurrent(self):
+        """
+        test that request which comes while other one is profiled is served without profiling
+        :return: None
+        """
+        started, resume = asyncio.Event(), asyncio.Event()
+
+        async def view(request):
+            if 'first' in request.GET:
+                started.set()
+                await resume.wait()
+            return HttpResponse('ok')
+
+        async def run():
+            middleware = ProfilingMiddleware(view)
+            first = asyncio.ensure_future(middleware(RequestFactory().get('/report?first=1', HTTP_X_PROFILE='1')))
+            await started.wait()
+            with self.assertLogs('app.profiling', 'WARNING'):
+                second = await middleware(RequestFactory().get('/report', HTTP_X_PROFILE='1'))
+            resume.set()
+            return await first, second
+
+        first, second = async_to_sync(run)()
+        self.assertTrue((self.directory / f"{first['X-Profile-Id']}.prof").exists())
+        self.assertEqual(second.content, b'ok')
+        self.assertNotIn('X-Profile-Id', second)
+        response = self.upload(HTTP_X_PROFILE='1')
+        self.assertIn('X-Profile-Id', response)
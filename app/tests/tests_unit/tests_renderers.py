@@ -0,0 +1,73 @@
+"""File to test fast JSON renderer"""
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, tag
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+
+from app.api import renderers
+from app.api.renderers import FastJSONRenderer
+
+PAYLOADS = (
+    {'gross-revenue': Decimal('225.00'), 'expenses': Decimal('72.93'), 'net-revenue': Decimal('152.07')},
+    {'gross-revenue': Decimal('0'), 'expenses': Decimal('-0.50'), 'net-revenue': Decimal('12345678.90')},
+    [{'period': date(2020, 7, 1), 'gross-revenue': Decimal('0.10')}],
+    {'id': uuid.UUID(int=1), 'created_at': datetime(2020, 7, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+     'started_at': datetime(2020, 7, 1, 12, 30), 'throughput': 12.5, 'error': '', 'finished_at': None},
+    {'data': [ErrorDetail('The submitted file is empty.', code='empty')]},
+    {'text': 'Straße \u2028 \u2029 "quoted" \\ \n', 'count': 10, 'flag': True, 'delay': timedelta(seconds=1)},
+    [],
+)
+
+
+class TestFastJSONRenderer(TestCase):
+    """Class to test that fast renderer returns the same bytes as DRF renderer"""
+
+    def assert_same_output(self):
+        """
+        check all payloads with current encoder
+        :return: None
+        """
+        for data in PAYLOADS:
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    @tag('unit')
+    def test_same_output(self):
+        """
+        test output of default encoder (orjson if it's installed)
+        :return: None
+        """
+        self.assert_same_output()
+
+    @tag('unit')
+    def test_same_output_without_orjson(self):
+        """
+        test output of json module
+        :return: None
+        """
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assert_same_output()
+
+    @tag('unit')
+    def test_indent(self):
+        """
+        test that indented output is the same as DRF renders
+        :return: None
+        """
+        data = PAYLOADS[0]
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=4'),
+                         JSONRenderer().render(data, 'application/json; indent=4'))
+
+    @tag('unit')
+    def test_iter_render(self):
+        """
+        test that list rendered by chunks is the same as rendered at once
+        :return: None
+        """
+        renderer = FastJSONRenderer()
+        for count in (0, 1, 2, 3, 7):
+            items = [{'period': date(2020, 7, day + 1), 'value': Decimal(day)} for day in range(count)]
+            self.assertEqual(b''.join(renderer.iter_render(iter(items), chunk_size=2)), JSONRenderer().render(items))
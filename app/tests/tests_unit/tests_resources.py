@@ -2,6 +2,7 @@
 from pathlib import Path
 
 from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase, tag
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIRequestFactory
@@ -26,7 +27,8 @@ class TestTransactionsView(TestCase):
                                                                            content_type='multipart/form-data')})
             response = TransactionView.as_view()(request)
             self.assertEqual(response.status_code, 200)
-            self.assertDictEqual(response.data, {'count': 10})
+            self.assertEqual(response.data['count'], 10)
+            self.assertEqual(response.data['rejected']['count'], 3)
             self.assertEqual(Transaction.objects.all().count(), 10)
 
     @tag('unit')
@@ -42,7 +44,8 @@ class TestTransactionsView(TestCase):
                                                                            content_type='multipart/form-data')})
             response = TransactionView.as_view()(request)
             self.assertEqual(response.status_code, 200)
-            self.assertDictEqual(response.data, {'count': 0})
+            self.assertEqual(response.data['count'], 0)
+            self.assertEqual(response.data['rejected']['reasons']['columns'], 1)
             self.assertEqual(Transaction.objects.all().count(), 0)
 
     @tag('unit')
@@ -73,6 +76,13 @@ class TestTransactionsView(TestCase):
 class TestReportView(TestCase):
     """Class to test report view"""
 
+    def setUp(self):
+        """
+        Drop reports cached by previous tests
+        :return: None
+        """
+        cache.clear()
+
     @tag('unit')
     def test_get(self):
         """
@@ -87,3 +97,15 @@ class TestReportView(TestCase):
             "expenses": 0,
             "net-revenue": 0,
         })
+
+    @tag('unit')
+    def test_get_cached(self):
+        """
+        test that the second request reads report from cache
+        :return: None
+        """
+        ReportView.as_view()(APIRequestFactory().get('/report'))
+        with self.assertNumQueries(0):
+            response = ReportView.as_view()(APIRequestFactory().get('/report'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
@@ -0,0 +1,94 @@
+"""File to test rollups of transactions"""
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase, tag
+
+from app.api.loaders import load_transactions
+from app.api.rollups import RollupAccumulator, get_period_start, rebuild_rollups, split_range
+from app.api.utils import parse_transaction_rows
+from app.models import Generation, Rollup
+
+ROWS = [b'2020-07-01, Expense, 18.77, Fuel\n', b'2020-07-04, Income, 40.00, 347 Woodrow\n',
+        b'2020-07-06, Income, 35.00, 219 Pleasant\n', b'2020-07-06, Expense, 2.23, Fuel\n',
+        b'2020-08-01, Expense, 10.00, Repairs\n']
+
+
+class TestPeriods(TestCase):
+    """Class to test functions which work with periods"""
+
+    @tag('unit')
+    def test_period_start(self):
+        """
+        test the first days of periods, weeks start on Monday
+        :return: None
+        """
+        day = date(2020, 7, 16)
+        self.assertEqual(get_period_start(day, 'day'), day)
+        self.assertEqual(get_period_start(day, 'week'), date(2020, 7, 13))
+        self.assertEqual(get_period_start(day, 'month'), date(2020, 7, 1))
+
+    @tag('unit')
+    def test_split_aligned_range(self):
+        """
+        test that range which consists of whole periods is read only from rollups of its granularity
+        :return: None
+        """
+        self.assertListEqual(split_range('month', date(2020, 1, 1), date(2020, 12, 31)),
+                             [('month', date(2020, 1, 1), date(2020, 12, 31))])
+        self.assertListEqual(split_range('week', None, None), [('week', None, None)])
+
+    @tag('unit')
+    def test_split_unaligned_range(self):
+        """
+        test that edges of range which don't cover whole periods are read from daily rollups
+        :return: None
+        """
+        self.assertListEqual(split_range('month', date(2020, 1, 15), date(2020, 3, 10)), [
+            ('day', date(2020, 1, 15), date(2020, 1, 31)),
+            ('day', date(2020, 3, 1), date(2020, 3, 10)),
+            ('month', date(2020, 2, 1), date(2020, 2, 29)),
+        ])
+        self.assertListEqual(split_range('month', date(2020, 1, 15), date(2020, 1, 20)),
+                             [('day', date(2020, 1, 15), date(2020, 1, 20))])
+        self.assertListEqual(split_range('week', None, date(2020, 7, 15)), [
+            ('day', date(2020, 7, 13), date(2020, 7, 15)),
+            ('week', None, date(2020, 7, 12)),
+        ])
+
+
+class TestRollupAccumulator(TestCase):
+    """Class to test counting of rollups"""
+
+    @tag('unit')
+    def test_rollups(self):
+        """
+        test that rows are summed by each granularity, category of incomes is empty
+        :return: None
+        """
+        accumulator = RollupAccumulator()
+        accumulator.add(parse_transaction_rows(ROWS))
+        rollups = accumulator.get_rollups()
+        self.assertListEqual(rollups[('month', date(2020, 7, 1), 'e', 'Fuel')], [2100, 2])
+        self.assertListEqual(rollups[('month', date(2020, 7, 1), 'i', '')], [7500, 2])
+        self.assertListEqual(rollups[('week', date(2020, 6, 29), 'i', '')], [4000, 1])
+        self.assertListEqual(rollups[('day', date(2020, 8, 1), 'e', 'Repairs')], [1000, 1])
+        self.assertEqual(len(rollups), 13)
+
+    @tag('unit')
+    def test_rebuild_is_the_same(self):
+        """
+        test that rollups counted from stored transactions are the same as counted during upload
+        :return: None
+        """
+        generation = Generation.objects.create()
+        columns = parse_transaction_rows(ROWS)
+        accumulator = RollupAccumulator()
+        accumulator.add(columns)
+        accumulator.save(generation.pk)
+        fields = ('granularity', 'period', 'type', 'category', 'value', 'count')
+        expected = set(Rollup.objects.filter(generation=generation).values_list(*fields))
+        self.assertIn(('month', date(2020, 7, 1), 'e', 'Fuel', Decimal('21.00'), 2), expected)
+        load_transactions(generation.pk, columns)
+        rebuild_rollups(generation.pk)
+        self.assertSetEqual(set(Rollup.objects.filter(generation=generation).values_list(*fields)), expected)
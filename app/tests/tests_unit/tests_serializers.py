@@ -1,13 +1,25 @@
 """Test serialization process"""
+from datetime import date
+from decimal import Decimal
 from pathlib import Path
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
-from django.test import TestCase, tag
+from django.test import TestCase, override_settings, tag
 from rest_framework.exceptions import ValidationError
 
+from app.api.rollups import rebuild_rollups
 from app.api.serializers import TransactionFileSerializer
-from app.models import Transaction
+from app.models import Dataset, Generation, Rollup, Transaction
+
+
+def count_columns_rows(serializer):
+    """
+    count valid rows of uploaded file in columns which upload loads to database
+    :param serializer: validated TransactionFileSerializer object
+    :return: int
+    """
+    return sum(len(columns) for columns in serializer.iter_transaction_columns())
 
 
 class TestTransactionFileSerializer(TestCase):
@@ -23,7 +35,7 @@ class TestTransactionFileSerializer(TestCase):
         with open(path, 'rb') as file:
             serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile(file.name, file.read())})
             serializer.is_valid(raise_exception=True)
-            self.assertEqual(len(serializer.transactions), 10)
+            self.assertEqual(count_columns_rows(serializer), 10)
 
     @tag('unit')
     def test_correct_data_1_rows(self):
@@ -35,7 +47,11 @@ class TestTransactionFileSerializer(TestCase):
         with open(path, 'rb') as file:
             serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile(file.name, file.read())})
             serializer.is_valid(raise_exception=True)
-            self.assertEqual(len(serializer.transactions), 1)
+            columns = list(serializer.iter_transaction_columns())
+            self.assertEqual(sum(len(batch) for batch in columns), 1)
+            self.assertEqual((columns[0].date[0], columns[0].type[0], columns[0].value[0],
+                              columns[0].expense_category[0], columns[0].job_address[0]),
+                             (date(2020, 7, 1), 'e', 1877, 'Fuel', None))
 
     @tag('unit')
     def test_correct_data_0_rows(self):
@@ -47,7 +63,7 @@ class TestTransactionFileSerializer(TestCase):
         with open(path, 'rb') as file:
             serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile(file.name, file.read())})
             serializer.is_valid(raise_exception=True)
-            self.assertEqual(len(serializer.transactions), 0)
+            self.assertEqual(count_columns_rows(serializer), 0)
 
     @tag('unit')
     def test_emptyfile(self):
@@ -128,3 +144,173 @@ class TestCreateTransactions(TestCase):
             serializer.create_transactions()
             serializer.create_transactions()
             self.assertEqual(Transaction.objects.all().count(), 10)
+
+    @tag('unit')
+    @override_settings(TRANSACTIONS_BATCH_SIZE=3)
+    def test_create_objects_by_batches(self):
+        """
+        test file with more rows than size of one batch
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        with open(path, 'rb') as file:
+            serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile(file.name, file.read())})
+            serializer.is_valid(raise_exception=True)
+            self.assertEqual(serializer.create_transactions(), 10)
+            self.assertEqual(Transaction.objects.all().count(), 10)
+        # line of rejected row is counted from the start of file, not from the start of its batch
+        self.assertListEqual(serializer.rejected.to_dict()['sample'],
+                             [{'line': 4, 'reason': 'columns', 'row': '# new spark plugs I think'}])
+
+    @tag('unit')
+    def test_info_not_fitting_column(self):
+        """
+        test that rows with additional info which database can't store are rejected and other rows are stored
+        :return: None
+        """
+        content = (b'2020-07-01, Expense, 18.77, ' + b'F' * 101 + b'\n'
+                   b'2020-07-02, Expense, 1.00, Fu\x00el\n'
+                   b'2020-07-03, Expense, 2.00, ' + b'F' * 100 + b'\n')
+        serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile('data.csv', content)})
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save_transactions()
+        self.assertEqual(result['count'], 1)
+        self.assertEqual(result['rejected']['reasons']['info'], 2)
+        self.assertEqual(Transaction.objects.get().expense_category, 'F' * 100)
+
+    @tag('unit')
+    def test_empty_data_keeps_old_transactions(self):
+        """
+        test that file without valid rows doesn't remove stored transactions
+        :return: None
+        """
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_10_correct.csv')
+        with open(path, 'rb') as file:
+            serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile(file.name, file.read())})
+            serializer.is_valid(raise_exception=True)
+            serializer.create_transactions()
+        path = Path(settings.BASE_DIR, 'app', 'tests', 'test_files', 'test_data_correct_empty.csv')
+        with open(path, 'rb') as file:
+            serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile(file.name, file.read())})
+            serializer.is_valid(raise_exception=True)
+            self.assertEqual(serializer.create_transactions(), 0)
+            self.assertEqual(Transaction.objects.all().count(), 10)
+
+
+class TestIncrementalUpload(TestCase):
+    """Class to test upload of file in append and upsert modes"""
+
+    ROWS = (b'2020-07-01, Expense, 18.77, Fuel\n'
+            b'2020-07-04, Income, 40.00, 347 Woodrow\n'
+            b'2020-07-06, Income, 35.00, 219 Pleasant\n')
+
+    def save(self, content, mode):
+        """
+        upload content in given mode
+        :param content: bytes with file
+        :param mode: replace, append or upsert
+        :return: dict with result of upload without summary of rejected rows, files of tests don't have them
+        """
+        serializer = TransactionFileSerializer(data={'data': SimpleUploadedFile('data.csv', content)})
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save_transactions(mode)
+        self.assertEqual(result.pop('rejected')['count'], 0)
+        return result
+
+    def assert_consistent(self):
+        """
+        check that totals and rollups of current generation are the same as counted from its transactions
+        :return: None
+        """
+        generation = Generation.objects.get(pk=Dataset.get_current_generation_id())
+        self.assertDictEqual({'incomes': generation.incomes, 'expenses': generation.expenses},
+                             generation.calculate())
+        rollups = set(Rollup.objects.filter(generation=generation).values_list(
+            'granularity', 'period', 'type', 'category', 'value', 'count'))
+        rebuild_rollups(generation.pk)
+        self.assertSetEqual(rollups, set(Rollup.objects.filter(generation=generation).values_list(
+            'granularity', 'period', 'type', 'category', 'value', 'count')))
+
+    @tag('unit')
+    def test_append_without_dataset(self):
+        """
+        test that the first file is loaded like in replace mode
+        :return: None
+        """
+        self.assertDictEqual(self.save(self.ROWS, 'append'), {'count': 3, 'duplicates': 0, 'removed': 0})
+        self.assertEqual(Transaction.objects.count(), 3)
+
+    @tag('unit')
+    @override_settings(TRANSACTIONS_BATCH_SIZE=2)
+    def test_append_new_rows(self):
+        """
+        test that only new rows are inserted to the same generation and file sent again changes nothing
+        :return: None
+        """
+        self.save(self.ROWS, 'replace')
+        generation_id = Dataset.get_current_generation_id()
+        content = self.ROWS + b'2020-08-01, Expense, 5.00, Parking\n2020-08-01, Expense, 5.00, Parking\n'
+        self.assertDictEqual(self.save(content, 'append'), {'count': 2, 'duplicates': 3, 'removed': 0})
+        self.assertDictEqual(self.save(content, 'append'), {'count': 0, 'duplicates': 5, 'removed': 0})
+        self.assertEqual(Dataset.get_current_generation_id(), generation_id)
+        self.assertEqual(Transaction.objects.count(), 5)
+        self.assert_consistent()
+
+    @tag('unit')
+    def test_append_finds_rows_saved_by_orm(self):
+        """
+        test that fingerprint counted by parser is the same as fingerprint of object saved by ORM
+        :return: None
+        """
+        Transaction(date=date(2020, 7, 1), type='e', value=Decimal('18.77'), expense_category='Fuel').save()
+        self.assertDictEqual(self.save(b'2020-7-1, Expense, 18.770, Fuel', 'append'),
+                             {'count': 0, 'duplicates': 1, 'removed': 0})
+
+    @tag('unit')
+    def test_upsert(self):
+        """
+        test that upsert removes rows of covered dates which file doesn't contain and keeps other rows
+        :return: None
+        """
+        self.save(self.ROWS + b'2020-06-30, Income, 1.00, Main St.\n2020-07-10, Income, 2.00, Main St.\n', 'replace')
+        content = (b'2020-07-01, Expense, 18.77, Fuel\n'
+                   b'2020-07-04, Income, 45.00, 347 Woodrow\n'
+                   b'2020-07-06, Income, 35.00, 219 Pleasant\n')
+        self.assertDictEqual(self.save(content, 'upsert'), {'count': 1, 'duplicates': 2, 'removed': 1})
+        self.assertListEqual(list(Transaction.objects.order_by('date').values_list('date', 'value')), [
+            (date(2020, 6, 30), Decimal('1.00')),
+            (date(2020, 7, 1), Decimal('18.77')),
+            (date(2020, 7, 4), Decimal('45.00')),
+            (date(2020, 7, 6), Decimal('35.00')),
+            (date(2020, 7, 10), Decimal('2.00')),
+        ])
+        self.assert_consistent()
+
+    @tag('unit')
+    @override_settings(TRANSACTIONS_BATCH_SIZE=2)
+    def test_upsert_by_chunks(self):
+        """
+        test that stale rows are removed by several chunks, all stored copies of row found in file and rows
+        out of range of dates of file are kept
+        :return: None
+        """
+        stale = b''.join(f'2020-07-0{day}, Income, 1.00, Main St.\n'.encode() for day in range(2, 8))
+        self.save(self.ROWS + b'2020-07-04, Income, 40.00, 347 Woodrow\n' + stale, 'replace')
+        self.assertDictEqual(self.save(self.ROWS, 'upsert'), {'count': 0, 'duplicates': 3, 'removed': 5})
+        self.assertEqual(Transaction.objects.filter(value=Decimal('40.00')).count(), 2)
+        self.assertEqual(Transaction.objects.count(), 5)
+        self.assert_consistent()
+        self.assertDictEqual(self.save(b'2020-07-05, Income, 1.00, Main St.\n', 'upsert'),
+                             {'count': 1, 'duplicates': 0, 'removed': 0})
+
+    @tag('unit')
+    def test_upsert_removes_empty_rollups(self):
+        """
+        test that rollups of category without rows are removed
+        :return: None
+        """
+        self.save(self.ROWS, 'replace')
+        self.save(b'2020-07-01, Expense, 18.77, Repairs\n2020-07-06, Income, 35.00, 219 Pleasant\n', 'upsert')
+        self.assertFalse(Rollup.objects.filter(category='Fuel').exists())
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assert_consistent()
@@ -0,0 +1,86 @@
+"""File to test keyset pagination and export of transactions"""
+from datetime import date
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, tag
+from django.test.utils import CaptureQueriesContext
+
+from app.api.transactions import (InvalidCursor, decode_cursor, encode_cursor, get_transactions_page,
+                                  iter_transactions_csv)
+from app.models import Transaction
+
+
+class TestTransactions(TestCase):
+    """Class to test functions of transactions module"""
+
+    def setUp(self):
+        """Create transactions with the same date to check order by id"""
+        Transaction.objects.bulk_create([
+            Transaction(date=date(2020, 1, 2), type='e', value=Decimal('1.50'), expense_category='fuel'),
+            Transaction(date=date(2020, 1, 1), type='i', value=Decimal('10.00'), job_address='address'),
+            Transaction(date=date(2020, 1, 2), type='i', value=Decimal('2.25'), job_address='address'),
+        ])
+
+    @tag('unit')
+    def test_cursor(self):
+        """
+        test that cursor is decoded to the same values and broken cursors are rejected
+        :return: None
+        """
+        cursor = encode_cursor(12, date(2020, 7, 1), 345)
+        self.assertNotIn('=', cursor)
+        self.assertTupleEqual(decode_cursor(cursor), (12, date(2020, 7, 1), 345))
+        for cursor in ('', 'abc', '!!!', encode_cursor(1, date(2020, 1, 1), 1)[:-2]):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    @tag('unit')
+    def test_pages(self):
+        """
+        test that pages are ordered by date and id
+        :return: None
+        """
+        rows, cursor = get_transactions_page(2)
+        self.assertListEqual([(row['date'], row['type'], row['value']) for row in rows], [
+            (date(2020, 1, 1), 'Income', Decimal('10.00')),
+            (date(2020, 1, 2), 'Expense', Decimal('1.50')),
+        ])
+        rows, cursor = get_transactions_page(2, cursor)
+        self.assertListEqual([row['value'] for row in rows], [Decimal('2.25')])
+        self.assertIsNone(cursor)
+
+    @tag('unit')
+    def test_export(self):
+        """
+        test that all chunks together contain header and all rows
+        :return: None
+        """
+        self.assertEqual(''.join(iter_transactions_csv(2)), 'date,type,value,additional_info\n'
+                                                            '2020-01-01,Income,10.00,address\n'
+                                                            '2020-01-02,Expense,1.50,fuel\n'
+                                                            '2020-01-02,Income,2.25,address\n')
+
+    @tag('unit')
+    @skipUnless(connection.vendor == 'sqlite', "Plan of query depends on database")
+    def test_page_uses_index(self):
+        """
+        test that page is found by seek in index without sorting of rows
+        :return: None
+        """
+        _, cursor = get_transactions_page(1)
+        with CaptureQueriesContext(connection) as queries:
+            get_transactions_page(1, cursor)
+        sql = next(query['sql'] for query in queries if 'app_transaction' in query['sql'])
+        plan = connection.ops.explain_query_prefix() + ' ' + sql
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(plan)
+            plan = ' '.join(str(column) for row in db_cursor.fetchall() for column in row)
+        self.assertIn('transaction_gen_date_id (generation_id=? AND date>?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertNotIn('SCAN app_transaction', plan)
+
+    def tearDown(self):
+        """To clean up database between tests"""
+        Transaction.objects.all().delete()
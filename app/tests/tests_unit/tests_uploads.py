@@ -0,0 +1,86 @@
+"""File to test digests of uploaded files"""
+import hashlib
+from datetime import date
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings, tag
+
+from app.api.uploads import find_upload_result, get_upload_digest, remember_upload_result
+from app.models import Transaction, UploadDigest
+
+
+class TestDigestUploadHandler(TestCase):
+    """Class to test hashing of files while request is parsed"""
+
+    @tag('unit')
+    def test_digest(self):
+        """
+        test that digest is counted for each file and file is still available
+        :return: None
+        """
+        content = b'2020-07-01, Expense, 18.77, Fuel\n' * 10000
+        request = RequestFactory().post('/transactions', {'data': SimpleUploadedFile('data.csv', content),
+                                                          'other': SimpleUploadedFile('other.csv', b'')})
+        self.assertEqual(request.FILES['data'].read(), content)
+        self.assertEqual(get_upload_digest(request), hashlib.sha256(content).hexdigest())
+        self.assertEqual(get_upload_digest(request, 'other'), hashlib.sha256(b'').hexdigest())
+
+    @tag('unit')
+    def test_request_without_files(self):
+        """
+        test that request without files has no digest
+        :return: None
+        """
+        request = RequestFactory().post('/transactions', {'data': 'some_string'})
+        self.assertEqual(request.POST['data'], 'some_string')
+        self.assertIsNone(get_upload_digest(request))
+
+
+class TestUploadResults(TestCase):
+    """Class to test table of results of uploads"""
+
+    def setUp(self):
+        """
+        Create current generation
+        :return: None
+        """
+        self.transaction = Transaction.objects.create(date=date(2020, 7, 1), type='i', value='10.00',
+                                                      job_address='Main St.')
+
+    @tag('unit')
+    def test_result_of_unchanged_dataset(self):
+        """
+        test that result is found only for the same digest and mode until dataset is changed
+        :return: None
+        """
+        remember_upload_result('a' * 64, 'replace', {'count': 1})
+        self.assertDictEqual(find_upload_result('a' * 64, 'replace'), {'count': 1})
+        self.assertIsNone(find_upload_result('a' * 64, 'append'))
+        self.assertIsNone(find_upload_result('b' * 64, 'replace'))
+        self.transaction.value = '20.00'
+        self.transaction.save()
+        self.assertIsNone(find_upload_result('a' * 64, 'replace'))
+
+    @tag('unit')
+    @override_settings(UPLOAD_DIGESTS_MAX_SIZE=2)
+    def test_eviction(self):
+        """
+        test that only the newest results are kept
+        :return: None
+        """
+        for digest in ('a', 'b', 'a', 'c'):
+            remember_upload_result(digest * 64, 'replace', {'count': digest})
+        self.assertListEqual(list(UploadDigest.objects.order_by('pk').values_list('digest', flat=True)),
+                             ['a' * 64, 'c' * 64])
+        self.assertIsNone(find_upload_result('b' * 64, 'replace'))
+
+    @tag('unit')
+    @override_settings(UPLOAD_DIGESTS_MAX_SIZE=0)
+    def test_disabled(self):
+        """
+        test that nothing is stored if table size is 0
+        :return: None
+        """
+        remember_upload_result('a' * 64, 'replace', {'count': 1})
+        self.assertIsNone(find_upload_result('a' * 64, 'replace'))
+        self.assertFalse(UploadDigest.objects.exists())
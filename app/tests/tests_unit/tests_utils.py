@@ -1,11 +1,16 @@
 """File to test utility functions"""
-from datetime import datetime
+import random
+from datetime import date, datetime
+from unittest import skipUnless
 from decimal import Decimal
 
-from django.test import TestCase, tag
+from django.db import connection
+from django.test import TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
 
 from app.api.exceptions import InvalidInput
-from app.api.utils import validate_and_prepare_transaction_row, get_report_data
+from app.api.utils import (REJECTED_ROW_MAX_LENGTH, RejectedRows, validate_and_prepare_transaction_row,
+                           get_report_data, iter_batches, parse_amount_to_cents, parse_transaction_rows)
 from app.models import Transaction
 
 
@@ -196,6 +201,194 @@ class TestUtilsValidateTransactionRow(TestCase):
         self.assertEqual(result.get('value'), Decimal('1000.00'))
 
 
+class TestUtilsIterators(TestCase):
+    """Class to test generators used to stream rows from file"""
+    @tag('unit')
+    def test_iter_batches(self):
+        """
+        test splitting to batches
+        :return: None
+        """
+        self.assertListEqual(list(iter_batches(iter(range(7)), 3)), [[0, 1, 2], [3, 4, 5], [6]])
+
+    @tag('unit')
+    def test_iter_batches_empty(self):
+        """
+        test splitting of empty iterable
+        :return: None
+        """
+        self.assertListEqual(list(iter_batches([], 3)), [])
+
+
+class TestUtilsParseTransactionRows(TestCase):
+    """Class to test function which validate and transform many rows at once"""
+    rows = [
+        b"2020-07-01, Expense, 18.77, Fuel",
+        b"2020-10-13, Income, 12.12, some string\n",
+        b"2020-7-1,Expense,1,Fuel\r\n",
+        "2020-07-01, Expense, 18.77, Fuel",
+        b"",
+        b"# comment",
+        b"2020-07-01, Expense, 18.77",
+        b"2020-07-01, Expense, 18.77, test, test",
+        b"2020-10-13, Wrong, 12.12, some string",
+        b"12-12-2002, Expense, 12.12, some string",
+        b"2022-02-30, Expense, 12.12, some string",
+        b"2022-02-10, Expense, 123asd, some string",
+        b"2022-02-10, Expense, True, some string",
+        b"2022-02-10, Expense, NaN, some string",
+        b"2022-02-10, Expense, Infinity, some string",
+        b"2022-02-10, Expense, ., some string",
+        b"2022-02-10, Expense, -, some string",
+        b"2022-02-10, Expense, \xff, some string",
+        b"2022-02-10, Expense, 11.11111, some string",
+        b"2022-02-10, Expense, 55.555, some string",
+        b"2022-02-10, Expense, 999.9999, some string",
+        b"2022-02-10, Expense, 0.125, some string",
+        b"2022-02-10, Expense, 0.135, some string",
+        b"2022-02-10, Expense, 0.1250001, some string",
+        b"2022-02-10, Expense, -0.125, some string",
+        b"2022-02-10, Expense, -0.001, some string",
+        b"2022-02-10, Expense, +.5, some string",
+        b"2022-02-10, Expense, 7., some string",
+        b"2022-02-10, Expense, 1e2, some string",
+        b"2022-02-10, Expense, 1_000.5, some string",
+        b"2022-02-10, Expense, 99999999999999999999999999.995, some string",
+        b"2022-02-10, Expense, 99999999999999999999999999.994, some string",
+        b"2022-02-10, Expense, 99999999.994, some string",
+        b"2022-02-10, Expense, -99999999.995, some string",
+        b"2022-02-10, Expense, 1e8, some string",
+        "2022-02-10, Income, 12.50, Straße".encode(),
+    ]
+
+    @tag('unit')
+    def test_same_result_as_row_validation(self):
+        """
+        test that every row is accepted or skipped exactly like validate_and_prepare_transaction_row does
+        :return: None
+        """
+        expected = []
+        for row in self.rows:
+            try:
+                expected.append(validate_and_prepare_transaction_row(row))
+            except InvalidInput:
+                continue
+        columns = parse_transaction_rows(self.rows)
+        self.assertEqual(len(columns), len(expected))
+        self.assertEqual(columns.skipped, len(self.rows) - len(expected))
+        for index, result in enumerate(expected):
+            self.assertEqual(columns.date[index], result['date'].date())
+            self.assertEqual(columns.type[index], result['type'])
+            self.assertEqual(Decimal(columns.value[index]).scaleb(-2), result['value'])
+            self.assertEqual(columns.expense_category[index], result.get('expense_category'))
+            self.assertEqual(columns.job_address[index], result.get('job_address'))
+
+    @tag('unit')
+    def test_to_transactions(self):
+        """
+        test building of ORM objects from columns
+        :return: None
+        """
+        transactions = parse_transaction_rows([b"2020-07-01, Expense, 18.77, Fuel",
+                                               b"2020-10-13, Income, 1000, some string"]).to_transactions()
+        self.assertEqual(len(transactions), 2)
+        self.assertEqual(transactions[0].value, Decimal('18.77'))
+        self.assertEqual(transactions[0].expense_category, 'Fuel')
+        self.assertEqual(transactions[1].value, Decimal('1000.00'))
+        self.assertEqual(transactions[1].job_address, 'some string')
+
+    @tag('unit')
+    def test_amount_round_half_even(self):
+        """
+        test rounding of values to cents
+        :return: None
+        """
+        self.assertEqual(parse_amount_to_cents('55.555'), 5556)
+        self.assertEqual(parse_amount_to_cents('0.125'), 12)
+        self.assertEqual(parse_amount_to_cents('999.9999'), 100000)
+        self.assertEqual(parse_amount_to_cents('-11.11111'), -1111)
+
+    @tag('unit')
+    def test_amount_invalid(self):
+        """
+        test incorrect values
+        :return: None
+        """
+        for value in ('', '.', '+', 'True', '123asd', 'NaN', '-Infinity'):
+            with self.assertRaises(InvalidInput):
+                parse_amount_to_cents(value)
+
+
+class TestRejectedRows(TestCase):
+    """Class to test counting and sampling of rows rejected by parser"""
+
+    @tag('unit')
+    def test_reasons(self):
+        """
+        test that each rejected row is counted by its reason and numbered by its line
+        :return: None
+        """
+        rows = [
+            b'2020-07-01, Expense, 18.77, Fuel',
+            b'\n',
+            b'\xff\xfe, Expense, 18.77, Fuel',
+            b'2020-07-01, Expense, 18.77',
+            b'2020-13-01, Expense, 18.77, Fuel',
+            b'2020-07-01, Refund, 18.77, Fuel',
+            b'2020-07-01, Income, 18.7.7, Main St.\r\n',
+            b'2020-07-02, Income, 10.00, ' + b'M' * 101,
+            b'2020-07-02, Income, 10.00, Main\x00St.',
+            b'2020-07-02, Income, 10.00, ' + b'M' * 100,
+        ]
+        columns = parse_transaction_rows(rows)
+        self.assertEqual(len(columns), 2)
+        self.assertEqual(columns.skipped, 8)
+        self.assertDictEqual(columns.rejected.to_dict(), {
+            'count': 8,
+            'reasons': {'empty': 1, 'encoding': 1, 'columns': 1, 'date': 1, 'type': 1, 'amount': 1, 'info': 2},
+            'sample': [
+                {'line': 3, 'reason': 'encoding', 'row': '\ufffd\ufffd, Expense, 18.77, Fuel'},
+                {'line': 4, 'reason': 'columns', 'row': '2020-07-01, Expense, 18.77'},
+                {'line': 5, 'reason': 'date', 'row': '2020-13-01, Expense, 18.77, Fuel'},
+                {'line': 6, 'reason': 'type', 'row': '2020-07-01, Refund, 18.77, Fuel'},
+                {'line': 7, 'reason': 'amount', 'row': '2020-07-01, Income, 18.7.7, Main St.'},
+                {'line': 8, 'reason': 'info', 'row': '2020-07-02, Income, 10.00, ' + 'M' * 101},
+                {'line': 9, 'reason': 'info', 'row': '2020-07-02, Income, 10.00, Main\x00St.'},
+            ],
+        })
+
+    @tag('unit')
+    @override_settings(TRANSACTIONS_REJECTED_SAMPLE_SIZE=5)
+    def test_bounded_sample(self):
+        """
+        test that file of invalid rows keeps only fixed count of cut rows which are spread over the file
+        :return: None
+        """
+        random.seed(0)
+        rejected = RejectedRows(5)
+        for offset, rows in enumerate(iter_batches((b'x' * 1000 for _ in range(10000)), 1000)):
+            rejected.merge(parse_transaction_rows(rows).rejected, offset * 1000)
+        summary = rejected.to_dict()
+        self.assertEqual(summary['count'], 10000)
+        self.assertEqual(summary['reasons']['columns'], 10000)
+        self.assertEqual(len(summary['sample']), 5)
+        self.assertTrue(all(len(item['row']) == REJECTED_ROW_MAX_LENGTH for item in summary['sample']))
+        lines = [item['line'] for item in summary['sample']]
+        self.assertListEqual(lines, sorted(set(lines)))
+        self.assertGreater(lines[-1], 1000)
+
+    @tag('unit')
+    def test_disabled_sample(self):
+        """
+        test that sample of size 0 only counts rows
+        :return: None
+        """
+        rejected = RejectedRows(0)
+        rejected.add(0, 'date', b'2020-13-01, Expense, 18.77, Fuel')
+        self.assertDictEqual(rejected.to_dict()['reasons'], {**dict.fromkeys(rejected.reasons, 0), 'date': 1})
+        self.assertListEqual(rejected.to_dict()['sample'], [])
+
+
 class TestUtilsGetReportData(TestCase):
     """Test function to prepare data from database"""
     @tag('unit')
@@ -261,3 +454,70 @@ class TestUtilsGetReportData(TestCase):
         self.assertDictEqual(data, {'gross-revenue': Decimal('80.23'),
                                     'expenses': Decimal('35.79'),
                                     'net-revenue': Decimal('44.44')})
+
+    @tag('unit')
+    def test_filtered(self):
+        """
+        test report for part of records
+        :return: None
+        """
+        Transaction.objects.bulk_create([
+            Transaction(date=date(2020, 1, 1), type='e', value=Decimal('12.34'), expense_category='fuel'),
+            Transaction(date=date(2020, 2, 1), type='e', value=Decimal('23.45'), expense_category='food'),
+            Transaction(date=date(2020, 3, 1), type='i', value=Decimal('34.56'), job_address='test address'),
+        ])
+        self.assertDictEqual(get_report_data({'date__gte': date(2020, 2, 1)}), {
+            'gross-revenue': Decimal('34.56'),
+            'expenses': Decimal('23.45'),
+            'net-revenue': Decimal('11.11'),
+        })
+        self.assertDictEqual(get_report_data({'expense_category': 'fuel'}), {
+            'gross-revenue': Decimal('0.00'),
+            'expenses': Decimal('12.34'),
+            'net-revenue': Decimal('-12.34'),
+        })
+
+    @tag('unit')
+    @skipUnless(connection.vendor == 'sqlite', "Plan of query depends on database")
+    def test_filtered_uses_index(self):
+        """
+        test that filtered report is counted by range scan of index instead of scan of the whole table
+        :return: None
+        """
+        cases = (
+            ({'type': 'e', 'date__gte': date(2020, 1, 1), 'date__lte': date(2020, 2, 1)}, 'transaction_gen_type_date'),
+            ({'expense_category': 'fuel', 'date__gte': date(2020, 1, 1)}, 'transaction_gen_category_date'),
+            ({'job_address': 'test address'}, 'transaction_gen_address_date'),
+            ({'date__gte': date(2020, 1, 1)}, 'transaction_gen_date_id'),
+        )
+        for filters, index in cases:
+            plan = Transaction.objects.filter(**filters).explain()
+            self.assertIn(index, plan)
+            self.assertNotIn('SCAN app_transaction', plan)
+
+    @tag('unit')
+    @skipUnless(connection.features.supports_aggregate_filter_clause, "FILTER clause isn't supported by database")
+    def test_filtered_aggregates(self):
+        """
+        test that incomes and expenses are counted by one scan with FILTER clause of aggregates
+        :return: None
+        """
+        with CaptureQueriesContext(connection) as queries:
+            get_report_data({'date__gte': date(2020, 1, 1)})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(queries[0]['sql'].count('FILTER (WHERE'), 2)
+
+    @tag('unit')
+    @skipUnless(connection.vendor == 'postgresql', "Partial indexes are created only on PostgreSQL")
+    def test_partial_indexes(self):
+        """
+        test that each type of transaction has partial index covering value
+        :return: None
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s",
+                           [Transaction._meta.db_table])
+            definitions = dict(cursor.fetchall())
+        for name, transaction_type in (('transaction_income_gen_date', 'i'), ('transaction_expense_gen_date', 'e')):
+            self.assertIn('(generation_id, date) INCLUDE (value)', definitions[name])
+            self.assertIn(f"WHERE ((type)::text = '{transaction_type}'::text)", definitions[name])
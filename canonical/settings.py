@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -49,6 +52,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "app.profiling.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "canonical.urls"
@@ -76,13 +80,95 @@ WSGI_APPLICATION = "canonical.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
+# DJANGO_DB_ENGINE selects database: sqlite (default) or postgresql with connection from POSTGRES_* variables.
+# DJANGO_DB_POOL selects pooling of PostgreSQL connections: persistent (each thread keeps its connection for
+# DJANGO_CONN_MAX_AGE seconds), pgbouncer (connections go through external pooler in transaction mode, so
+# server-side cursors are disabled) or none (connection per request)
+DATABASE_ENGINE = os.environ.get("DJANGO_DB_ENGINE", "sqlite")
+DATABASE_POOL = os.environ.get("DJANGO_DB_POOL", "persistent")
+
+if DATABASE_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("POSTGRES_DB", "canonical"),
+            "USER": os.environ.get("POSTGRES_USER", "postgres"),
+            "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+            "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+            "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+            "CONN_MAX_AGE": 0 if DATABASE_POOL == "none" else int(os.environ.get("DJANGO_CONN_MAX_AGE", 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "DISABLE_SERVER_SIDE_CURSORS": DATABASE_POOL == "pgbouncer",
+        }
+    }
+elif DATABASE_ENGINE == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown DJANGO_DB_ENGINE {DATABASE_ENGINE}, use sqlite or postgresql")
+
+if DATABASE_POOL not in ("persistent", "pgbouncer", "none"):
+    raise ImproperlyConfigured(f"Unknown DJANGO_DB_POOL {DATABASE_POOL}, use persistent, pgbouncer or none")
+
+# pragmas executed on each new SQLite connection by app.db.configure_sqlite_connection,
+# production profile turns on WAL so readers don't wait for uploads
+SQLITE_PRAGMAS = {}
+
+# aliases of connections which only read, SQLite connections get pragma query_only
+DATABASES_READ_ONLY = []
+
+# alias of connection which reads /report and /report/timeseries
+REPORTS_DATABASE = "default"
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "app.api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# DJANGO_CACHE_BACKEND selects cache: locmem (default), file (directory shared by processes of one host),
+# db (table created by command createcachetable), memcached (needs pymemcache) or redis (needs redis),
+# DJANGO_CACHE_LOCATION overrides default location of backend. Version of dataset which invalidates cached reports
+# and their ETags is kept in cache, local memory cache is separate for each process, so server which runs more
+# than one process needs shared backend, otherwise other processes answer 304 for outdated data
+
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", ""),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", str(BASE_DIR / "cache")),
+    "db": ("django.core.cache.backends.db.DatabaseCache", "django_cache"),
+    "memcached": ("django.core.cache.backends.memcached.PyMemcacheCache", "127.0.0.1:11211"),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://127.0.0.1:6379"),
+}
+CACHE_BACKEND = os.environ.get("DJANGO_CACHE_BACKEND", "locmem")
+
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"Unknown DJANGO_CACHE_BACKEND {CACHE_BACKEND}, use {', '.join(CACHE_BACKENDS)}")
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND][0],
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", CACHE_BACKENDS[CACHE_BACKEND][1]),
     }
 }
 
+# file and db backends remove a part of keys when they have more entries, the limit is high enough to keep
+# versions of datasets and cached reports of many tenants. Options of memcached and redis go to their clients
+if CACHE_BACKEND in ("file", "db"):
+    CACHES["default"]["OPTIONS"] = {"MAX_ENTRIES": 100000}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -118,3 +204,86 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Application settings
+
+# Count of rows from uploaded file which are validated and inserted to database at once
+TRANSACTIONS_BATCH_SIZE = 1000
+
+# Size in bytes of block which is read at once from files stored on disk (they are mapped to memory)
+TRANSACTIONS_MMAP_BLOCK_SIZE = 64 * 1024
+
+# Files stored on disk which are bigger than threshold (in bytes) are parsed by pool of processes,
+# file is split to ranges of TRANSACTIONS_PARALLEL_CHUNK_SIZE bytes
+TRANSACTIONS_PARALLEL_THRESHOLD = 64 * 1024 * 1024
+TRANSACTIONS_PARALLEL_WORKERS = os.cpu_count() or 1
+TRANSACTIONS_PARALLEL_CHUNK_SIZE = 2 * 1024 * 1024
+
+# Count of rejected rows of uploaded file which are returned as random sample with counts of rejects by reason
+TRANSACTIONS_REJECTED_SAMPLE_SIZE = 20
+
+# Default and maximal count of transactions on page of GET /transactions
+TRANSACTIONS_PAGE_SIZE = 100
+TRANSACTIONS_MAX_PAGE_SIZE = 1000
+
+# Count of rows fetched from database and written to response at once by GET /transactions/export.csv
+TRANSACTIONS_EXPORT_CHUNK_SIZE = 2000
+
+# Seconds to keep cached /report data, cache is also invalidated by each upload of transactions
+REPORT_CACHE_TIMEOUT = 60 * 60
+
+# Count of transactions of retired generations removed by one query during garbage collection
+GENERATIONS_GC_CHUNK_SIZE = 10000
+
+# Remove retired generations in background thread after each upload, otherwise run command collect_generations
+GENERATIONS_GC_IN_BACKGROUND = True
+
+# Directory for files uploaded with async=1, file is removed after processing
+UPLOAD_JOBS_DIR = BASE_DIR / 'uploads'
+
+# Uploaded files are hashed while request is read, other handlers are django defaults
+FILE_UPLOAD_HANDLERS = [
+    "app.api.uploads.DigestUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
+# Count of remembered results of uploads by digest of file, the oldest ones are removed, 0 disables
+# short-circuit of repeated uploads
+UPLOAD_DIGESTS_MAX_SIZE = 1000
+
+# Count of threads in each process which load uploaded files in background
+UPLOAD_JOBS_WORKERS = 2
+
+# Seconds to keep progress of running upload job in cache
+UPLOAD_JOBS_PROGRESS_TIMEOUT = 60 * 60
+
+# Serve /transactions and /report by native async views, it makes sense only under ASGI server (f.e. uvicorn),
+# under WSGI each async view is run in its own event loop
+API_ASYNC_VIEWS = os.environ.get('API_ASYNC_VIEWS', '') in ('1', 'true')
+
+# Renderer of views without DRF, it has to render the same bytes as JSON renderer of DRF
+API_JSON_RENDERER = 'app.api.renderers.FastJSONRenderer'
+
+# Serve /transactions and /report by plain django views without DRF request, content negotiation and renderers,
+# responses are the same. Setting API_ASYNC_VIEWS has priority
+API_LEAN_VIEWS = os.environ.get('API_LEAN_VIEWS', '') in ('1', 'true')
+
+# Record counters and latency histograms of uploads and reports and serve them at /metrics in Prometheus
+# text format. Without METRICS_DIR each process serves only own metrics, with it each process writes its metrics
+# to own file in directory at most once per METRICS_FLUSH_INTERVAL seconds and /metrics sums all files,
+# directory should be cleaned on start of server
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '') in ('1', 'true')
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 1.0
+
+# Request with header X-Profile: 1 or query parameter profile=1 is run under cProfile and its SQL queries are
+# logged, both are saved to PROFILING_DIR. Only requests of staff users are profiled unless PROFILING_ALLOWED is on
+PROFILING_ALLOWED = os.environ.get('PROFILING_ALLOWED', '') in ('1', 'true')
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_HEADER = 'X-Profile'
+PROFILING_QUERY_PARAMETER = 'profile'
+
+# Header with key of tenant, each tenant has own dataset. It has to be set by authenticating proxy, requests
+# without header use shared dataset
+API_TENANT_HEADER = 'X-Tenant'
@@ -0,0 +1,78 @@
+"""
+Django settings for canonical project in production, use them by DJANGO_SETTINGS_MODULE=canonical.settings_production
+
+API is anonymous JSON, so middleware for sessions, CSRF, authentication, messages and frames is removed,
+DRF doesn't authenticate requests and renders only JSON, hot endpoints are served by lean views.
+"""
+# pylint: disable=wildcard-import,unused-wildcard-import
+from canonical.settings import *
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+# admin isn't routed, sessions and messages are needed only by it
+INSTALLED_APPS = [app for app in INSTALLED_APPS
+                  if app not in ('django.contrib.admin', 'django.contrib.sessions', 'django.contrib.messages')]
+
+# without authentication only PROFILING_ALLOWED lets requests be profiled
+MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "app.profiling.ProfilingMiddleware",
+]
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": ["app.api.renderers.FastJSONRenderer"],
+    "DEFAULT_PARSER_CLASSES": ["rest_framework.parsers.JSONParser", "rest_framework.parsers.MultiPartParser"],
+    "DEFAULT_AUTHENTICATION_CLASSES": [],
+    "DEFAULT_PERMISSION_CLASSES": [],
+    "UNAUTHENTICATED_USER": None,
+}
+
+API_LEAN_VIEWS = os.environ.get('API_LEAN_VIEWS', '1') in ('1', 'true')
+
+# processes of server share versions of datasets (ETags of reports) and progress of upload jobs through cache,
+# so local memory cache isn't allowed, cache in files of directory cache/ is default
+CACHE_BACKEND = os.environ.get("DJANGO_CACHE_BACKEND", "file")
+
+if CACHE_BACKEND == "locmem":
+    raise ImproperlyConfigured("DJANGO_CACHE_BACKEND locmem isn't shared by processes, use file, db, memcached or redis")
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND][0],
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", CACHE_BACKENDS[CACHE_BACKEND][1]),
+    }
+}
+
+if CACHE_BACKEND in ("file", "db"):
+    CACHES["default"]["OPTIONS"] = {"MAX_ENTRIES": 100000}
+
+# PostgreSQL connections are configured by environment in canonical.settings. SQLite connections are reused by
+# requests of the same thread, health check reconnects after database restart, reports are read by separate
+# read-only connection which sees the last committed dataset in WAL mode, so it isn't blocked by upload
+# and doesn't block it
+if DATABASE_ENGINE == "sqlite":
+    CONN_MAX_AGE = int(os.environ.get('DJANGO_CONN_MAX_AGE', 60))
+
+    DATABASES = {
+        "default": {**DATABASES["default"], "CONN_MAX_AGE": CONN_MAX_AGE, "CONN_HEALTH_CHECKS": True},
+    }
+    DATABASES["reports"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        # in WAL mode commit is durable after checkpoint, database is never corrupted
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64 * 1024,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+
+    DATABASES_READ_ONLY = ["reports"]
+
+    REPORTS_DATABASE = "reports"